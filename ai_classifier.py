@@ -1,28 +1,96 @@
+import asyncio
+import base64
+import hashlib
 import json
 import os
+import random
 import re
 import time
-from typing import Any, Dict
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 
+import httpx
 from loguru import logger
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+from .circuit_breaker import CircuitBreaker, LatencyTracker
+from .classification_cache import classification_cache, make_cache_key
+from . import image_triage
+from .image_processor import make_model_rendition
 
 MODEL_NAME = os.environ.get("OPENAI_VISION_MODEL", "gpt-4o-mini")
 OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT_SECONDS", 30))
+CLASSIFY_DEADLINE_SECONDS = float(os.environ.get("CLASSIFY_DEADLINE_SECONDS", 45))
+MAX_CONCURRENT_CLASSIFICATIONS = int(os.environ.get("MAX_CONCURRENT_CLASSIFICATIONS", 32))
+HTTP_POOL_KEEPALIVE = int(os.environ.get("OPENAI_POOL_KEEPALIVE", 16))
+# "inline" sends a locally downscaled copy as a data: URL whenever the caller
+# passes image_bytes; "url" always lets the provider fetch image_url itself.
+INPUT_MODE = os.environ.get("CLASSIFY_INPUT_MODE", "inline").lower()
+IMAGE_MAX_SIDE = int(os.environ.get("CLASSIFY_IMAGE_MAX_SIDE", 768))
+IMAGE_DETAIL = os.environ.get("CLASSIFY_IMAGE_DETAIL", "auto")
+TRIAGE_ENABLED = os.environ.get("CLASSIFY_TRIAGE_ENABLED", "true").lower() in {"1", "true", "yes"}
+HEDGE_REQUESTS = os.environ.get("CLASSIFY_HEDGE_REQUESTS", "false").lower() in {"1", "true", "yes"}
 MAX_RETRIES = 3
 RETRY_DELAY_SECONDS = 2
 
-_client: OpenAI | None = None
+circuit_breaker = CircuitBreaker(name="openai-vision")
+latency_tracker = LatencyTracker()
+_usage: Dict[str, Dict[str, float]] = {}
+# Awaited before every upstream request (retries and hedges included) made in
+# this context; batch_classifier sets it to charge its requests-per-minute budget.
+upstream_rate_limit: ContextVar[Optional[Callable[[], Awaitable[None]]]] = ContextVar("upstream_rate_limit", default=None)
+
+# One pooled client and semaphore per event loop: httpx connections and asyncio
+# primitives cannot be shared across loops (e.g. the sync wrapper's asyncio.run).
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
 
 
-def _get_client() -> OpenAI:
-  global _client
-  if _client is None:
+def _get_async_client() -> AsyncOpenAI:
+  loop = asyncio.get_running_loop()
+  client = _async_clients.get(loop)
+  if client is None:
     api_key = os.environ.get("OPENAI_API_KEY")
     if not api_key:
       raise RuntimeError("OPENAI_API_KEY is not configured")
-    _client = OpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT)
-  return _client
+    http_client = httpx.AsyncClient(
+      timeout=OPENAI_TIMEOUT,
+      limits=httpx.Limits(
+        max_connections=MAX_CONCURRENT_CLASSIFICATIONS,
+        max_keepalive_connections=HTTP_POOL_KEEPALIVE,
+      ),
+    )
+    # Retries are handled below with jittered backoff, so the SDK must not add its own.
+    client = AsyncOpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT, max_retries=0, http_client=http_client)
+    _async_clients[loop] = client
+  return client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+  loop = asyncio.get_running_loop()
+  semaphore = _semaphores.get(loop)
+  if semaphore is None:
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CLASSIFICATIONS)
+    _semaphores[loop] = semaphore
+  return semaphore
+
+
+async def aclose_async_client() -> None:
+  """Close the pooled client bound to the running loop (call on app shutdown)."""
+  loop = asyncio.get_running_loop()
+  client = _async_clients.pop(loop, None)
+  _semaphores.pop(loop, None)
+  if client is not None:
+    await client.close()
+
+
+def _backoff_delay(attempt: int) -> float:
+  # Equal jitter: keep half of the linear backoff, randomize the rest so that
+  # concurrent failures do not retry in lockstep.
+  base = RETRY_DELAY_SECONDS * attempt
+  return base / 2 + random.uniform(0, base / 2)
 
 
 SYSTEM_PROMPT = """
@@ -83,67 +151,248 @@ def _default_response() -> Dict[str, Any]:
   }
 
 
-def classify_urban_issue(image_url: str) -> Dict[str, Any]:
+def _build_input(image_url: str, detail: str = "auto") -> list[Dict[str, Any]]:
+  return [
+    {
+      "role": "system",
+      "content": [{"type": "input_text", "text": SYSTEM_PROMPT}],
+    },
+    {
+      "role": "user",
+      "content": [
+        {"type": "input_text", "text": USER_INSTRUCTIONS},
+        {"type": "input_image", "image_url": image_url, "detail": detail},
+      ],
+    },
+  ]
+
+
+def _parse_response(response: Any) -> Dict[str, Any]:
+  content = ""
+  if response.output:
+    first_chunk = response.output[0].content[0]
+    if hasattr(first_chunk, "text"):
+      content = first_chunk.text
+    elif isinstance(first_chunk, dict):
+      content = first_chunk.get("text", "")
+  logger.debug("Raw OpenAI response: {}", content)
+
+  match = re.search(r"\{.*\}", content, re.DOTALL)
+  json_blob = match.group(0) if match else content
+  data = json.loads(json_blob)
+  confidence = float(data.get("confidence", 0))
+  if confidence < 0.6:
+    data["issue_type"] = "unclear_issue"
+
+  data["severity"] = max(1, min(10, int(data.get("severity", 1))))
+  data["confidence"] = max(0.0, min(1.0, confidence))
+  data["estimated_affected_people"] = max(0, int(data.get("estimated_affected_people", 0)))
+  return data
+
+
+def prompt_version() -> str:
+  """Fingerprint of the model and prompts; part of every classification cache key."""
+  parts = (MODEL_NAME, SYSTEM_PROMPT, USER_INSTRUCTIONS, INPUT_MODE, str(IMAGE_MAX_SIDE), IMAGE_DETAIL)
+  digest = hashlib.sha256("\x00".join(parts).encode())
+  return digest.hexdigest()[:16]
+
+
+async def classify_urban_issue_async(
+  image_url: str,
+  *,
+  deadline: Optional[float] = None,
+  image_bytes: Optional[bytes] = None,
+  use_cache: bool = True,
+) -> Dict[str, Any]:
   """
-  Analyze an image via GPT-4 Vision and classify the detected urban issue.
+  Analyze an image via GPT-4 Vision without blocking the event loop.
+
+  Calls share a pooled HTTP client and are bounded by MAX_CONCURRENT_CLASSIFICATIONS.
+  `deadline` (seconds, default CLASSIFY_DEADLINE_SECONDS) caps the whole call,
+  including queueing for a slot and retries; the fallback response is returned
+  once it is exceeded.
+
+  Results are cached by image content (`image_bytes` when given, otherwise the
+  normalized URL) and prompt_version(); concurrent calls for the same key share
+  one upstream request. Fallback responses are never cached.
+
+  When `image_bytes` is given, the local triage stage (image_triage) runs first
+  and clearly unusable photos are answered as "unclear_issue" without calling
+  the model.
   """
-  client = _get_client()
+  if not use_cache:
+    return await _classify_triaged(image_url, image_bytes, deadline)
+  key = make_cache_key(prompt_version(), image_url=image_url, image_bytes=image_bytes)
+  return await classification_cache.get_or_compute(
+    key,
+    lambda: _classify_triaged(image_url, image_bytes, deadline),
+    cacheable=lambda data: "error" not in data,
+  )
+
+
+async def _classify_triaged(image_url: str, image_bytes: Optional[bytes], deadline: Optional[float]) -> Dict[str, Any]:
+  if TRIAGE_ENABLED and image_bytes is not None:
+    triage = await image_triage.triage_image_async(image_bytes)
+    if not triage.forward:
+      response = _default_response()
+      response["description"] = triage.reason
+      response["triage_reason"] = triage.reason
+      return response
+  return await _classify_uncached(image_url, deadline, image_bytes)
+
+
+async def _model_input(image_url: str, image_bytes: Optional[bytes]) -> tuple[str, str]:
+  """Return (image reference for the model, input mode label)."""
+  if INPUT_MODE != "inline" or image_bytes is None:
+    return image_url, "url"
+  try:
+    rendition = await asyncio.to_thread(make_model_rendition, image_bytes, IMAGE_MAX_SIDE)
+  except Exception as exc:  # noqa: BLE001
+    logger.warning("Inline rendition failed, falling back to image URL: {}", exc)
+    return image_url, "url"
+  return f"data:image/jpeg;base64,{base64.b64encode(rendition).decode()}", "inline"
+
+
+def _record_usage(mode: str, latency: float, response: Any) -> None:
+  usage = getattr(response, "usage", None)
+  entry = _usage.setdefault(mode, {"calls": 0, "latency_seconds": 0.0, "input_tokens": 0, "output_tokens": 0})
+  entry["calls"] += 1
+  entry["latency_seconds"] += latency
+  entry["input_tokens"] += int(getattr(usage, "input_tokens", 0) or 0)
+  entry["output_tokens"] += int(getattr(usage, "output_tokens", 0) or 0)
+
+
+def usage_stats() -> Dict[str, Dict[str, float]]:
+  """Per input mode ("url" / "inline") call counts with mean latency and token usage."""
+  summary: Dict[str, Dict[str, float]] = {}
+  for mode, entry in _usage.items():
+    calls = entry["calls"] or 1
+    summary[mode] = {
+      "calls": entry["calls"],
+      "mean_latency_seconds": round(entry["latency_seconds"] / calls, 4),
+      "mean_input_tokens": round(entry["input_tokens"] / calls, 1),
+      "mean_output_tokens": round(entry["output_tokens"] / calls, 1),
+    }
+  return summary
+
+
+async def _classify_uncached(image_url: str, deadline: Optional[float], image_bytes: Optional[bytes] = None) -> Dict[str, Any]:
+  client = _get_async_client()
+  loop = asyncio.get_running_loop()
+  expires_at = loop.time() + (CLASSIFY_DEADLINE_SECONDS if deadline is None else deadline)
   last_error: Exception | None = None
+  model_image, mode = await _model_input(image_url, image_bytes)
 
   for attempt in range(1, MAX_RETRIES + 1):
+    remaining = expires_at - loop.time()
+    if remaining <= 0:
+      last_error = TimeoutError("Classification deadline exceeded")
+      break
+    if not circuit_breaker.allow_request():
+      last_error = RuntimeError("Classification circuit open; upstream model unavailable")
+      break
     try:
       logger.info("Classifying urban issue (attempt {}): {}", attempt, image_url)
-
-      response = client.responses.create(
-        model=MODEL_NAME,
-        temperature=0.2,
-        max_output_tokens=500,
-        input=[
-          {
-            "role": "system",
-            "content": [{"type": "input_text", "text": SYSTEM_PROMPT}],
-          },
-          {
-            "role": "user",
-            "content": [
-              {"type": "input_text", "text": USER_INSTRUCTIONS},
-              {"type": "input_image", "image_url": image_url},
-            ],
-          },
-        ],
-      )
-
-      content = ""
-      if response.output:
-        first_chunk = response.output[0].content[0]
-        if hasattr(first_chunk, "text"):
-          content = first_chunk.text
-        elif isinstance(first_chunk, dict):
-          content = first_chunk.get("text", "")
-      logger.debug("Raw OpenAI response: {}", content)
-
-      match = re.search(r"\{.*\}", content, re.DOTALL)
-      json_blob = match.group(0) if match else content
-      data = json.loads(json_blob)
-      confidence = float(data.get("confidence", 0))
-      if confidence < 0.6:
-        data["issue_type"] = "unclear_issue"
-
-      data["severity"] = max(1, min(10, int(data.get("severity", 1))))
-      data["confidence"] = max(0.0, min(1.0, confidence))
-      data["estimated_affected_people"] = max(0, int(data.get("estimated_affected_people", 0)))
-
+      data = await asyncio.wait_for(_attempt(client, model_image, mode), timeout=min(OPENAI_TIMEOUT, remaining))
       logger.info("Classification success: {}", data)
       return data
+    except asyncio.CancelledError:
+      circuit_breaker.release()
+      raise
     except Exception as exc:  # noqa: BLE001
+      circuit_breaker.record_failure()
       last_error = exc
-      logger.warning("Classification attempt {} failed: {}", attempt, exc)
+      logger.warning("Classification attempt {} failed: {!r}", attempt, exc)
       if attempt < MAX_RETRIES:
-        time.sleep(RETRY_DELAY_SECONDS * attempt)
+        delay = min(_backoff_delay(attempt), max(0.0, expires_at - loop.time()))
+        await asyncio.sleep(delay)
 
-  logger.error("All classification attempts failed: {}", last_error)
+  logger.error("All classification attempts failed: {!r}", last_error)
   fallback = _default_response()
   if last_error:
-    fallback["error"] = str(last_error)
+    fallback["error"] = str(last_error) or type(last_error).__name__
   return fallback
 
+
+async def _attempt(client: AsyncOpenAI, image_url: str, mode: str = "url") -> Dict[str, Any]:
+  """One logical attempt; when hedging is enabled a second request races the first after the p95 delay."""
+  hedge_delay = latency_tracker.hedge_delay() if HEDGE_REQUESTS else None
+  if hedge_delay is None:
+    data, latency = await _classify_once(client, image_url, mode)
+  else:
+    data, latency = await _hedged(client, image_url, hedge_delay, mode)
+  circuit_breaker.record_success(latency)
+  return data
+
+
+async def _hedged(
+  client: AsyncOpenAI, image_url: str, hedge_delay: float, mode: str = "url"
+) -> Tuple[Dict[str, Any], float]:
+  primary = asyncio.ensure_future(_classify_once(client, image_url, mode))
+  pending = {primary}
+  hedge: Optional[asyncio.Future] = None
+  try:
+    done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+    if not done:
+      logger.info("Hedging classification after {:.2f}s", hedge_delay)
+      hedge = asyncio.ensure_future(_classify_once(client, image_url, mode))
+      pending.add(hedge)
+
+    last_error: BaseException | None = None
+    while pending:
+      done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+      for task in done:
+        if task.exception() is None:
+          if hedge is not None:
+            latency_tracker.record_hedge(won=task is hedge)
+          return task.result()
+        last_error = task.exception()
+    if hedge is not None:
+      latency_tracker.record_hedge(won=False)
+    assert last_error is not None
+    raise last_error
+  finally:
+    for task in pending:
+      task.cancel()
+
+
+async def _classify_once(client: AsyncOpenAI, image_url: str, mode: str = "url") -> Tuple[Dict[str, Any], float]:
+  """One upstream request; returns the parsed result and the request's own latency (excluding the slot wait)."""
+  acquire = upstream_rate_limit.get()
+  if acquire is not None:
+    await acquire()
+  async with _get_semaphore():
+    started = time.monotonic()
+    response = await client.responses.create(
+      model=MODEL_NAME,
+      temperature=0.2,
+      max_output_tokens=500,
+      input=_build_input(image_url, IMAGE_DETAIL),
+    )
+    latency = time.monotonic() - started
+    latency_tracker.record(latency)
+    _record_usage(mode, latency, response)
+  return _parse_response(response), latency
+
+
+def classify_urban_issue(image_url: str) -> Dict[str, Any]:
+  """
+  Analyze an image via GPT-4 Vision and classify the detected urban issue.
+
+  Blocking wrapper around classify_urban_issue_async; async callers should
+  await that directly.
+  """
+  async def _run() -> Dict[str, Any]:
+    try:
+      return await classify_urban_issue_async(image_url)
+    finally:
+      await aclose_async_client()
+
+  try:
+    asyncio.get_running_loop()
+  except RuntimeError:
+    return asyncio.run(_run())
+
+  logger.warning("classify_urban_issue called inside an event loop; use classify_urban_issue_async")
+  with ThreadPoolExecutor(max_workers=1, thread_name_prefix="classify") as pool:
+    return pool.submit(asyncio.run, _run()).result()
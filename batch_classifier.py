@@ -0,0 +1,162 @@
+"""Bulk (re-)classification of stored report images.
+
+Usage:
+  python -m app.services.batch_classifier urls.txt --concurrency 16 --rpm 300 --checkpoint progress.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Set, Tuple
+
+from loguru import logger
+
+from . import ai_classifier
+
+DEFAULT_CONCURRENCY = 8
+
+BatchResult = Tuple[str, Dict[str, Any]]
+
+
+class RateLimiter:
+  """Spaces acquisitions evenly to stay within a requests-per-minute budget."""
+
+  def __init__(self, requests_per_minute: float) -> None:
+    if requests_per_minute <= 0:
+      raise ValueError("requests_per_minute must be positive")
+    self.interval = 60.0 / requests_per_minute
+    self._next_slot = 0.0
+    self._lock = asyncio.Lock()
+
+  async def acquire(self) -> None:
+    async with self._lock:
+      now = asyncio.get_running_loop().time()
+      slot = max(now, self._next_slot)
+      self._next_slot = slot + self.interval
+    if slot > now:
+      await asyncio.sleep(slot - now)
+
+
+def load_checkpoint(path: str | Path) -> Set[str]:
+  """Image URLs already classified successfully in a previous run."""
+  done: Set[str] = set()
+  checkpoint = Path(path)
+  if not checkpoint.exists():
+    return done
+  with checkpoint.open() as handle:
+    for line in handle:
+      try:
+        done.add(json.loads(line)["image_url"])
+      except (ValueError, KeyError):
+        # A torn final line from an interrupted run; that image is simply redone.
+        continue
+  return done
+
+
+async def classify_many(
+  image_urls: Iterable[str],
+  *,
+  concurrency: int = DEFAULT_CONCURRENCY,
+  rate_limit: Optional[float] = None,
+  checkpoint_path: Optional[str | Path] = None,
+  deadline: Optional[float] = None,
+) -> AsyncIterator[BatchResult]:
+  """
+  Classify many images concurrently, yielding (image_url, result) as each completes.
+
+  `concurrency` bounds in-flight classifications (further capped by
+  MAX_CONCURRENT_CLASSIFICATIONS), `rate_limit` is a requests-per-minute budget
+  charged per upstream request (retries and hedges count, cache hits and
+  triaged images do not) and `checkpoint_path` is a JSONL file of successful results: URLs already in
+  it are skipped, so an interrupted run resumes where it stopped. Fallback
+  results are yielded but not checkpointed, so a resumed run retries them.
+  """
+  if concurrency < 1:
+    raise ValueError("concurrency must be at least 1")
+  done = load_checkpoint(checkpoint_path) if checkpoint_path else set()
+  if done:
+    logger.info("Resuming batch classification; {} images already checkpointed", len(done))
+  pending = iter(url for url in image_urls if url not in done)
+  limiter = RateLimiter(rate_limit) if rate_limit else None
+  queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+  finished = object()
+
+  async def worker() -> None:
+    if limiter:
+      # Each worker task has its own context, so this does not leak to the caller.
+      ai_classifier.upstream_rate_limit.set(limiter.acquire)
+    try:
+      for image_url in pending:
+        result = await ai_classifier.classify_urban_issue_async(image_url, deadline=deadline)
+        await queue.put((image_url, result))
+    except Exception as exc:  # noqa: BLE001
+      await queue.put(exc)
+      return
+    await queue.put(finished)
+
+  checkpoint = open(checkpoint_path, "a", encoding="utf-8") if checkpoint_path else None
+  workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+  try:
+    active = len(workers)
+    while active:
+      item = await queue.get()
+      if item is finished:
+        active -= 1
+        continue
+      if isinstance(item, Exception):
+        raise item
+      image_url, result = item
+      if checkpoint and "error" not in result:
+        checkpoint.write(json.dumps({"image_url": image_url, "result": result}) + "\n")
+        checkpoint.flush()
+      yield image_url, result
+  finally:
+    for task in workers:
+      task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    if checkpoint:
+      checkpoint.close()
+
+
+async def _run_cli(args: argparse.Namespace) -> int:
+  source = sys.stdin if args.urls == "-" else open(args.urls, encoding="utf-8")
+  with source:
+    urls = [line.strip() for line in source if line.strip()]
+
+  succeeded = failed = 0
+  try:
+    async for image_url, result in classify_many(
+      urls,
+      concurrency=args.concurrency,
+      rate_limit=args.rpm,
+      checkpoint_path=args.checkpoint,
+    ):
+      if "error" in result:
+        failed += 1
+        logger.warning("Classification failed for {}: {}", image_url, result["error"])
+      else:
+        succeeded += 1
+      if (succeeded + failed) % 100 == 0:
+        logger.info("Batch progress: {} succeeded, {} failed", succeeded, failed)
+  finally:
+    await ai_classifier.aclose_async_client()
+
+  logger.info("Batch classification finished: {} succeeded, {} failed", succeeded, failed)
+  return 1 if failed else 0
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description="Re-classify stored report images in bulk.")
+  parser.add_argument("urls", help="File with one image URL per line, or - for stdin")
+  parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+  parser.add_argument("--rpm", type=float, default=None, help="Requests-per-minute budget")
+  parser.add_argument("--checkpoint", required=True, help="JSONL results file; reused to resume")
+  return asyncio.run(_run_cli(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
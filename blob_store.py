@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+    'image/heic': 'heic',
+}
+EXTENSION_CONTENT_TYPES = {ext: content_type for content_type, ext in CONTENT_TYPE_EXTENSIONS.items()}
+EXTENSION_CONTENT_TYPES['jpeg'] = 'image/jpeg'
+
+_BLOB_ID = re.compile(r'^(?P<digest>[0-9a-f]{64})\.(?P<ext>[a-z0-9]{1,5})$')
+
+
+class LocalBlobStore:
+    """
+    Content-addressed image store for local mode. Blobs are named by the
+    SHA-256 of their bytes plus an extension (``<sha256>.webp``) and sharded
+    two levels deep (``ab/cd/<sha256>.webp``); identical uploads share one file.
+    """
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def put(self, data: bytes, content_type: str = 'image/jpeg') -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        blob_id = f'{digest}.{CONTENT_TYPE_EXTENSIONS.get(content_type, "bin")}'
+        path = self._path(digest, blob_id)
+        if path.exists():
+            return blob_id
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(data)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        return blob_id
+
+    def path_for(self, blob_id: str) -> Optional[Path]:
+        """Filesystem path of a stored blob, or None for unknown/invalid ids."""
+        match = _BLOB_ID.match(blob_id)
+        if not match:
+            return None
+        path = self._path(match.group('digest'), blob_id)
+        return path if path.is_file() else None
+
+    def exists(self, blob_id: str) -> bool:
+        return self.path_for(blob_id) is not None
+
+    @staticmethod
+    def digest_of(blob_id: str) -> str:
+        return blob_id.split('.', 1)[0]
+
+    @staticmethod
+    def content_type_of(blob_id: str) -> str:
+        return EXTENSION_CONTENT_TYPES.get(blob_id.rsplit('.', 1)[-1], 'application/octet-stream')
+
+    def _path(self, digest: str, blob_id: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / blob_id
+
+
+LOCAL_BLOB_DIR = os.getenv('LOCAL_BLOB_DIR') or str(Path(__file__).resolve().parents[2] / 'uploads' / 'blobs')
+
+blob_store = LocalBlobStore(LOCAL_BLOB_DIR)
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from loguru import logger
+
+CIRCUIT_WINDOW_SIZE = int(os.environ.get("CLASSIFY_CIRCUIT_WINDOW", 20))
+CIRCUIT_MIN_CALLS = int(os.environ.get("CLASSIFY_CIRCUIT_MIN_CALLS", 10))
+CIRCUIT_FAILURE_RATE = float(os.environ.get("CLASSIFY_CIRCUIT_FAILURE_RATE", 0.5))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.environ.get("CLASSIFY_CIRCUIT_SLOW_CALL_SECONDS", 20))
+CIRCUIT_SLOW_CALL_RATE = float(os.environ.get("CLASSIFY_CIRCUIT_SLOW_CALL_RATE", 0.8))
+CIRCUIT_OPEN_SECONDS = float(os.environ.get("CLASSIFY_CIRCUIT_OPEN_SECONDS", 30))
+CIRCUIT_HALF_OPEN_PROBES = int(os.environ.get("CLASSIFY_CIRCUIT_HALF_OPEN_PROBES", 1))
+
+LATENCY_SAMPLE_SIZE = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SECONDS = 0.5
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+  """
+  Rolling-window circuit breaker. Opens when the failure rate or slow-call rate
+  of the last `window_size` calls crosses its threshold, fails fast for
+  `open_seconds`, then lets `half_open_probes` calls through; a successful
+  probe closes the circuit and a failed one re-opens it.
+  """
+
+  def __init__(
+    self,
+    *,
+    window_size: int = CIRCUIT_WINDOW_SIZE,
+    min_calls: int = CIRCUIT_MIN_CALLS,
+    failure_rate: float = CIRCUIT_FAILURE_RATE,
+    slow_call_seconds: float = CIRCUIT_SLOW_CALL_SECONDS,
+    slow_call_rate: float = CIRCUIT_SLOW_CALL_RATE,
+    open_seconds: float = CIRCUIT_OPEN_SECONDS,
+    half_open_probes: int = CIRCUIT_HALF_OPEN_PROBES,
+    name: str = "classifier",
+  ) -> None:
+    self.name = name
+    self.min_calls = min_calls
+    self.failure_rate = failure_rate
+    self.slow_call_seconds = slow_call_seconds
+    self.slow_call_rate = slow_call_rate
+    self.open_seconds = open_seconds
+    self.half_open_probes = half_open_probes
+    self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window_size)
+    self._state = CLOSED
+    self._opened_at = 0.0
+    self._probes_in_flight = 0
+    self._lock = threading.Lock()
+    self.rejected = 0
+    self.times_opened = 0
+
+  @property
+  def state(self) -> str:
+    with self._lock:
+      self._maybe_half_open(time.monotonic())
+      return self._state
+
+  def allow_request(self) -> bool:
+    """Whether a call may go upstream. Every allowed call must be followed by record_* or release()."""
+    with self._lock:
+      self._maybe_half_open(time.monotonic())
+      if self._state == CLOSED:
+        return True
+      if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+        self._probes_in_flight += 1
+        return True
+      self.rejected += 1
+      return False
+
+  def record_success(self, latency: float) -> None:
+    with self._lock:
+      if self._state == HALF_OPEN:
+        self._probes_in_flight = max(0, self._probes_in_flight - 1)
+        if latency < self.slow_call_seconds:
+          logger.info("Circuit '{}' closed after successful probe", self.name)
+          self._state = CLOSED
+          self._outcomes.clear()
+        else:
+          self._open()
+        return
+      self._outcomes.append((True, latency >= self.slow_call_seconds))
+      self._evaluate()
+
+  def record_failure(self) -> None:
+    with self._lock:
+      if self._state == HALF_OPEN:
+        self._probes_in_flight = max(0, self._probes_in_flight - 1)
+        self._open()
+        return
+      self._outcomes.append((False, False))
+      self._evaluate()
+
+  def release(self) -> None:
+    """Give back an allowed call that was cancelled before it produced an outcome."""
+    with self._lock:
+      if self._state == HALF_OPEN:
+        self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+  def reset(self) -> None:
+    with self._lock:
+      self._state = CLOSED
+      self._outcomes.clear()
+      self._probes_in_flight = 0
+      self.rejected = 0
+      self.times_opened = 0
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      self._maybe_half_open(time.monotonic())
+      calls = len(self._outcomes)
+      return {
+        "state": self._state,
+        "window_calls": calls,
+        "failure_rate": round(self._rate(failed=True), 4) if calls else 0.0,
+        "slow_call_rate": round(self._rate(failed=False), 4) if calls else 0.0,
+        "rejected": self.rejected,
+        "times_opened": self.times_opened,
+      }
+
+  def _rate(self, *, failed: bool) -> float:
+    if failed:
+      hits = sum(1 for ok, _ in self._outcomes if not ok)
+    else:
+      hits = sum(1 for _, slow in self._outcomes if slow)
+    return hits / len(self._outcomes)
+
+  def _evaluate(self) -> None:
+    if len(self._outcomes) < self.min_calls:
+      return
+    if self._rate(failed=True) >= self.failure_rate or self._rate(failed=False) >= self.slow_call_rate:
+      self._open()
+
+  def _open(self) -> None:
+    logger.warning("Circuit '{}' opened for {}s", self.name, self.open_seconds)
+    self._state = OPEN
+    self._opened_at = time.monotonic()
+    self._outcomes.clear()
+    self.times_opened += 1
+
+  def _maybe_half_open(self, now: float) -> None:
+    if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+      self._state = HALF_OPEN
+      self._probes_in_flight = 0
+
+
+class LatencyTracker:
+  """Recent successful-call latencies, used to pick the hedge delay."""
+
+  def __init__(self, sample_size: int = LATENCY_SAMPLE_SIZE, min_samples: int = HEDGE_MIN_SAMPLES) -> None:
+    self._samples: Deque[float] = deque(maxlen=sample_size)
+    self.min_samples = min_samples
+    self._lock = threading.Lock()
+    self.hedges_sent = 0
+    self.hedges_won = 0
+
+  def record(self, latency: float) -> None:
+    with self._lock:
+      self._samples.append(latency)
+
+  def record_hedge(self, won: bool) -> None:
+    with self._lock:
+      self.hedges_sent += 1
+      if won:
+        self.hedges_won += 1
+
+  def percentile(self, pct: float) -> Optional[float]:
+    with self._lock:
+      if not self._samples:
+        return None
+      ordered = sorted(self._samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+  def hedge_delay(self) -> Optional[float]:
+    """p95 latency once enough samples exist; None means "do not hedge yet"."""
+    with self._lock:
+      if len(self._samples) < self.min_samples:
+        return None
+    p95 = self.percentile(95)
+    return max(HEDGE_MIN_DELAY_SECONDS, p95 or 0.0)
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      samples = len(self._samples)
+      hedges_sent, hedges_won = self.hedges_sent, self.hedges_won
+    return {
+      "samples": samples,
+      "p50": self.percentile(50),
+      "p95": self.percentile(95),
+      "hedges_sent": hedges_sent,
+      "hedges_won": hedges_won,
+    }
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from loguru import logger
+
+CACHE_MAX_ENTRIES = int(os.environ.get("CLASSIFICATION_CACHE_SIZE", 1024))
+CACHE_TTL_SECONDS = float(os.environ.get("CLASSIFICATION_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+CACHE_DIR = os.environ.get("CLASSIFICATION_CACHE_DIR")
+
+Classification = Dict[str, Any]
+# In-flight result telling waiters to retry because the computing caller was cancelled.
+_RETRY: Any = object()
+
+
+def normalize_image_url(image_url: str) -> str:
+  """Canonical form of an image URL: lower-case scheme/host, sorted query, no fragment."""
+  parts = urlsplit(image_url.strip())
+  query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+  return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ""))
+
+
+def make_cache_key(version: str, *, image_url: Optional[str] = None, image_bytes: Optional[bytes] = None) -> str:
+  """
+  Build a content-addressed key. Raw bytes (or an inline data: URL) are hashed
+  directly; otherwise the normalized URL stands in for the content.
+  """
+  digest = hashlib.sha256(version.encode())
+  if image_bytes is not None:
+    digest.update(b"bytes:")
+    digest.update(hashlib.sha256(image_bytes).digest())
+  elif image_url is not None:
+    if image_url.startswith("data:"):
+      digest.update(b"bytes:")
+      digest.update(hashlib.sha256(image_url.encode()).digest())
+    else:
+      digest.update(b"url:")
+      digest.update(normalize_image_url(image_url).encode())
+  else:
+    raise ValueError("image_url or image_bytes is required")
+  return digest.hexdigest()
+
+
+class ClassificationCache:
+  """LRU memory cache with an optional on-disk TTL tier and single-flight lookups."""
+
+  def __init__(
+    self,
+    max_entries: int = CACHE_MAX_ENTRIES,
+    disk_dir: Optional[str | Path] = CACHE_DIR,
+    ttl_seconds: float = CACHE_TTL_SECONDS,
+  ) -> None:
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds
+    self.disk_dir = Path(disk_dir) if disk_dir else None
+    if self.disk_dir:
+      self.disk_dir.mkdir(parents=True, exist_ok=True)
+    self._entries: "OrderedDict[str, tuple[float, Classification]]" = OrderedDict()
+    self._lock = threading.Lock()
+    self._inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Future]]" = (
+      weakref.WeakKeyDictionary()
+    )
+    self.hits = 0
+    self.disk_hits = 0
+    self.misses = 0
+    self.coalesced = 0
+    self.evictions = 0
+
+  def get(self, key: str) -> Optional[Classification]:
+    now = time.time()
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None:
+        stored_at, value = entry
+        if now - stored_at <= self.ttl_seconds:
+          self._entries.move_to_end(key)
+          self.hits += 1
+          return dict(value)
+        del self._entries[key]
+
+    stored = self._read_disk(key, now)
+    if stored is not None:
+      stored_at, value = stored
+      self._store_memory(key, value, stored_at)
+      with self._lock:
+        self.disk_hits += 1
+      return dict(value)
+
+    with self._lock:
+      self.misses += 1
+    return None
+
+  def set(self, key: str, value: Classification) -> None:
+    stored_at = time.time()
+    self._store_memory(key, value, stored_at)
+    self._write_disk(key, value, stored_at)
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+      self.hits = self.disk_hits = self.misses = self.coalesced = self.evictions = 0
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      lookups = self.hits + self.disk_hits + self.misses
+      return {
+        "entries": len(self._entries),
+        "max_entries": self.max_entries,
+        "hits": self.hits,
+        "disk_hits": self.disk_hits,
+        "misses": self.misses,
+        "coalesced": self.coalesced,
+        "evictions": self.evictions,
+        "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+      }
+
+  async def get_or_compute(
+    self,
+    key: str,
+    factory: Callable[[], Awaitable[Classification]],
+    cacheable: Callable[[Classification], bool] = lambda value: True,
+  ) -> Classification:
+    """
+    Return the cached value for `key`, or run `factory` once for all concurrent
+    callers of the same key. Values rejected by `cacheable` are shared with the
+    waiting callers but not stored.
+    """
+    loop = asyncio.get_running_loop()
+    inflight = self._inflight.setdefault(loop, {})
+    while True:
+      value = await self._wait_inflight(inflight, key)
+      if value is _RETRY:
+        continue
+      if value is not None:
+        return value
+
+      if self.disk_dir:
+        cached = await asyncio.to_thread(self.get, key)
+      else:
+        cached = self.get(key)
+      if cached is not None:
+        return cached
+
+      # Another caller may have started the computation while we were reading disk.
+      value = await self._wait_inflight(inflight, key)
+      if value is _RETRY:
+        continue
+      if value is not None:
+        return value
+
+      future: asyncio.Future = loop.create_future()
+      inflight[key] = future
+      try:
+        value = await factory()
+      except Exception as exc:
+        future.set_exception(exc)
+        # Mark retrieved so an unawaited failure does not log "exception never retrieved".
+        future.exception()
+        raise
+      except BaseException:
+        # Cancelled (or interrupted) owner: the waiters were not, so one of them retries.
+        future.set_result(_RETRY)
+        raise
+      else:
+        future.set_result(value)
+        if cacheable(value):
+          if self.disk_dir:
+            await asyncio.to_thread(self.set, key, value)
+          else:
+            self.set(key, value)
+        return dict(value)
+      finally:
+        if inflight.get(key) is future:
+          del inflight[key]
+
+  async def _wait_inflight(self, inflight: Dict[str, asyncio.Future], key: str) -> Any:
+    # The in-flight result for `key`, _RETRY if its owner gave up, or None if nothing is running.
+    pending = inflight.get(key)
+    if pending is None:
+      return None
+    with self._lock:
+      self.coalesced += 1
+    value = await asyncio.shield(pending)
+    return value if value is _RETRY else dict(value)
+
+  def _store_memory(self, key: str, value: Classification, stored_at: float) -> None:
+    with self._lock:
+      self._entries[key] = (stored_at, dict(value))
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+        self.evictions += 1
+
+  def _disk_path(self, key: str) -> Path:
+    assert self.disk_dir is not None
+    return self.disk_dir / key[:2] / f"{key}.json"
+
+  def _read_disk(self, key: str, now: float) -> Optional[tuple[float, Classification]]:
+    if not self.disk_dir:
+      return None
+    path = self._disk_path(key)
+    try:
+      payload = json.loads(path.read_text())
+    except FileNotFoundError:
+      return None
+    except (OSError, ValueError) as exc:
+      logger.warning("Discarding unreadable cache entry {}: {}", path, exc)
+      path.unlink(missing_ok=True)
+      return None
+    stored_at = float(payload.get("stored_at", 0))
+    if now - stored_at > self.ttl_seconds:
+      path.unlink(missing_ok=True)
+      return None
+    return stored_at, payload["value"]
+
+  def _write_disk(self, key: str, value: Classification, stored_at: float) -> None:
+    if not self.disk_dir:
+      return
+    path = self._disk_path(key)
+    try:
+      path.parent.mkdir(parents=True, exist_ok=True)
+      tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+      tmp_path.write_text(json.dumps({"stored_at": stored_at, "value": value}))
+      os.replace(tmp_path, path)
+    except OSError as exc:
+      logger.warning("Failed to persist cache entry {}: {}", path, exc)
+
+
+classification_cache = ClassificationCache()
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Mapping, MutableMapping, Optional, Tuple
+
+from loguru import logger
+
+from .department_router import (
+    EMERGENCY_ESCALATION,
+    _assignment,
+    _escalation,
+    current_routing_table,
+    resolve_district,
+)
+
+DEFAULT_ASSIGNMENT_FIELD = "department"
+
+GroupKey = Tuple[str, str, bool]  # issue_type, district, escalated
+
+_UNSEEN = object()
+
+
+@dataclass(frozen=True)
+class DepartmentMove:
+    report_id: str
+    from_department: Optional[str]
+    to_department: Optional[str]
+    issue_type: str
+    district: Optional[str]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "report_id": self.report_id,
+            "from": self.from_department,
+            "to": self.to_department,
+            "issue_type": self.issue_type,
+            "district": self.district,
+        }
+
+
+@dataclass
+class RerouteResult:
+    """
+    Outcome of a re-routing run. Routing is kept once per group; a report's
+    full assignment is built on demand by assignment() or apply_reroute().
+    """
+
+    routing_version: str
+    templates: Dict[GroupKey, Dict[str, Any]] = field(default_factory=dict)
+    report_groups: Dict[str, Tuple[GroupKey, float]] = field(default_factory=dict)
+    moves: List[DepartmentMove] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    def __len__(self) -> int:
+        return len(self.report_groups)
+
+    @property
+    def groups(self) -> int:
+        return len(self.templates)
+
+    def assignment(self, report_id: str) -> Dict[str, Any]:
+        """The assign_department result for a re-routed report."""
+        key, priority_score = self.report_groups[report_id]
+        return _copy_assignment(self.templates[key], priority_score)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Moves aggregated per (from, to) department pair, largest first."""
+        counts = Counter((move.from_department, move.to_department) for move in self.moves)
+        return [
+            {"from": source, "to": target, "reports": count}
+            for (source, target), count in counts.most_common()
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "routing_version": self.routing_version,
+            "reports": len(self),
+            "groups": self.groups,
+            "moved": len(self.moves),
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "summary": self.summary(),
+            "moves": [move.to_dict() for move in self.moves],
+        }
+
+
+def _department_id(assignment: Optional[Mapping[str, Any]]) -> Optional[str]:
+    if not assignment:
+        return None
+    primary = assignment.get("primary_department")
+    return primary.get("id") if primary else None
+
+
+def _copy_assignment(template: Dict[str, Any], priority_score: float) -> Dict[str, Any]:
+    primary = template["primary_department"]
+    return {
+        "primary_department": primary.copy() if primary else None,
+        "backup_departments": [record.copy() for record in template["backup_departments"]],
+        "escalation": _escalation(priority_score) if primary else None,
+        "district": template["district"],
+        "notes": template["notes"],
+    }
+
+
+def _matches(existing: Optional[Mapping[str, Any]], template: Dict[str, Any], escalated: bool) -> bool:
+    # Compares against the group template without building the report's copy;
+    # the escalation reason only depends on the (unchanged) priority score.
+    return (
+        bool(existing)
+        and existing.get("primary_department") == template["primary_department"]
+        and existing.get("backup_departments") == template["backup_departments"]
+        and existing.get("notes") == template["notes"]
+        and existing.get("district") == template["district"]
+        and (existing.get("escalation") is not None) == (escalated and template["primary_department"] is not None)
+    )
+
+
+def reroute_reports(
+    reports: Iterable[Mapping[str, Any]],
+    *,
+    assignment_field: str = DEFAULT_ASSIGNMENT_FIELD,
+    current_department: Optional[Callable[[Mapping[str, Any]], Optional[str]]] = None,
+) -> RerouteResult:
+    """
+    Re-evaluate assign_department for many reports against one snapshot of
+    the routing table. Reports are grouped by (issue_type, district,
+    escalation band) and each group's routing is computed once; every report
+    still gets its own assignment (RerouteResult.assignment), identical to
+    calling assign_department on it. Reports need an "id" plus the fields
+    assign_department reads (issue_type, district, lat/lng or
+    location_lat/location_lng, priority_score). A report's current
+    department is the primary department id under `assignment_field` unless
+    `current_department` says otherwise.
+    """
+    started = time.perf_counter()
+    table = current_routing_table()
+    threshold = EMERGENCY_ESCALATION["threshold"]
+    result = RerouteResult(routing_version=table.version)
+    templates, report_groups, moves = result.templates, result.report_groups, result.moves
+    department_ids: Dict[GroupKey, Optional[str]] = {}
+
+    for report in reports:
+        report_id = str(report["id"])
+        issue_type = report.get("issue_type") or "unclear_issue"
+        district = resolve_district(report)
+        priority_score = float(report.get("priority_score") or 0)
+        key = (issue_type, district or "", priority_score >= threshold)
+        updated = department_ids.get(key, _UNSEEN)
+        if updated is _UNSEEN:
+            templates[key] = _assignment(table, issue_type, district, priority_score)
+            updated = department_ids[key] = _department_id(templates[key])
+
+        report_groups[report_id] = (key, priority_score)
+        if current_department is None:
+            previous = _department_id(report.get(assignment_field))
+        else:
+            previous = current_department(report)
+        if previous != updated:
+            moves.append(DepartmentMove(report_id, previous, updated, issue_type, district))
+
+    result.elapsed_seconds = time.perf_counter() - started
+    logger.info(
+        "Re-routed {} reports in {} groups against routing table {}: {} moved",
+        len(result),
+        result.groups,
+        table.version,
+        len(result.moves),
+    )
+    return result
+
+
+def apply_reroute(
+    result: RerouteResult,
+    store: MutableMapping[str, MutableMapping[str, Any]],
+    *,
+    assignment_field: str = DEFAULT_ASSIGNMENT_FIELD,
+) -> int:
+    """Write changed assignments into `store` (report id -> report); returns how many were updated."""
+    updated = 0
+    templates = result.templates
+    for report_id, (key, priority_score) in result.report_groups.items():
+        report = store.get(report_id)
+        if report is None:
+            continue
+        template = templates[key]
+        if _matches(report.get(assignment_field), template, key[2]):
+            continue
+        report[assignment_field] = _copy_assignment(template, priority_score)
+        updated += 1
+    return updated
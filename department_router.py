@@ -1,10 +1,18 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import os
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
 from loguru import logger
 
+from .district_index import district_index
+
 DEPARTMENT_ROUTES: Dict[str, List[str]] = {
     "pothole": ["Roads & Transport Authority"],
     "damaged_signage": ["Roads & Transport Authority"],
@@ -20,7 +28,14 @@ DISTRICT_SPECIALISTS: Dict[str, List[str]] = {
     "palm jumeirah": ["Community Development Authority", "Parks & Recreation"],
     "jebel ali": ["Waste Management Department"],
     "dubai marina": ["Roads & Transport Authority"],
-    "diera": ["Drainage & Irrigation"],
+    "deira": ["Drainage & Irrigation"],
+}
+
+# Common spellings of district names, normalized before DISTRICT_SPECIALISTS lookups.
+DISTRICT_ALIASES: Dict[str, str] = {
+    "diera": "deira",
+    "the palm jumeirah": "palm jumeirah",
+    "marina": "dubai marina",
 }
 
 EMERGENCY_ESCALATION = {
@@ -30,8 +45,6 @@ EMERGENCY_ESCALATION = {
     "threshold": 80,
 }
 
-_department_cache: Dict[str, Dict[str, str]] = {}
-
 DEPARTMENT_DIRECTORY: Dict[str, Dict[str, str]] = {
     "roads & transport authority": {
         "id": "dept-rta",
@@ -89,74 +102,239 @@ def _normalize(name: str) -> str:
     return name.strip().lower()
 
 
-def _fetch_department_by_name(name: str) -> Optional[Dict[str, str]]:
-    normalized = _normalize(name)
-    if normalized in _department_cache:
-        return _department_cache[normalized]
+def _coordinate(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
 
-    record = DEPARTMENT_DIRECTORY.get(normalized)
-    if record:
-        _department_cache[normalized] = record
-        return record
+def resolve_district(location: Dict[str, Any]) -> Optional[str]:
+    """
+    District for a report location: the polygon containing lat/lng when
+    district boundaries are loaded, otherwise the free-text `district`.
+    """
+    lat = _coordinate(location.get("lat", location.get("location_lat")))
+    lng = _coordinate(location.get("lng", location.get("location_lng")))
+    if lat is not None and lng is not None:
+        resolved = district_index.resolve(lat, lng)
+        if resolved:
+            return resolved
+    return location.get("district")
 
-    logger.warning("Department '{}' not found in static directory; skipping", name)
-    return None
 
+Departments = Tuple[Dict[str, str], ...]
+Route = Tuple[Departments, bool]
+
+ROUTE_MEMO_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class RoutingTable:
+    """
+    Routes and directory compiled into resolved department tuples per issue
+    type and per specialist district. A table is never mutated: a directory
+    change compiles a new one and swaps it in, together with its memo of
+    (issue_type, district) -> route, so no lookup can see a stale entry.
+    Records are handed out as copies.
+    """
+
+    version: str
+    directory: Mapping[str, Dict[str, str]]
+    issue_routes: Mapping[str, Departments]
+    district_routes: Mapping[str, Departments]
+    aliases: Mapping[str, str]
+    _memo: Dict[Tuple[str, str], Route] = field(default_factory=dict, compare=False, repr=False)
+
+    def route(self, issue_type: str, district: Optional[str]) -> Route:
+        """(departments, district has specialists) for an issue type and free-text district."""
+        key = (issue_type, district or "")
+        found = self._memo.get(key)
+        if found is not None:
+            return found
+        normalized = _normalize(district or "")
+        specialists = self.district_routes.get(self.aliases.get(normalized, normalized))
+        departments = self.issue_routes.get(issue_type, ())
+        if specialists:
+            departments = departments + tuple(d for d in specialists if d not in departments)
+        found = (departments, specialists is not None)
+        if len(self._memo) >= ROUTE_MEMO_SIZE:
+            self._memo.clear()
+        self._memo[key] = found
+        return found
+
+    def lookup(self, issue_type: str, district: Optional[str]) -> List[Dict[str, str]]:
+        return [record.copy() for record in self.route(issue_type, district)[0]]
+
+
+def compile_routing_table(
+    routes: Mapping[str, List[str]],
+    specialists: Mapping[str, List[str]],
+    directory: Mapping[str, Mapping[str, str]],
+    aliases: Mapping[str, str],
+    version: str = "builtin",
+) -> RoutingTable:
+    frozen_directory = {_normalize(key): dict(record) for key, record in directory.items()}
+    missing = set()
+
+    def resolve(names: List[str]) -> Departments:
+        resolved = []
+        for name in names:
+            record = frozen_directory.get(_normalize(name))
+            if record is None:
+                missing.add(name)
+            elif record not in resolved:
+                resolved.append(record)
+        return tuple(resolved)
+
+    table = RoutingTable(
+        version=version,
+        directory=MappingProxyType(frozen_directory),
+        issue_routes=MappingProxyType({issue_type: resolve(names) for issue_type, names in routes.items()}),
+        district_routes=MappingProxyType({_normalize(key): resolve(names) for key, names in specialists.items()}),
+        aliases=MappingProxyType({_normalize(k): _normalize(v) for k, v in aliases.items()}),
+    )
+    for name in sorted(missing):
+        logger.warning("Department '{}' not found in directory; skipping", name)
+    return table
+
+
+DEPARTMENT_DIRECTORY_PATH = os.getenv("DEPARTMENT_DIRECTORY_PATH")
+DEPARTMENT_DIRECTORY_POLL_SECONDS = float(os.getenv("DEPARTMENT_DIRECTORY_POLL_SECONDS", 2))
+
+_routing_table: Optional[RoutingTable] = None
+_directory_stamp: Optional[Tuple[int, int]] = None
+_next_directory_check = 0.0
+_reload_lock = threading.Lock()
 
-def _build_department_list(issue_type: str, district: Optional[str]) -> List[Dict[str, str]]:
-    names = DEPARTMENT_ROUTES.get(issue_type, [])
-    district_names = DISTRICT_SPECIALISTS.get(_normalize(district or ""), [])
-    combined = names + [n for n in district_names if n not in names]
 
-    resolved: List[Dict[str, str]] = []
-    for name in combined:
-        match = _fetch_department_by_name(name)
-        if match:
-            resolved.append(match)
-        else:
-            logger.warning("Department '{}' not found in database; skipping", name)
-    return resolved
+def load_routing_table(path: Optional[str] = None) -> RoutingTable:
+    """
+    Compile the built-in routes, overlaid with the JSON directory file at
+    `path` (any of "departments", "routes", "district_specialists" and
+    "district_aliases"; "departments" may be a list of records or a mapping).
+    """
+    routes, specialists = dict(DEPARTMENT_ROUTES), dict(DISTRICT_SPECIALISTS)
+    directory, aliases = dict(DEPARTMENT_DIRECTORY), dict(DISTRICT_ALIASES)
+    version = "builtin"
+    if path:
+        with open(path, "rb") as handle:
+            raw = handle.read()
+        data = json.loads(raw)
+        departments = data.get("departments")
+        if isinstance(departments, list):
+            directory = {_normalize(record["name"]): record for record in departments}
+        elif isinstance(departments, dict):
+            directory = departments
+        routes = data.get("routes", routes)
+        specialists = data.get("district_specialists", specialists)
+        aliases = data.get("district_aliases", aliases)
+        version = hashlib.sha256(raw).hexdigest()[:12]
+    return compile_routing_table(routes, specialists, directory, aliases, version)
+
+
+def _stamp_directory_file() -> Optional[Tuple[int, int]]:
+    if not DEPARTMENT_DIRECTORY_PATH:
+        return None
+    try:
+        stat = os.stat(DEPARTMENT_DIRECTORY_PATH)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def reload_routing_table() -> RoutingTable:
+    """
+    Recompile and atomically swap the active table. An invalid directory file
+    keeps the previous table (or the built-in routes on first load).
+    """
+    global _routing_table, _directory_stamp
+    with _reload_lock:
+        stamp = _stamp_directory_file()
+        try:
+            table = load_routing_table(DEPARTMENT_DIRECTORY_PATH if stamp else None)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as exc:
+            table = _routing_table or load_routing_table(None)
+            logger.warning("Invalid department directory {}; keeping version {}: {}", DEPARTMENT_DIRECTORY_PATH, table.version, exc)
+        _routing_table, _directory_stamp = table, stamp
+        logger.info("Department routing table {} loaded ({} issue types)", table.version, len(table.issue_routes))
+        return table
+
+
+def current_routing_table() -> RoutingTable:
+    """Active table; the directory file is re-checked at most every DEPARTMENT_DIRECTORY_POLL_SECONDS."""
+    global _next_directory_check
+    table = _routing_table
+    if table is None:
+        return reload_routing_table()
+    if DEPARTMENT_DIRECTORY_PATH:
+        now = time.monotonic()
+        if now >= _next_directory_check:
+            _next_directory_check = now + DEPARTMENT_DIRECTORY_POLL_SECONDS
+            if _stamp_directory_file() != _directory_stamp:
+                return reload_routing_table()
+    return table
+
+
+def _fetch_department_by_name(name: str) -> Optional[Dict[str, str]]:
+    record = current_routing_table().directory.get(_normalize(name))
+    if record is None:
+        logger.warning("Department '{}' not found in directory; skipping", name)
+        return None
+    return record.copy()
+
+
+def _build_department_list(issue_type: str, district: Optional[str]) -> List[Dict[str, str]]:
+    return current_routing_table().lookup(issue_type, district)
 
 
 def assign_department(issue_type: str, location: Dict[str, Optional[str]]) -> Dict[str, Any]:  # type: ignore[name-defined]
     """
     Determine the municipal department responsible for the reported issue.
     location dict can include:
-      - district: textual district/neighborhood name
+      - district: textual district/neighborhood name, used when lat/lng fall
+        outside the loaded district polygons
       - priority_score: numeric value (0-100)
-      - lat/lng: reserved for future proximity-based routing
+      - lat/lng: resolved to a district through the polygon index
     """
     issue_type = issue_type or "unclear_issue"
-    district = (location or {}).get("district")
+    district = resolve_district(location or {})
     priority_score = float((location or {}).get("priority_score") or 0)
+    return _assignment(current_routing_table(), issue_type, district, priority_score)
+
+
+def _escalation(priority_score: float) -> Optional[Dict[str, Any]]:
+    if priority_score < EMERGENCY_ESCALATION["threshold"]:
+        return None
+    return {
+        "name": EMERGENCY_ESCALATION["name"],
+        "contact_email": EMERGENCY_ESCALATION["contact_email"],
+        "phone": EMERGENCY_ESCALATION["phone"],
+        "reason": f"Priority score {priority_score} exceeded threshold {EMERGENCY_ESCALATION['threshold']}",
+    }
+
 
-    departments = _build_department_list(issue_type, district)
+def _assignment(table: RoutingTable, issue_type: str, district: Optional[str], priority_score: float) -> Dict[str, Any]:
+    routed, has_specialists = table.route(issue_type, district)
+    departments = [record.copy() for record in routed]
     if not departments:
-        logger.warning("No department match for issue_type=%s district=%s", issue_type, district)
+        logger.warning("No department match for issue_type={} district={}", issue_type, district)
         return {
             "primary_department": None,
             "backup_departments": [],
             "escalation": None,
+            "district": district,
             "notes": f"No department match for {issue_type}. Manual review required.",
         }
 
-    escalation = None
-    if priority_score >= EMERGENCY_ESCALATION["threshold"]:
-        escalation = {
-            "name": EMERGENCY_ESCALATION["name"],
-            "contact_email": EMERGENCY_ESCALATION["contact_email"],
-            "phone": EMERGENCY_ESCALATION["phone"],
-            "reason": f"Priority score {priority_score} exceeded threshold {EMERGENCY_ESCALATION['threshold']}",
-        }
-
     return {
         "primary_department": departments[0],
         "backup_departments": departments[1:],
-        "escalation": escalation,
+        "escalation": _escalation(priority_score),
+        "district": district,
         "notes": (
             f"District specialist added for {district}."
-            if district and district.lower() in DISTRICT_SPECIALISTS
+            if district and has_specialists
             else None
         ),
     }
-
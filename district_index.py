@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+DISTRICT_GEOJSON_PATH = os.getenv("DISTRICT_GEOJSON_PATH")
+DISTRICT_NAME_PROPERTIES: Tuple[str, ...] = ("district", "name", "NAME", "district_name")
+# Grid resolution: roughly this many cells per polygon.
+GRID_CELLS_PER_POLYGON = 64
+
+Ring = Tuple[Tuple[float, ...], Tuple[float, ...]]  # (xs, ys) = (lngs, lats)
+BBox = Tuple[float, float, float, float]  # min_x, min_y, max_x, max_y
+Segment = Tuple[float, float, float, float]
+# Per grid cell and polygon: (polygon index, cell centre inside?, edges touching the cell).
+CellEntry = Tuple[int, bool, Tuple[Segment, ...]]
+
+
+@dataclass(frozen=True)
+class DistrictPolygon:
+    name: str
+    bbox: BBox
+    # One entry per polygon part: (exterior ring, holes).
+    parts: Tuple[Tuple[Ring, Tuple[Ring, ...]], ...]
+    area: float
+
+
+def _ring(coordinates: Sequence[Sequence[float]]) -> Ring:
+    xs = tuple(float(point[0]) for point in coordinates)
+    ys = tuple(float(point[1]) for point in coordinates)
+    return xs, ys
+
+
+def _ring_area(ring: Ring) -> float:
+    xs, ys = ring
+    total = 0.0
+    for i in range(len(xs) - 1):
+        total += xs[i] * ys[i + 1] - xs[i + 1] * ys[i]
+    return abs(total) / 2
+
+
+def _in_ring(x: float, y: float, ring: Ring) -> bool:
+    # Even-odd ray casting; GeoJSON rings repeat their first point at the end.
+    xs, ys = ring
+    inside = False
+    j = len(xs) - 1
+    for i in range(len(xs)):
+        yi, yj = ys[i], ys[j]
+        if (yi > y) != (yj > y) and x < (xs[j] - xs[i]) * (y - yi) / (yj - yi) + xs[i]:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _orientation(ax: float, ay: float, bx: float, by: float, px: float, py: float) -> float:
+    return (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+
+
+def _crosses(px: float, py: float, cx: float, cy: float, edge: Segment) -> bool:
+    # Half-open on the edge endpoints (like the ray cast), so passing through
+    # a shared vertex counts once.
+    x1, y1, x2, y2 = edge
+    if (_orientation(px, py, cx, cy, x1, y1) > 0) == (_orientation(px, py, cx, cy, x2, y2) > 0):
+        return False
+    return (_orientation(x1, y1, x2, y2, px, py) > 0) != (_orientation(x1, y1, x2, y2, cx, cy) > 0)
+
+
+def _contains(polygon: DistrictPolygon, x: float, y: float) -> bool:
+    min_x, min_y, max_x, max_y = polygon.bbox
+    if not (min_x <= x <= max_x and min_y <= y <= max_y):
+        return False
+    for exterior, holes in polygon.parts:
+        if _in_ring(x, y, exterior) and not any(_in_ring(x, y, hole) for hole in holes):
+            return True
+    return False
+
+
+def _polygon_from_feature(feature: Dict[str, Any], name_properties: Sequence[str]) -> Optional[DistrictPolygon]:
+    geometry = feature.get("geometry") or {}
+    properties = feature.get("properties") or {}
+    name = next((str(properties[key]) for key in name_properties if properties.get(key)), None)
+    if name is None:
+        return None
+    if geometry.get("type") == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry.get("type") == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        return None
+
+    parts = []
+    for rings in polygons:
+        if not rings:
+            continue
+        exterior = _ring(rings[0])
+        parts.append((exterior, tuple(_ring(hole) for hole in rings[1:])))
+    if not parts:
+        return None
+    xs = [x for exterior, _ in parts for x in exterior[0]]
+    ys = [y for exterior, _ in parts for y in exterior[1]]
+    area = sum(_ring_area(exterior) - sum(_ring_area(hole) for hole in holes) for exterior, holes in parts)
+    return DistrictPolygon(name=name, bbox=(min(xs), min(ys), max(xs), max(ys)), parts=tuple(parts), area=area)
+
+
+class DistrictIndex:
+    """
+    Offline point-in-polygon district lookup over a uniform lng/lat grid. At
+    build time every cell records, per polygon it touches, whether the cell
+    centre is inside and which edges overlap the cell. A lookup flips that
+    centre status once per local edge crossed on the way from the point to
+    the centre, so it never walks whole rings. Cells wholly inside a polygon
+    answer without geometry. Overlapping districts resolve to the smallest.
+    """
+
+    def __init__(self, polygons: Iterable[DistrictPolygon] = ()) -> None:
+        self._lock = threading.Lock()
+        self._build(list(polygons))
+
+    def __len__(self) -> int:
+        return len(self._polygons)
+
+    @classmethod
+    def from_geojson(
+        cls,
+        source: str | Path | Dict[str, Any],
+        name_properties: Sequence[str] = DISTRICT_NAME_PROPERTIES,
+    ) -> "DistrictIndex":
+        data = source if isinstance(source, dict) else json.loads(Path(source).read_text(encoding="utf-8"))
+        features = data.get("features", []) if data.get("type") == "FeatureCollection" else [data]
+        polygons = []
+        for feature in features:
+            polygon = _polygon_from_feature(feature, name_properties)
+            if polygon is None:
+                logger.warning("Skipping district feature without a name or polygon geometry")
+                continue
+            polygons.append(polygon)
+        return cls(polygons)
+
+    def load_geojson(self, source: str | Path | Dict[str, Any], name_properties: Sequence[str] = DISTRICT_NAME_PROPERTIES) -> int:
+        """Replace the indexed polygons; returns how many districts were loaded."""
+        loaded = DistrictIndex.from_geojson(source, name_properties)
+        self._build(loaded._polygons)
+        logger.info("Loaded {} district polygons", len(loaded))
+        return len(loaded)
+
+    def resolve(self, lat: float, lng: float) -> Optional[str]:
+        """Name of the district containing (lat, lng), or None if outside all polygons."""
+        grid = self._grid
+        if grid is None:
+            return None
+        polygons, cells, (min_x, min_y, cell_w, cell_h, cols, rows) = grid
+        col = int((lng - min_x) // cell_w)
+        row = int((lat - min_y) // cell_h)
+        if not (0 <= col <= cols and 0 <= row <= rows):
+            return None
+        # Points on the outer max edge belong to the last cell.
+        row, col = min(row, rows - 1), min(col, cols - 1)
+        center_x = min_x + (col + 0.5) * cell_w
+        center_y = min_y + (row + 0.5) * cell_h
+        for index, inside, edges in cells.get((row, col), ()):
+            for edge in edges:
+                if _crosses(lng, lat, center_x, center_y, edge):
+                    inside = not inside
+            if inside:
+                return polygons[index].name
+        return None
+
+    def _build(self, polygons: List[DistrictPolygon]) -> None:
+        # Smallest first, so nested or overlapping districts resolve to the most specific.
+        polygons = sorted(polygons, key=lambda polygon: polygon.area)
+        grid = None
+        if polygons:
+            min_x = min(p.bbox[0] for p in polygons)
+            min_y = min(p.bbox[1] for p in polygons)
+            max_x = max(p.bbox[2] for p in polygons)
+            max_y = max(p.bbox[3] for p in polygons)
+            side = max(1, math.ceil(math.sqrt(len(polygons) * GRID_CELLS_PER_POLYGON)))
+            cell_w = (max_x - min_x) / side or 1e-9
+            cell_h = (max_y - min_y) / side or 1e-9
+            cells: Dict[Tuple[int, int], List[CellEntry]] = {}
+
+            def span(low: float, high: float, origin: float, size: float) -> range:
+                return range(max(0, int((low - origin) // size)), min(side - 1, int((high - origin) // size)) + 1)
+
+            for index, polygon in enumerate(polygons):
+                # Edges are attached to every cell their bounding box overlaps;
+                # extra edges cost time, never correctness.
+                local_edges: Dict[Tuple[int, int], List[Segment]] = {}
+                for exterior, holes in polygon.parts:
+                    for xs, ys in (exterior, *holes):
+                        for i in range(len(xs) - 1):
+                            edge = (xs[i], ys[i], xs[i + 1], ys[i + 1])
+                            for row in span(min(ys[i], ys[i + 1]), max(ys[i], ys[i + 1]), min_y, cell_h):
+                                for col in span(min(xs[i], xs[i + 1]), max(xs[i], xs[i + 1]), min_x, cell_w):
+                                    local_edges.setdefault((row, col), []).append(edge)
+                for row in span(polygon.bbox[1], polygon.bbox[3], min_y, cell_h):
+                    for col in span(polygon.bbox[0], polygon.bbox[2], min_x, cell_w):
+                        edges = tuple(local_edges.get((row, col), ()))
+                        inside = _contains(polygon, min_x + (col + 0.5) * cell_w, min_y + (row + 0.5) * cell_h)
+                        if inside or edges:
+                            cells.setdefault((row, col), []).append((index, inside, edges))
+            grid = (tuple(polygons), cells, (min_x, min_y, cell_w, cell_h, side, side))
+        with self._lock:
+            self._polygons = polygons
+            # Readers take one reference to the whole tuple, so a reload swaps atomically.
+            self._grid = grid
+
+
+district_index = DistrictIndex()
+if DISTRICT_GEOJSON_PATH:
+    try:
+        district_index.load_geojson(DISTRICT_GEOJSON_PATH)
+    except (OSError, ValueError, KeyError) as exc:
+        logger.warning("Could not load district polygons from {}: {}", DISTRICT_GEOJSON_PATH, exc)
@@ -0,0 +1,486 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+DURABLE_STORE_DIR = os.getenv("DURABLE_STORE_DIR") or str(Path(__file__).resolve().parents[2] / "data" / "stores")
+WAL_FSYNC = os.getenv("WAL_FSYNC", "true").lower() not in {"0", "false", "no"}
+# Take a snapshot (and drop replayed log segments) after this many logged writes,
+# which bounds how much log a restart has to replay.
+WAL_SNAPSHOT_RECORDS = int(os.getenv("WAL_SNAPSHOT_RECORDS", 100_000))
+SNAPSHOT_CHUNK_RECORDS = 10_000
+
+_SNAPSHOT_SUFFIX = ".snapshot"
+_LOG_SUFFIX = ".log"
+# One codec for log records and snapshots, so a value reads back the same
+# whichever of the two it is recovered from.
+_dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+
+class StoreLogError(RuntimeError):
+    pass
+
+
+def _encode(seq: int, payload: str) -> str:
+    body = f"{seq} {payload}"
+    return f"{zlib.crc32(body.encode()):08x} {body}\n"
+
+
+def _decode(line: str) -> Optional[Tuple[int, str]]:
+    # (seq, JSON payload), or None for a torn or corrupt line (bad checksum, truncated).
+    checksum, _, body = line.rstrip("\n").partition(" ")
+    try:
+        if int(checksum, 16) != zlib.crc32(body.encode()):
+            return None
+        seq, _, payload = body.partition(" ")
+        return int(seq), payload
+    except ValueError:
+        return None
+
+
+def _fsync_directory(directory: Path, enabled: bool) -> None:
+    if not enabled or os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadLog:
+    """
+    Append-only log of checksummed JSON records split into segments named by
+    their first sequence number. Records are assigned a sequence under the
+    log's lock and become durable through group commit: whichever waiting
+    writer finds no flush in progress writes and fsyncs everything pending,
+    so a burst of writers shares one fsync. A failed write stops the log;
+    every later append raises StoreLogError.
+    """
+
+    def __init__(self, directory: str | Path, name: str, fsync: bool = WAL_FSYNC) -> None:
+        self.directory = Path(directory)
+        self.name = name
+        self.fsync = fsync
+        self._cond = threading.Condition()
+        self._pending: List[str] = []
+        self._seq = 0
+        self._durable = 0
+        self._flushing = False
+        self._handle = None
+        self._open_start = 0
+        # While no segment is open, every segment on disk ends at or before this sequence.
+        self._sealed = 0
+        self._failure: Optional[BaseException] = None
+        # Highest sequence covered by a snapshot; older segments are deleted.
+        self._covered = 0
+        self.flushes = 0
+        self.records_written = 0
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    @property
+    def durable_seq(self) -> int:
+        return self._durable
+
+    @property
+    def failed(self) -> bool:
+        return self._failure is not None
+
+    def segments(self) -> List[Tuple[int, Path]]:
+        found = []
+        for path in self.directory.glob(f"{self.name}.*{_LOG_SUFFIX}"):
+            start = path.name[len(self.name) + 1 : -len(_LOG_SUFFIX)]
+            if start.isdigit():
+                found.append((int(start), path))
+        return sorted(found)
+
+    def replay(self, after: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Records with a sequence above `after`, in order. A segment stops at its
+        first bad line and is truncated there (removed if nothing before it is
+        good), so no later write can land after a torn record.
+        """
+        segments = self.segments()
+        for index, (_, path) in enumerate(segments):
+            if index + 1 < len(segments) and segments[index + 1][0] <= after + 1:
+                continue  # every record in this segment is at or before `after`
+            good_bytes, torn = 0, False
+            with path.open("rb") as handle:
+                for number, raw in enumerate(handle, 1):
+                    try:
+                        record = _decode(raw.decode("utf-8")) if raw.endswith(b"\n") else None
+                    except UnicodeDecodeError:
+                        record = None
+                    if record is None:
+                        logger.warning("Dropping torn record at {}:{} and the rest of that segment", path, number)
+                        torn = True
+                        break
+                    good_bytes += len(raw)
+                    if record[0] > after:
+                        yield record[0], json.loads(record[1])
+            if torn:
+                self._truncate(path, good_bytes)
+
+    def _truncate(self, path: Path, size: int) -> None:
+        if size:
+            with path.open("r+b") as handle:
+                handle.truncate(size)
+                if self.fsync:
+                    os.fsync(handle.fileno())
+        else:
+            path.unlink()
+        _fsync_directory(self.directory, self.fsync)
+
+    def start(self, last_seq: int) -> None:
+        """Continue numbering after `last_seq` (the last recovered record), in a new segment."""
+        with self._cond:
+            self._seq = self._durable = self._sealed = last_seq
+
+    def enqueue(self, payload: str) -> int:
+        with self._cond:
+            if self._failure is not None:
+                raise StoreLogError(f"Write-ahead log {self.name} is unavailable") from self._failure
+            self._seq += 1
+            self._pending.append(_encode(self._seq, payload))
+            return self._seq
+
+    def wait_durable(self, seq: int) -> None:
+        with self._cond:
+            while self._durable < seq:
+                if self._failure is not None:
+                    raise StoreLogError(f"Write-ahead log {self.name} is unavailable") from self._failure
+                if self._flushing:
+                    self._cond.wait()
+                else:
+                    self._flush_locked()
+
+    def rotate(self) -> None:
+        """Close the open segment; the next flush starts a new one."""
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+            self._sealed = self._durable
+
+    def drop_segments(self, through: int) -> int:
+        """
+        Delete segments whose records all have sequence <= `through`. The
+        segment still being written is dropped once the log moves past it.
+        """
+        with self._cond:
+            self._covered = max(self._covered, through)
+            # Files only appear during a flush, so once none is running the
+            # directory listing and the open/sealed state agree.
+            while self._flushing:
+                self._cond.wait()
+            open_start = self._open_start if self._handle is not None else None
+            doomed = self._covered_segments(through, open_start)
+            for path in doomed:
+                path.unlink(missing_ok=True)
+        return len(doomed)
+
+    def close(self) -> None:
+        self.wait_durable(self._seq)
+        with self._cond:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+    def _covered_segments(self, through: int, open_start: Optional[int]) -> List[Path]:
+        # Segments ending at or before `through`. A segment ends where the next
+        # one starts; the last one is still open at `open_start`, or closed at
+        # the sealed sequence. Caller must own the directory (lock or flush).
+        segments = self.segments()
+        covered = []
+        for index, (start, path) in enumerate(segments):
+            if start > through or start == open_start:
+                continue
+            if index + 1 < len(segments):
+                end = segments[index + 1][0] - 1
+            elif open_start is None:
+                end = self._sealed
+            else:
+                continue
+            if end <= through:
+                covered.append(path)
+        return covered
+
+    def _flush_locked(self) -> None:
+        batch, self._pending = self._pending, []
+        upto = self._seq
+        self._flushing = True
+        self._cond.release()
+        try:
+            if self._handle is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                start = upto - len(batch) + 1
+                path = self.directory / f"{self.name}.{start:020d}{_LOG_SUFFIX}"
+                # Exclusive create: never append to a segment left by an earlier run.
+                self._handle = path.open("x", encoding="utf-8")
+                self._open_start = start
+                _fsync_directory(self.directory, self.fsync)
+                if self._covered:
+                    for covered in self._covered_segments(self._covered, start):
+                        covered.unlink(missing_ok=True)
+            self._handle.write("".join(batch))
+            self._handle.flush()
+            if self.fsync:
+                os.fsync(self._handle.fileno())
+        except BaseException as exc:
+            self._cond.acquire()
+            self._failure = exc
+            self._flushing = False
+            self._cond.notify_all()
+            logger.error("Write-ahead log {} failed; refusing further writes: {}", self.name, exc)
+            raise StoreLogError(f"Write-ahead log {self.name} failed") from exc
+        self._cond.acquire()
+        self._durable = upto
+        self._flushing = False
+        self.flushes += 1
+        self.records_written += len(batch)
+        self._cond.notify_all()
+
+
+class DurableStore(MutableMapping):
+    """
+    Dict of JSON-serializable values (e.g. reports_store) that survives
+    restarts. A write is visible only once it is durable in the log, and
+    values that JSON cannot encode are rejected with TypeError. Startup
+    loads the latest snapshot and replays the log written after it. Once
+    WAL_SNAPSHOT_RECORDS writes have been logged a background thread writes
+    a new snapshot and drops the segments it covers. Values must be
+    replaced, not mutated in place, for a change to be logged. A write
+    blocks until its flush, so async code uses aset() / adelete().
+    """
+
+    def __init__(
+        self,
+        name: str,
+        directory: str | Path = DURABLE_STORE_DIR,
+        *,
+        fsync: bool = WAL_FSYNC,
+        snapshot_records: int = WAL_SNAPSHOT_RECORDS,
+    ) -> None:
+        self.name = name
+        self.directory = Path(directory)
+        self.snapshot_records = snapshot_records
+        self._log = WriteAheadLog(self.directory, name, fsync=fsync)
+        self._data: Dict[str, Any] = {}
+        # Logged writes not yet durable, in sequence order: (seq, key, value, delete).
+        self._unapplied: deque = deque()
+        self._applied_seq = 0
+        self._snapshot_seq = 0
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._loaded = False
+        self._lock = threading.RLock()
+        self.recovery_seconds = 0.0
+        self.replayed_records = 0
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.directory / f"{self.name}{_SNAPSHOT_SUFFIX}"
+
+    @property
+    def _snapshot_tmp_prefix(self) -> str:
+        # Per store: stores share a directory and clean up only their own leftovers.
+        return f".{self.name}{_SNAPSHOT_SUFFIX}.tmp-"
+
+    def __getitem__(self, key: str) -> Any:
+        if not self._loaded:
+            self._load()
+        return self._data[key]
+
+    def __contains__(self, key: object) -> bool:
+        if not self._loaded:
+            self._load()
+        return key in self._data
+
+    def __iter__(self) -> Iterator[str]:
+        if not self._loaded:
+            self._load()
+        with self._lock:
+            return iter(list(self._data))
+
+    def __len__(self) -> int:
+        if not self._loaded:
+            self._load()
+        return len(self._data)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._write(_dumps({"op": "put", "key": key, "value": value}), key, value)
+
+    def __delitem__(self, key: str) -> None:
+        if not self._loaded:
+            self._load()
+        if key not in self._data:
+            raise KeyError(key)
+        self._write(_dumps({"op": "delete", "key": key}), key, None, delete=True)
+
+    async def aset(self, key: str, value: Any) -> None:
+        """`store[key] = value`, waiting for the flush in a worker thread instead of on the event loop."""
+        await asyncio.to_thread(self.__setitem__, key, value)
+
+    async def adelete(self, key: str) -> None:
+        """`del store[key]`, waiting for the flush in a worker thread instead of on the event loop."""
+        await asyncio.to_thread(self.__delitem__, key)
+
+    def snapshot(self) -> int:
+        """Write a snapshot now; returns the sequence it covers."""
+        if not self._loaded:
+            self._load()
+        with self._lock:
+            # Only durable writes are applied, so the state is already on disk.
+            seq = self._applied_seq
+            state = dict(self._data)
+        # Seal the open segment so it can be dropped once it is covered.
+        self._log.rotate()
+        self._write_snapshot(seq, state)
+        return seq
+
+    def close(self) -> None:
+        thread = self._snapshot_thread
+        if thread is not None and thread.ident is not None:
+            thread.join()
+        self._log.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "records": len(self),
+            "last_seq": self._log.last_seq,
+            "snapshot_seq": self._snapshot_seq,
+            "log_segments": len(self._log.segments()),
+            "flushes": self._log.flushes,
+            "records_written": self._log.records_written,
+            "recovery_seconds": round(self.recovery_seconds, 3),
+            "replayed_records": self.replayed_records,
+        }
+
+    def _write(self, payload: str, key: str, value: Any, delete: bool = False) -> None:
+        if not self._loaded:
+            self._load()
+        # Sequence order is fixed under the lock; the change is applied only
+        # once the log has made it durable, so a failed flush leaves no trace.
+        with self._lock:
+            seq = self._log.enqueue(payload)
+            self._unapplied.append((seq, key, value, delete))
+        try:
+            self._log.wait_durable(seq)
+        finally:
+            with self._lock:
+                self._apply_durable()
+        with self._lock:
+            if seq - self._snapshot_seq >= self.snapshot_records and self._snapshot_thread is None:
+                self._snapshot_thread = threading.Thread(target=self._background_snapshot, daemon=True)
+                self._snapshot_thread.start()
+
+    def _apply_durable(self) -> None:
+        durable = self._log.durable_seq
+        unapplied = self._unapplied
+        while unapplied and unapplied[0][0] <= durable:
+            seq, key, value, delete = unapplied.popleft()
+            if delete:
+                self._data.pop(key, None)
+            else:
+                self._data[key] = value
+            self._applied_seq = seq
+        if self._log.failed:
+            unapplied.clear()
+
+    def _background_snapshot(self) -> None:
+        try:
+            self.snapshot()
+        except Exception as exc:
+            logger.warning("Snapshot of durable store {} failed: {}", self.name, exc)
+        finally:
+            with self._lock:
+                self._snapshot_thread = None
+
+    def _write_snapshot(self, seq: int, state: Dict[str, Any]) -> None:
+        started = time.perf_counter()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, prefix=self._snapshot_tmp_prefix)
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            # A header line, then the records as JSON objects of up to
+            # SNAPSHOT_CHUNK_RECORDS entries, one per line.
+            handle.write(_dumps({"seq": seq, "records": len(state)}) + "\n")
+            items = iter(state.items())
+            while chunk := dict(itertools.islice(items, SNAPSHOT_CHUNK_RECORDS)):
+                handle.write(_dumps(chunk) + "\n")
+            handle.flush()
+            if self._log.fsync:
+                os.fsync(handle.fileno())
+        os.replace(tmp_name, self.snapshot_path)
+        _fsync_directory(self.directory, self._log.fsync)
+        with self._lock:
+            self._snapshot_seq = max(self._snapshot_seq, seq)
+        dropped = self._log.drop_segments(seq)
+        logger.info(
+            "Snapshot of {} at seq {} ({} records) in {:.2f}s; dropped {} log segments",
+            self.name,
+            seq,
+            len(state),
+            time.perf_counter() - started,
+            dropped,
+        )
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            started = time.perf_counter()
+            # Snapshots interrupted by a crash before their rename.
+            for leftover in self.directory.glob(f"{self._snapshot_tmp_prefix}*"):
+                leftover.unlink(missing_ok=True)
+            data: Dict[str, Any] = {}
+            seq = 0
+            if self.snapshot_path.exists():
+                with self.snapshot_path.open(encoding="utf-8") as handle:
+                    header = json.loads(handle.readline())
+                    seq = header["seq"]
+                    for line in handle:
+                        data.update(json.loads(line))
+                if len(data) != header["records"]:
+                    raise StoreLogError(f"Snapshot {self.snapshot_path} is incomplete")
+            self._snapshot_seq = seq
+            replayed = 0
+            for seq, record in self._log.replay(after=seq):
+                if record["op"] == "put":
+                    data[record["key"]] = record["value"]
+                else:
+                    data.pop(record["key"], None)
+                replayed += 1
+            # New writes go to a fresh segment, never after a torn line.
+            self._log.start(max(seq, self._snapshot_seq))
+            self._data = data
+            self._applied_seq = self._log.last_seq
+            self.replayed_records = replayed
+            self.recovery_seconds = time.perf_counter() - started
+            self._loaded = True
+            logger.info(
+                "Recovered durable store {}: {} records ({} replayed from the log) in {:.2f}s",
+                self.name,
+                len(data),
+                replayed,
+                self.recovery_seconds,
+            )
+
+
+reports_store = DurableStore("reports")
+comments_store = DurableStore("comments")
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import io
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from fastapi import UploadFile
+from loguru import logger
+from PIL import Image, ImageOps
+
+from .image_processor import (
+  MAX_WIDTH,
+  MODEL_RENDITION_MAX_SIDE,
+  MODEL_RENDITION_QUALITY,
+  ImageDecodeError,
+  blur_faces_array,
+  encode_webp_counted,
+  open_downscaled,
+  quality_metrics,
+  resize_to_max_width,
+  run_image_job,
+  spooled_upload,
+)
+
+THUMBNAIL_WIDTHS: Tuple[int, ...] = (200, 500)
+THUMBNAIL_QUALITY = 80
+PRIVACY_BLUR_FACES = os.environ.get('PRIVACY_BLUR_FACES', 'false').lower() in {'1', 'true', 'yes'}
+
+_EXIF_IFD = 0x8769
+_GPS_IFD = 0x8825
+_EXIF_TAGS = {0x010F: 'make', 0x0110: 'model', 0x0112: 'orientation'}
+_EXIF_SUBIFD_TAGS = {0x9003: 'datetime_original'}
+
+
+@dataclass
+class PipelineResult:
+  optimized: bytes
+  width: int
+  height: int
+  metadata: Dict[str, Any]
+  exif: Dict[str, Any]
+  thumbnails: Dict[int, bytes] = field(default_factory=dict)
+  model_rendition: Optional[bytes] = None
+  original: bytes = b''
+  content_type: str = 'image/webp'
+  encode_attempts: int = 0
+  faces_blurred: int = 0
+  timings_ms: Dict[str, float] = field(default_factory=dict)
+
+
+class _StageTimer:
+  def __init__(self) -> None:
+    self.timings: Dict[str, float] = {}
+    self._last = time.perf_counter()
+
+  def mark(self, stage: str) -> None:
+    now = time.perf_counter()
+    self.timings[stage] = round((now - self._last) * 1000, 2)
+    self._last = now
+
+
+def _gps_to_degrees(values: Any, ref: Any) -> Optional[float]:
+  try:
+    degrees, minutes, seconds = (float(v) for v in values)
+  except (TypeError, ValueError):
+    return None
+  result = degrees + minutes / 60 + seconds / 3600
+  return -result if ref in ('S', 'W') else result
+
+
+def extract_exif(image: Image.Image) -> Dict[str, Any]:
+  exif = image.getexif()
+  info: Dict[str, Any] = {name: exif.get(tag) for tag, name in _EXIF_TAGS.items() if exif.get(tag) is not None}
+  sub_ifd = exif.get_ifd(_EXIF_IFD)
+  info.update({name: sub_ifd.get(tag) for tag, name in _EXIF_SUBIFD_TAGS.items() if sub_ifd.get(tag) is not None})
+  gps = exif.get_ifd(_GPS_IFD)
+  if gps:
+    lat = _gps_to_degrees(gps.get(2), gps.get(1))
+    lng = _gps_to_degrees(gps.get(4), gps.get(3))
+    if lat is not None and lng is not None:
+      info['gps_lat'] = lat
+      info['gps_lng'] = lng
+  return info
+
+
+class ImagePipeline:
+  """
+  Decode an upload once and derive everything the report flow needs from that
+  single buffer: optimized WEBP, quality metadata, thumbnails, EXIF and the
+  classifier rendition. With `blur_faces`, faces are blurred before any
+  output is encoded, so nothing unblurred is ever uploaded.
+  """
+
+  def __init__(
+    self,
+    *,
+    max_width: int = MAX_WIDTH,
+    thumbnail_widths: Tuple[int, ...] = THUMBNAIL_WIDTHS,
+    model_rendition_side: Optional[int] = MODEL_RENDITION_MAX_SIDE,
+    blur_faces: bool = PRIVACY_BLUR_FACES,
+  ) -> None:
+    self.blur_faces = blur_faces
+    self.max_width = max_width
+    self.thumbnail_widths = thumbnail_widths
+    self.model_rendition_side = model_rendition_side
+
+  def run(self, source: bytes | str, capture_timestamp: str = '') -> PipelineResult:
+    """
+    Synchronous, CPU-bound pipeline body over upload bytes or a spooled file
+    path. JPEGs are decoded at reduced resolution close to max_width. Raises
+    ImageDecodeError for undecodable input.
+    """
+    timer = _StageTimer()
+    try:
+      image = open_downscaled(source, self.max_width)
+      exif = extract_exif(image)
+      image = ImageOps.exif_transpose(image).convert('RGB')
+    except Exception as exc:  # noqa: BLE001
+      raise ImageDecodeError(str(exc)) from exc
+    timer.mark('decode')
+
+    image = resize_to_max_width(image, self.max_width)
+    timer.mark('resize')
+
+    # Single-channel view for OpenCV; np.asarray reads PIL's buffer without an extra RGB copy.
+    gray = np.asarray(image.convert('L'))
+    metadata = {'capture_timestamp': capture_timestamp or str(exif.get('datetime_original', '')), **quality_metrics(gray)}
+    timer.mark('metadata')
+
+    faces_blurred = 0
+    if self.blur_faces:
+      pixels = np.array(image)
+      faces_blurred = blur_faces_array(pixels, gray)
+      if faces_blurred:
+        image = Image.fromarray(pixels)
+      timer.mark('face_blur')
+
+    optimized, encode_attempts = encode_webp_counted(image)
+    timer.mark('encode')
+
+    thumbnails = {width: self._thumbnail(image, width) for width in self.thumbnail_widths}
+    timer.mark('thumbnails')
+
+    model_rendition = None
+    if self.model_rendition_side:
+      rendition = image.copy()
+      rendition.thumbnail((self.model_rendition_side, self.model_rendition_side), Image.LANCZOS)
+      buffer = io.BytesIO()
+      rendition.save(buffer, format='JPEG', quality=MODEL_RENDITION_QUALITY, optimize=True)
+      model_rendition = buffer.getvalue()
+      timer.mark('model_rendition')
+
+    return PipelineResult(
+      optimized=optimized,
+      width=image.width,
+      height=image.height,
+      metadata=metadata,
+      exif=exif,
+      thumbnails=thumbnails,
+      model_rendition=model_rendition,
+      original=source if isinstance(source, bytes) else b'',
+      encode_attempts=encode_attempts,
+      faces_blurred=faces_blurred,
+      timings_ms=timer.timings,
+    )
+
+  async def process(self, file: UploadFile) -> PipelineResult:
+    """
+    Stream the upload once to a size-limited spool file and run the pipeline on
+    it in the image process pool. The original is not kept in memory, so
+    `original` is empty on the result.
+    """
+    capture_timestamp = file.headers.get('x-photo-timestamp', '') if file.headers else ''
+    async with spooled_upload(file) as path:
+      result = await run_image_job(self.run, str(path), capture_timestamp)
+    logger.debug('Image pipeline timings (ms): {}', result.timings_ms)
+    return result
+
+  @staticmethod
+  def _thumbnail(image: Image.Image, width: int) -> bytes:
+    ratio = width / float(image.width)
+    thumb = image.resize((width, max(1, int(image.height * ratio))), Image.LANCZOS) if image.width > width else image
+    buffer = io.BytesIO()
+    thumb.save(buffer, format='WEBP', quality=THUMBNAIL_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+image_pipeline = ImagePipeline()
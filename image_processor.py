@@ -1,7 +1,16 @@
 from __future__ import annotations
 
+import asyncio
 import io
-from typing import Dict
+import math
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Tuple, TypeVar
 
 import cloudinary
 import cloudinary.uploader
@@ -9,56 +18,237 @@ import cv2
 import numpy as np
 from fastapi import HTTPException, UploadFile, status
 from loguru import logger
-from PIL import Image
+from PIL import Image, ImageOps
 
 MAX_WIDTH = 1920
 TARGET_SIZE_BYTES = 500 * 1024
 CLOUDINARY_FOLDER = 'citylens/uploads'
+MODEL_RENDITION_MAX_SIDE = 768
+MODEL_RENDITION_QUALITY = 80
+WEBP_MAX_QUALITY = 95
+WEBP_MIN_QUALITY = 40
+WEBP_QUALITY_STEP = 5
+WEBP_NEAR_TARGET_RATIO = 1.6
+IMAGE_ENCODE_WORKERS = int(os.environ.get('IMAGE_ENCODE_WORKERS', min(4, os.cpu_count() or 1)))
+IMAGE_ENCODE_MAX_QUEUE = int(os.environ.get('IMAGE_ENCODE_MAX_QUEUE', 16))
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 25 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_SPOOL_DIR = os.environ.get('UPLOAD_SPOOL_DIR') or None
+_ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+FACE_DETECT_WIDTH = 640
+
+T = TypeVar('T')
+
+_encode_pool: Optional[ProcessPoolExecutor] = None
+_encode_depth = 0
+_encode_latencies: Deque[float] = deque(maxlen=1000)
+_encode_counts = {'images': 0, 'encodes': 0, 'rejected': 0}
+
+
+class ImageDecodeError(ValueError):
+  """Raised inside pool workers; HTTPException does not survive pickling."""
 
 
 async def optimize_image(file: UploadFile) -> bytes:
+  async with spooled_upload(file) as path:
+    optimized, _ = await run_image_job(optimize_bytes, str(path))
+  return optimized
+
+
+@asynccontextmanager
+async def spooled_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> AsyncIterator[Path]:
+  """
+  Stream an upload to a temporary file in UPLOAD_CHUNK_BYTES chunks, rejecting
+  it with 413 as soon as it exceeds `max_bytes`. Yields the file path (removed
+  on exit), so the raw upload is never held in memory as a whole.
+  """
+  handle = tempfile.NamedTemporaryFile(prefix='citylens-upload-', dir=UPLOAD_SPOOL_DIR, delete=False)
+  path = Path(handle.name)
+  try:
+    written = 0
+    with handle:
+      while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+          break
+        written += len(chunk)
+        if written > max_bytes:
+          raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f'Image exceeds the {max_bytes // (1024 * 1024)}MB upload limit',
+          )
+        handle.write(chunk)
+    if not written:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Empty image file.')
+    yield path
+  finally:
+    path.unlink(missing_ok=True)
+
+
+def open_downscaled(source: bytes | str | Path, max_width: int = MAX_WIDTH) -> Image.Image:
+  """
+  Open an image and, for JPEGs, let libjpeg decode straight to the smallest
+  1/2, 1/4 or 1/8 scale that is still at least `max_width` wide (after EXIF
+  rotation), so a 48MP photo never materializes at full resolution. The
+  result still needs resize_to_max_width for the exact size.
+  """
+  image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+  rotated = image.getexif().get(0x0112) in _ROTATED_ORIENTATIONS
+  width, height = (image.height, image.width) if rotated else image.size
+  if width > max_width:
+    scale = max_width / float(width)
+    requested = (math.ceil(width * scale), math.ceil(height * scale))
+    image.draft('RGB', requested[::-1] if rotated else requested)
+  return image
+
+
+def optimize_bytes(source: bytes | str) -> Tuple[bytes, int]:
+  """
+  Decode, resize and WEBP-encode an upload given as bytes or a spooled file
+  path; returns (bytes, encode attempts).
+  """
   try:
-    contents = await file.read()
-    image = Image.open(io.BytesIO(contents))
+    image = open_downscaled(source)
+    image = image.convert('RGB')
   except Exception as exc:  # noqa: BLE001
+    raise ImageDecodeError(str(exc)) from exc
+
+  return encode_webp_counted(resize_to_max_width(image))
+
+
+def _get_encode_pool() -> Optional[ProcessPoolExecutor]:
+  global _encode_pool
+  if IMAGE_ENCODE_WORKERS <= 0:
+    return None
+  if _encode_pool is None:
+    _encode_pool = ProcessPoolExecutor(max_workers=IMAGE_ENCODE_WORKERS, initializer=_warm_worker)
+  return _encode_pool
+
+
+def shutdown_encode_pool() -> None:
+  global _encode_pool
+  if _encode_pool is not None:
+    _encode_pool.shutdown(wait=False, cancel_futures=True)
+    _encode_pool = None
+
+
+async def run_image_job(func: Callable[..., T], *args: Any) -> T:
+  """
+  Run a CPU-bound image job in the bounded process pool (a thread when
+  IMAGE_ENCODE_WORKERS=0). Jobs beyond workers + IMAGE_ENCODE_MAX_QUEUE are
+  rejected with 503 instead of queueing without bound. Jobs whose result is a
+  (payload, encode_attempts) tuple or carries `encode_attempts` feed encode_stats().
+  """
+  global _encode_depth
+  if _encode_depth >= max(1, IMAGE_ENCODE_WORKERS) + IMAGE_ENCODE_MAX_QUEUE:
+    _encode_counts['rejected'] += 1
+    logger.warning('Image processing queue full ({} jobs); rejecting upload', _encode_depth)
+    raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Image processing is busy, retry shortly')
+
+  loop = asyncio.get_running_loop()
+  pool = _get_encode_pool()
+  _encode_depth += 1
+  started = loop.time()
+  try:
+    if pool is None:
+      result = await asyncio.to_thread(func, *args)
+    else:
+      result = await loop.run_in_executor(pool, func, *args)
+  except ImageDecodeError as exc:
     logger.error('Failed to read image: {}', exc)
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid image file') from exc
+  finally:
+    _encode_depth -= 1
+
+  _encode_latencies.append(loop.time() - started)
+  attempts = result[1] if isinstance(result, tuple) else getattr(result, 'encode_attempts', None)
+  if isinstance(attempts, int):
+    _encode_counts['images'] += 1
+    _encode_counts['encodes'] += attempts
+  return result
+
+
+def encode_stats() -> Dict[str, Any]:
+  ordered = sorted(_encode_latencies)
+
+  def _pct(pct: float) -> Optional[float]:
+    if not ordered:
+      return None
+    return round(ordered[min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1)], 4)
+
+  images = _encode_counts['images']
+  return {
+    **_encode_counts,
+    'encodes_per_image': round(_encode_counts['encodes'] / images, 2) if images else 0.0,
+    'queue_depth': _encode_depth,
+    'p50_seconds': _pct(50),
+    'p99_seconds': _pct(99),
+  }
 
-  image = image.convert('RGB')
+
+def resize_to_max_width(image: Image.Image, max_width: int = MAX_WIDTH) -> Image.Image:
   width, height = image.size
-  if width > MAX_WIDTH:
-    ratio = MAX_WIDTH / float(width)
+  if width > max_width:
+    ratio = max_width / float(width)
     new_height = int(height * ratio)
-    image = image.resize((MAX_WIDTH, new_height), Image.LANCZOS)
+    image = image.resize((max_width, new_height), Image.LANCZOS)
+  return image
 
-  buffer = io.BytesIO()
-  quality = 95
-  while True:
-    buffer.seek(0)
+
+def encode_webp(image: Image.Image) -> bytes:
+  return encode_webp_counted(image)[0]
+
+
+def encode_webp_counted(image: Image.Image) -> Tuple[bytes, int]:
+  """
+  Encode at the highest quality step (95, 90, ... 40) that fits TARGET_SIZE_BYTES.
+  Output size grows with quality, so after trying 95 the remaining steps are
+  bisected: at most 5 encodes instead of up to 12 for the linear walk. When
+  95 overshoots only slightly, 90 is tried first since it usually fits.
+  Returns (bytes, encode attempts).
+  """
+  qualities = list(range(WEBP_MAX_QUALITY, WEBP_MIN_QUALITY - 1, -WEBP_QUALITY_STEP))
+  encodes = 0
+
+  def _encode(quality: int) -> bytes:
+    nonlocal encodes
+    encodes += 1
+    buffer = io.BytesIO()
     image.save(buffer, format='WEBP', quality=quality, method=6)
-    size = buffer.tell()
-    if size <= TARGET_SIZE_BYTES or quality <= 40:
-      break
-    quality -= 5
+    return buffer.getvalue()
 
-  return buffer.getvalue()
+  best = _encode(qualities[0])
+  if len(best) <= TARGET_SIZE_BYTES:
+    return best, encodes
 
+  # Invariant: qualities[lo - 1] is too large; find the first index that fits.
+  lo, hi = 1, len(qualities) - 1
+  fitting: Optional[bytes] = None
+  near_target = len(best) <= TARGET_SIZE_BYTES * WEBP_NEAR_TARGET_RATIO
+  while lo <= hi:
+    mid = lo if near_target else (lo + hi) // 2
+    near_target = False
+    candidate = _encode(qualities[mid])
+    if len(candidate) <= TARGET_SIZE_BYTES:
+      fitting = candidate
+      hi = mid - 1
+    else:
+      lo = mid + 1
+      best = candidate
 
-async def extract_metadata(file: UploadFile) -> Dict[str, str | float | bool]:
-  contents = await file.read()
-  np_image = np.frombuffer(contents, dtype=np.uint8)
-  image = cv2.imdecode(np_image, cv2.IMREAD_COLOR)
-  if image is None:
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Unable to decode image')
+  if fitting is None:
+    # Nothing fits: the search ended on the minimum quality, as the linear walk would.
+    return best, encodes
+  return fitting, encodes
 
-  gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+def quality_metrics(gray: np.ndarray) -> Dict[str, float | bool]:
   mean_brightness = float(np.mean(gray))
   laplacian_var = float(cv2.Laplacian(gray, cv2.CV_64F).var())
   too_dark = mean_brightness < 50
   blurry = laplacian_var < 20
 
   return {
-    'capture_timestamp': file.headers.get('x-photo-timestamp', ''),
     'mean_brightness': mean_brightness,
     'sharpness_score': laplacian_var,
     'too_dark': too_dark,
@@ -67,9 +257,25 @@ async def extract_metadata(file: UploadFile) -> Dict[str, str | float | bool]:
   }
 
 
+async def extract_metadata(file: UploadFile) -> Dict[str, str | float | bool]:
+  contents = await file.read()
+  np_image = np.frombuffer(contents, dtype=np.uint8)
+  image = cv2.imdecode(np_image, cv2.IMREAD_COLOR)
+  if image is None:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Unable to decode image')
+
+  gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+  return {
+    'capture_timestamp': file.headers.get('x-photo-timestamp', ''),
+    **quality_metrics(gray),
+  }
+
+
 async def upload_to_cloudinary(image_bytes: bytes) -> str:
   try:
-    response = cloudinary.uploader.upload(
+    # The Cloudinary SDK is synchronous; keep its network round trip off the event loop.
+    response = await asyncio.to_thread(
+      cloudinary.uploader.upload,
       image_bytes,
       folder=CLOUDINARY_FOLDER,
       resource_type='image',
@@ -84,20 +290,77 @@ async def upload_to_cloudinary(image_bytes: bytes) -> str:
   return response['secure_url']
 
 
+@lru_cache(maxsize=1)
+def _face_detector() -> cv2.CascadeClassifier:
+  # Loaded once per process (event loop process and each pool worker).
+  return cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+
+def _warm_worker() -> None:
+  # A failing initializer would break the whole pool; blurring then fails per job instead.
+  try:
+    _face_detector()
+  except Exception as exc:  # noqa: BLE001
+    logger.warning('Face detector preload failed: {}', exc)
+
+
+def detect_faces(gray: np.ndarray, detect_width: int = FACE_DETECT_WIDTH) -> list[Tuple[int, int, int, int]]:
+  """Detect on a downscaled copy of `gray` and return boxes in full-resolution coordinates."""
+  height, width = gray.shape[:2]
+  scale = min(1.0, detect_width / float(width))
+  small = gray if scale == 1.0 else cv2.resize(gray, (detect_width, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+  faces = _face_detector().detectMultiScale(small, 1.1, 4)
+  boxes = []
+  for (x, y, w, h) in faces:
+    x0, y0 = int(x / scale), int(y / scale)
+    x1, y1 = min(width, int(math.ceil((x + w) / scale))), min(height, int(math.ceil((y + h) / scale)))
+    boxes.append((x0, y0, x1 - x0, y1 - y0))
+  return boxes
+
+
+def blur_faces_array(pixels: np.ndarray, gray: np.ndarray) -> int:
+  """Blur detected faces in `pixels` (any channel order) in place; returns the face count."""
+  faces = detect_faces(gray)
+  for (x, y, w, h) in faces:
+    roi = pixels[y:y + h, x:x + w]
+    blurred = cv2.GaussianBlur(roi, (51, 51), 0)
+    pixels[y:y + h, x:x + w] = blurred
+  return len(faces)
+
+
 async def blur_faces(image_url: str) -> str:
+  """
+  Blur faces in an already-uploaded image and upload a second copy.
+  Prefer ImagePipeline(blur_faces=True), which blurs before the first upload.
+  """
   try:
     data = cloudinary.CloudinaryImage(image_url).download()
     np_image = np.frombuffer(data, np.uint8)
     image = cv2.imdecode(np_image, cv2.IMREAD_COLOR)
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-    for (x, y, w, h) in faces:
-      roi = image[y:y + h, x:x + w]
-      blurred = cv2.GaussianBlur(roi, (51, 51), 0)
-      image[y:y + h, x:x + w] = blurred
+    blur_faces_array(image, gray)
     _, buffer = cv2.imencode('.webp', image)
     return await upload_to_cloudinary(buffer.tobytes())
   except Exception as exc:  # noqa: BLE001
     logger.error('Face blurring failed: {}', exc)
     raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail='Face blurring failed') from exc
+
+
+def make_model_rendition(
+  image_bytes: bytes,
+  max_side: int = MODEL_RENDITION_MAX_SIDE,
+  quality: int = MODEL_RENDITION_QUALITY,
+) -> bytes:
+  """
+  Model-sized JPEG copy of an upload for inline classification requests.
+  CPU-bound; call it off the event loop.
+  """
+  image = Image.open(io.BytesIO(image_bytes))
+  # JPEG draft mode lets libjpeg decode at 1/2, 1/4 or 1/8 scale directly.
+  image.draft('RGB', (max_side, max_side))
+  # Match the stored variants: phone photos carry their rotation in EXIF.
+  image = ImageOps.exif_transpose(image).convert('RGB')
+  image.thumbnail((max_side, max_side), Image.LANCZOS)
+  buffer = io.BytesIO()
+  image.save(buffer, format='JPEG', quality=quality, optimize=True)
+  return buffer.getvalue()
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import asyncio
+import re
+from pathlib import Path
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+
+from ..services.blob_store import blob_store
+from ..services.image_variants import VARIANT_WIDTHS, snap_width, variant_cache
+
+router = APIRouter(prefix="/images", tags=["images"])
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Resolve a single-range ``Range`` header to inclusive (start, end); None if unsatisfiable."""
+    match = _RANGE.match(header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    if not match.group(1):
+        suffix = int(match.group(2))
+        if suffix == 0:
+            return None
+        return max(0, size - suffix), size - 1
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else size - 1
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+@router.get("/{blob_id}")
+async def get_image(
+    blob_id: str,
+    request: Request,
+    w: Optional[int] = Query(default=None, description="Rendition width; rounded up to a supported size"),
+    fmt: Optional[str] = Query(default=None, description="Rendition format: webp, jpeg or png"),
+) -> Response:
+    """Serve a stored image, or a lazily generated rendition when `w` or `fmt` is given."""
+    if w is None and fmt is None:
+        path = blob_store.path_for(blob_id)
+        if path is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+        etag = f'"{blob_store.digest_of(blob_id)}"'
+        media_type = blob_store.content_type_of(blob_id)
+        return await asyncio.to_thread(_file_response, path, etag, media_type, request)
+
+    if not blob_store.exists(blob_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    width = snap_width(w) if w is not None else VARIANT_WIDTHS[-1]
+    variant_fmt = (fmt or "webp").lower()
+    etag = f'"{blob_store.digest_of(blob_id)}-w{width}-{variant_fmt}"'
+    # The variant cannot be evicted until the response body has been read.
+    async with variant_cache.serve_variant(blob_id, width, variant_fmt) as (path, media_type):
+        return await asyncio.to_thread(_file_response, path, etag, media_type, request)
+
+
+def _file_response(path: Path, etag: str, media_type: str, request: Request) -> Response:
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    if etag in {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    size = path.stat().st_size
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = _parse_range(range_header, size)
+        if byte_range is None:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers=headers)
+        start, end = byte_range
+        with path.open("rb") as handle:
+            handle.seek(start)
+            body = handle.read(end - start + 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(content=body, status_code=status.HTTP_206_PARTIAL_CONTENT, media_type=media_type, headers=headers)
+
+    return Response(content=path.read_bytes(), media_type=media_type, headers=headers)
@@ -1,16 +1,25 @@
 from __future__ import annotations
 
-import base64
+import asyncio
 import io
 import os
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any
 
 from fastapi import HTTPException, UploadFile, status
 from PIL import Image
 
+from .image_processor import spooled_upload
+from .storage_backends import LocalBlobBackend, StorageBackend, StorageError, SupabaseStorageBackend, upload_variants
+
+if TYPE_CHECKING:
+    from .image_pipeline import PipelineResult
+
+# Prefix for local-mode image URLs (e.g. http://localhost:8000); relative by default.
+LOCAL_IMAGE_BASE_URL = os.getenv('LOCAL_IMAGE_BASE_URL', '').rstrip('/')
+
 
 class SupabaseImageStorage:
     """Handle image uploads to Supabase Storage."""
@@ -19,23 +28,22 @@ class SupabaseImageStorage:
         self.bucket_name = bucket_name
         self._supabase = None
         self._use_local_fallback = False
-        self._local_dir: Optional[Path] = None
+        self._backend: StorageBackend = LocalBlobBackend(base_url=LOCAL_IMAGE_BASE_URL)
         supabase_url = os.getenv('SUPABASE_URL')
         service_key = os.getenv('SUPABASE_SERVICE_KEY')
 
         if not supabase_url or not service_key:
-            print('Supabase credentials missing. Using local base64 storage.')
+            print('Supabase credentials missing. Using local blob storage.')
             self._use_local_fallback = True
-            uploads_dir = Path(__file__).resolve().parents[2] / 'uploads'
-            uploads_dir.mkdir(parents=True, exist_ok=True)
-            self._local_dir = uploads_dir
             return
 
         try:
             from supabase import create_client  # type: ignore import-time optional
 
+            # The SDK is only used for one-off bucket setup; uploads go through the async backend.
             self._supabase = create_client(supabase_url, service_key)
             self._ensure_bucket_exists()
+            self._backend = SupabaseStorageBackend(supabase_url, service_key, bucket_name)
         except Exception as exc:  # pragma: no cover - defensive
             print(f'Failed to initialize Supabase storage: {exc}')
             self._supabase = None
@@ -60,63 +68,69 @@ class SupabaseImageStorage:
             print(f'Bucket setup failed: {exc}')
 
     async def upload_image(self, file: UploadFile) -> dict[str, Any]:
-        contents = await file.read()
-        if not contents:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Empty image file.')
+        async with spooled_upload(file) as spooled_path:
+            optimized, content_type = await asyncio.to_thread(self._optimize_image, spooled_path)
+        if content_type is None:
+            # Optimization failed and the upload is stored as sent.
+            extension = (file.filename.split('.')[-1] if file.filename else 'jpg').lower()
+            content_type = file.content_type or 'image/jpeg'
+        else:
+            extension = 'jpg'
+        return await self.upload_bytes(optimized, extension=extension, content_type=content_type)
+
+    async def upload_bytes(self, data: bytes, *, extension: str, content_type: str) -> dict[str, Any]:
+        """Store already-encoded bytes (e.g. ImagePipeline output) without decoding them again."""
+        file_path = self._new_path(extension)
+        try:
+            url = await self._backend.put(file_path, data, content_type)
+        except StorageError as exc:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'Image upload failed: {exc}')
 
-        optimized = self._optimize_image(contents)
-        extension = (file.filename.split('.')[-1] if file.filename else 'jpg').lower()
-        filename = f'{uuid.uuid4()}.{extension}'
-        now = datetime.utcnow()
-        file_path = f'reports/{now.year}/{now.month}/{filename}'
-
-        if self._use_local_fallback:
-            if not self._local_dir:
-                raise HTTPException(status_code=500, detail='Local storage directory unavailable')
-            local_file = self._local_dir / filename
-            local_file.write_bytes(optimized)
-            data_url = f"data:{file.content_type or 'image/jpeg'};base64,{base64.b64encode(optimized).decode()}"
-            return {
-                'url': data_url,
-                'path': str(local_file),
-                'bucket': 'local',
-                'size': len(optimized),
-                'content_type': file.content_type or 'image/jpeg',
-            }
+        return {
+            'url': url,
+            'path': url.rsplit('/', 1)[-1] if self._use_local_fallback else file_path,
+            'bucket': 'local' if self._use_local_fallback else self.bucket_name,
+            'size': len(data),
+            'content_type': content_type,
+        }
 
+    async def upload_pipeline_result(self, result: 'PipelineResult') -> dict[str, Any]:
+        """Upload the optimized image and its thumbnails concurrently."""
+        file_path = self._new_path('webp')
+        stem = file_path.rsplit('.', 1)[0]
+        variants = {'original': (file_path, (result.optimized, result.content_type))}
+        for width, data in result.thumbnails.items():
+            variants[f'thumb_{width}'] = (f'{stem}_w{width}.webp', (data, 'image/webp'))
         try:
-            self.client.storage.from_(self.bucket_name).upload(
-                path=file_path,
-                file=optimized,
-                file_options={
-                    'content-type': file.content_type or 'image/jpeg',
-                    'cache-control': '3600',
-                    'upsert': 'false',
-                },
-            )
-        except Exception as exc:
+            urls = await upload_variants(self._backend, variants)
+        except StorageError as exc:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'Image upload failed: {exc}')
 
-        public_url = self.client.storage.from_(self.bucket_name).get_public_url(file_path)
         return {
-            'url': public_url,
-            'path': file_path,
-            'bucket': self.bucket_name,
-            'size': len(optimized),
-            'content_type': file.content_type or 'image/jpeg',
+            'url': urls['original'],
+            'path': urls['original'].rsplit('/', 1)[-1] if self._use_local_fallback else file_path,
+            'bucket': 'local' if self._use_local_fallback else self.bucket_name,
+            'size': len(result.optimized),
+            'content_type': result.content_type,
+            'variants': {name: url for name, url in urls.items() if name != 'original'},
         }
 
     async def delete_image(self, file_path: str) -> bool:
-        try:
-            self.client.storage.from_(self.bucket_name).remove([file_path])
-            return True
-        except Exception as exc:  # pragma: no cover - defensive
-            print(f'Failed to delete image: {exc}')
-            return False
+        return await self._backend.delete(file_path)
+
+    @staticmethod
+    def _new_path(extension: str) -> str:
+        now = datetime.utcnow()
+        return f'reports/{now.year}/{now.month}/{uuid.uuid4()}.{extension}'
 
-    def _optimize_image(self, image_bytes: bytes, max_size: tuple[int, int] = (1920, 1920), quality: int = 85) -> bytes:
+    def _optimize_image(
+        self, source: bytes | Path, max_size: tuple[int, int] = (1920, 1920), quality: int = 85
+    ) -> tuple[bytes, str | None]:
+        """(JPEG bytes, 'image/jpeg'), or the original bytes and None if they could not be re-encoded."""
         try:
-            image = Image.open(io.BytesIO(image_bytes))
+            image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+            # Let libjpeg decode at a reduced scale close to max_size instead of full resolution.
+            image.draft('RGB', max_size)
             if image.mode == 'RGBA':
                 background = Image.new('RGB', image.size, (255, 255, 255))
                 background.paste(image, mask=image.split()[3])
@@ -128,10 +142,10 @@ class SupabaseImageStorage:
             output = io.BytesIO()
             image.save(output, format='JPEG', quality=quality, optimize=True)
             output.seek(0)
-            return output.read()
+            return output.read(), 'image/jpeg'
         except Exception as exc:  # pragma: no cover - defensive
             print(f'Image optimization failed: {exc}')
-            return image_bytes
+            return (source if isinstance(source, bytes) else Path(source).read_bytes()), None
 
 
 image_storage = SupabaseImageStorage()
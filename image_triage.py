@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from loguru import logger
+
+# Features are computed on a half-resolution grayscale decode, where Laplacian
+# variance runs higher than at full size; thresholds are set well past the
+# `too_dark`/`blurry` hints in image_processor.extract_metadata so that only
+# clearly unusable photos skip the vision model.
+DARK_THRESHOLD = 25.0
+BRIGHT_THRESHOLD = 240.0
+BLUR_THRESHOLD = 8.0
+FLAT_STDDEV_THRESHOLD = 6.0
+MIN_DIMENSION = 96
+TRIAGE_WORKERS = int(os.environ.get("IMAGE_TRIAGE_WORKERS", min(4, os.cpu_count() or 1)))
+
+Features = Dict[str, float]
+TriageCheck = Callable[[Features], Optional[str]]
+
+
+@dataclass
+class TriageResult:
+  forward: bool
+  reason: Optional[str] = None
+  features: Features = field(default_factory=dict)
+
+
+@dataclass
+class TriageStats:
+  triaged: int = 0
+  forwarded: int = 0
+  upstream_calls_saved: int = 0
+  failures: int = 0
+  reasons: Dict[str, int] = field(default_factory=dict)
+
+  def to_dict(self) -> Dict[str, object]:
+    return {
+      "triaged": self.triaged,
+      "forwarded": self.forwarded,
+      "upstream_calls_saved": self.upstream_calls_saved,
+      "failures": self.failures,
+      "reasons": dict(self.reasons),
+    }
+
+
+def check_too_dark(features: Features) -> Optional[str]:
+  if features["mean_brightness"] < DARK_THRESHOLD:
+    return "Photo is too dark to identify an issue."
+  return None
+
+
+def check_overexposed(features: Features) -> Optional[str]:
+  if features["mean_brightness"] > BRIGHT_THRESHOLD:
+    return "Photo is overexposed; details are washed out."
+  return None
+
+
+def check_blurry(features: Features) -> Optional[str]:
+  if features["sharpness_score"] < BLUR_THRESHOLD:
+    return "Photo is too blurry to identify an issue."
+  return None
+
+
+def check_featureless(features: Features) -> Optional[str]:
+  if features["contrast"] < FLAT_STDDEV_THRESHOLD:
+    return "Photo shows no discernible scene (near-uniform image)."
+  return None
+
+
+def check_too_small(features: Features) -> Optional[str]:
+  if min(features["width"], features["height"]) < MIN_DIMENSION:
+    return "Photo resolution is too low to identify an issue."
+  return None
+
+
+# Checks must be module-level functions so they can be sent to the process pool.
+DEFAULT_CHECKS: Tuple[TriageCheck, ...] = (
+  check_too_small,
+  check_too_dark,
+  check_overexposed,
+  check_featureless,
+  check_blurry,
+)
+
+_checks: Tuple[TriageCheck, ...] = DEFAULT_CHECKS
+_pool: Optional[ProcessPoolExecutor] = None
+stats = TriageStats()
+
+
+def register_check(check: TriageCheck) -> None:
+  """Add a triage check. It receives the feature dict and returns a rejection reason or None."""
+  global _checks
+  _checks = _checks + (check,)
+
+
+def set_checks(checks: Sequence[TriageCheck]) -> None:
+  global _checks
+  _checks = tuple(checks)
+
+
+def compute_features(image_bytes: bytes) -> Optional[Features]:
+  np_image = np.frombuffer(image_bytes, dtype=np.uint8)
+  gray = cv2.imdecode(np_image, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+  if gray is None:
+    return None
+  height, width = gray.shape[:2]
+  return {
+    "width": float(width * 2),
+    "height": float(height * 2),
+    "mean_brightness": float(np.mean(gray)),
+    "contrast": float(np.std(gray)),
+    "sharpness_score": float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+  }
+
+
+def triage_image(image_bytes: bytes, checks: Sequence[TriageCheck] = DEFAULT_CHECKS) -> TriageResult:
+  """
+  Run the checks synchronously; the first check that returns a reason rejects
+  the image. Images OpenCV cannot decode (HEIC, some WEBP and CMYK JPEGs) are
+  forwarded unchecked, since PIL and the model may still read them.
+  """
+  features = compute_features(image_bytes)
+  if features is None:
+    return TriageResult(forward=True)
+  for check in checks:
+    reason = check(features)
+    if reason:
+      return TriageResult(forward=False, reason=reason, features=features)
+  return TriageResult(forward=True, features=features)
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+  global _pool
+  if TRIAGE_WORKERS <= 0:
+    return None
+  if _pool is None:
+    _pool = ProcessPoolExecutor(max_workers=TRIAGE_WORKERS)
+  return _pool
+
+
+def shutdown_triage_pool() -> None:
+  global _pool
+  if _pool is not None:
+    _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+
+
+async def triage_image_async(image_bytes: bytes) -> TriageResult:
+  """
+  Triage off the event loop (process pool, or a thread when IMAGE_TRIAGE_WORKERS=0).
+  Triage is only an optimisation: if it fails (a broken pool, a check that
+  raises or cannot be pickled) the image is forwarded and the pool is reset.
+  """
+  loop = asyncio.get_running_loop()
+  pool = _get_pool()
+  try:
+    if pool is None:
+      result = await asyncio.to_thread(triage_image, image_bytes, _checks)
+    else:
+      result = await loop.run_in_executor(pool, triage_image, image_bytes, _checks)
+  except Exception as exc:
+    logger.warning("Triage failed, forwarding image to the vision model: {!r}", exc)
+    stats.failures += 1
+    shutdown_triage_pool()
+    return TriageResult(forward=True)
+
+  stats.triaged += 1
+  if result.forward:
+    stats.forwarded += 1
+  else:
+    stats.upstream_calls_saved += 1
+    stats.reasons[result.reason or "unknown"] = stats.reasons.get(result.reason or "unknown", 0) + 1
+    logger.info("Triage skipped vision model: {} ({})", result.reason, result.features)
+  return result
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import os
+import tempfile
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from PIL import Image
+
+from .blob_store import LocalBlobStore, blob_store
+from .image_processor import ImageDecodeError, open_downscaled, resize_to_max_width, run_image_job
+
+VARIANT_WIDTHS: Tuple[int, ...] = (64, 128, 200, 320, 500, 800, 1200, 1920)
+VARIANT_FORMATS: Dict[str, Tuple[str, str]] = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'jpg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+}
+VARIANT_QUALITY = 80
+VARIANT_CACHE_MAX_BYTES = int(os.getenv('IMAGE_VARIANT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+VARIANT_CACHE_DIR = os.getenv('IMAGE_VARIANT_CACHE_DIR') or str(Path(__file__).resolve().parents[2] / 'uploads' / 'variants')
+# In-flight result telling waiters to retry because the rendering request was cancelled.
+_RETRY: Any = object()
+
+
+def snap_width(width: int) -> int:
+    """Round a requested width up to the nearest supported size, so the cache stays bounded."""
+    if width <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Width must be positive')
+    for candidate in VARIANT_WIDTHS:
+        if candidate >= width:
+            return candidate
+    return VARIANT_WIDTHS[-1]
+
+
+def render_variant(source: str, width: int, fmt: str) -> bytes:
+    """CPU-bound: decode (at reduced scale where possible), resize and encode one rendition."""
+    pil_format, _ = VARIANT_FORMATS[fmt]
+    try:
+        image = open_downscaled(source, width)
+        image = resize_to_max_width(image.convert('RGBA' if pil_format == 'PNG' else 'RGB'), width)
+    except Exception as exc:  # noqa: BLE001
+        raise ImageDecodeError(str(exc)) from exc
+    buffer = io.BytesIO()
+    if pil_format == 'PNG':
+        image.save(buffer, format='PNG', optimize=True)
+    else:
+        image.save(buffer, format=pil_format, quality=VARIANT_QUALITY)
+    return buffer.getvalue()
+
+
+class VariantCache:
+    """
+    Size-bounded LRU cache of generated renditions on disk. Concurrent requests
+    for a missing variant share a single generation job. Variants held through
+    serve_variant() are never evicted while the block runs.
+    """
+
+    def __init__(self, root: str | Path, max_bytes: int = VARIANT_CACHE_MAX_BYTES, store: LocalBlobStore = blob_store) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.store = store
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._total_bytes = 0
+        self._leases: Dict[str, int] = {}
+        self._inflight: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Future]]' = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._load_index()
+
+    def _load_index(self) -> None:
+        if not self.root.exists():
+            return
+        for leftover in self.root.rglob('.evicted-*'):
+            leftover.unlink(missing_ok=True)
+        files = sorted((path for path in self.root.rglob('*') if path.is_file() and not path.name.startswith('.')), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._entries[path.name] = size
+            self._total_bytes += size
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    async def get_variant(self, blob_id: str, width: int, fmt: str) -> Tuple[Path, str]:
+        """Return (path, content type) of the rendition, generating it on first request."""
+        source, width, fmt, key = self._resolve(blob_id, width, fmt)
+        return await self._materialize(source, width, fmt, key), VARIANT_FORMATS[fmt][1]
+
+    @asynccontextmanager
+    async def serve_variant(self, blob_id: str, width: int, fmt: str) -> AsyncIterator[Tuple[Path, str]]:
+        """get_variant(), with the file kept on disk until the block exits."""
+        source, width, fmt, key = self._resolve(blob_id, width, fmt)
+        with self._lock:
+            self._leases[key] = self._leases.get(key, 0) + 1
+        try:
+            yield await self._materialize(source, width, fmt, key), VARIANT_FORMATS[fmt][1]
+        finally:
+            with self._lock:
+                if self._leases[key] == 1:
+                    del self._leases[key]
+                else:
+                    self._leases[key] -= 1
+
+    def _resolve(self, blob_id: str, width: int, fmt: str) -> Tuple[Path, int, str, str]:
+        fmt = fmt.lower()
+        if fmt not in VARIANT_FORMATS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'Unsupported format: {fmt}')
+        source = self.store.path_for(blob_id)
+        if source is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Image not found')
+        width = snap_width(width)
+        return source, width, fmt, f'{self.store.digest_of(blob_id)}_w{width}.{fmt}'
+
+    async def _materialize(self, source: Path, width: int, fmt: str, key: str) -> Path:
+        inflight = self._inflight.setdefault(asyncio.get_running_loop(), {})
+        while True:
+            path = self._lookup(key)
+            if path is not None:
+                return path
+
+            pending = inflight.get(key)
+            if pending is not None:
+                with self._lock:
+                    self.coalesced += 1
+                path = await asyncio.shield(pending)
+                if path is _RETRY:
+                    continue
+                return path
+
+            future: asyncio.Future = asyncio.get_running_loop().create_future()
+            inflight[key] = future
+            try:
+                data = await run_image_job(render_variant, str(source), width, fmt)
+                path = await asyncio.to_thread(self._store, key, data)
+            except Exception as exc:
+                future.set_exception(exc)
+                future.exception()
+                raise
+            except BaseException:
+                # A disconnected client cancels only its own request; a waiter renders instead.
+                future.set_result(_RETRY)
+                raise
+            else:
+                future.set_result(path)
+                return path
+            finally:
+                if inflight.get(key) is future:
+                    del inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+            }
+
+    def _lookup(self, key: str) -> Optional[Path]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            if not path.exists():
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return path
+
+    def _store(self, key: str, data: bytes) -> Path:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(data)
+
+        doomed = []
+        with self._lock:
+            os.replace(tmp_name, path)
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            excess = self._total_bytes - self.max_bytes
+            evicted = []
+            for old_key, size in self._entries.items():
+                if excess <= 0:
+                    break
+                # Variants being served stay until their lease is released.
+                if old_key == key or old_key in self._leases:
+                    continue
+                evicted.append(old_key)
+                excess -= size
+            for old_key in evicted:
+                self._total_bytes -= self._entries.pop(old_key)
+                self.evictions += 1
+                # Renamed under the lock, so a variant regenerated under the
+                # same name is never the file that gets deleted.
+                old_path = self._path(old_key)
+                doomed_path = old_path.with_name(f'.evicted-{uuid.uuid4().hex}')
+                try:
+                    os.replace(old_path, doomed_path)
+                except FileNotFoundError:
+                    continue
+                doomed.append(doomed_path)
+        for doomed_path in doomed:
+            doomed_path.unlink(missing_ok=True)
+        return path
+
+
+variant_cache = VariantCache(VARIANT_CACHE_DIR)
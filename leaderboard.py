@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .profile_service import GAMIFICATION_RULES, ReportEvent
+from .sorted_index import SortedKeyList
+
+LEADERBOARD_WINDOWS: Dict[str, Optional[timedelta]] = {
+    "week": timedelta(days=7),
+    "month": timedelta(days=30),
+    "all_time": None,
+}
+LEADERBOARD_PAGE_SIZE = 20
+
+# (-score, user_id): ascending order is best first, ties by user id.
+ScoreKey = Tuple[int, str]
+
+
+@dataclass(frozen=True)
+class LeaderboardEntry:
+    rank: int
+    user_id: str
+    score: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"rank": self.rank, "user_id": self.user_id, "score": self.score}
+
+
+class _Board:
+    def __init__(self, window: Optional[timedelta]) -> None:
+        self.window = window
+        self.scores: Dict[str, int] = {}
+        self.ranked = SortedKeyList()
+        # (expires_at, sequence, user_id, points) for windowed boards.
+        self.expiring: List[Tuple[datetime, int, str, int]] = []
+
+    def adjust(self, user_id: str, delta: int) -> None:
+        previous = self.scores.get(user_id, 0)
+        score = previous + delta
+        if previous:
+            self.ranked.remove((-previous, user_id))
+        if score:
+            self.scores[user_id] = score
+            self.ranked.add((-score, user_id))
+        else:
+            self.scores.pop(user_id, None)
+
+
+class Leaderboard:
+    """
+    Week, month and all-time leaderboards kept up to date as points are
+    recorded, instead of recomputing reputation per user per request. Week
+    and month are rolling windows: every award is queued with its expiry and
+    taken off the board once it ages out (checked lazily on each call).
+    Ranks are competition ranks, so tied users share a rank.
+    """
+
+    def __init__(
+        self,
+        windows: Mapping[str, Optional[timedelta]] = LEADERBOARD_WINDOWS,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ) -> None:
+        self._boards = {name: _Board(window) for name, window in windows.items()}
+        self._clock = clock
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def windows(self) -> List[str]:
+        return list(self._boards)
+
+    def record_event(self, user_id: str, event: ReportEvent) -> int:
+        """Award an event's GAMIFICATION_RULES points; returns the points recorded."""
+        points = GAMIFICATION_RULES.get(event.event_type, 0)
+        self.record_points(user_id, points, event.occurred_at)
+        return points
+
+    def record_points(self, user_id: str, points: int, occurred_at: Optional[datetime] = None) -> None:
+        """
+        Award points earned at `occurred_at`, e.g. what
+        ProfileAccumulator.apply_event returned (streak bonus included).
+        """
+        if not points:
+            return
+        with self._lock:
+            now = self._clock()
+            occurred_at = occurred_at or now
+            self._expire(now)
+            for board in self._boards.values():
+                if board.window is not None:
+                    expires_at = occurred_at + board.window
+                    if expires_at <= now:
+                        continue
+                    heapq.heappush(board.expiring, (expires_at, next(self._sequence), user_id, points))
+                board.adjust(user_id, points)
+
+    def page(self, window: str = "all_time", offset: int = 0, limit: int = LEADERBOARD_PAGE_SIZE) -> List[LeaderboardEntry]:
+        with self._lock:
+            board = self._board(window)
+            keys = board.ranked.slice(max(offset, 0), limit)
+            entries: List[LeaderboardEntry] = []
+            for negative_score, user_id in keys:
+                if entries and entries[-1].score == -negative_score:
+                    rank = entries[-1].rank
+                else:
+                    rank = board.ranked.bisect_left((negative_score, "")) + 1
+                entries.append(LeaderboardEntry(rank, user_id, -negative_score))
+            return entries
+
+    def top(self, window: str = "all_time", k: int = LEADERBOARD_PAGE_SIZE) -> List[LeaderboardEntry]:
+        return self.page(window, 0, k)
+
+    def rank(self, user_id: str, window: str = "all_time") -> Optional[LeaderboardEntry]:
+        """The user's entry, or None if they have no points in the window."""
+        with self._lock:
+            board = self._board(window)
+            score = board.scores.get(user_id)
+            if score is None:
+                return None
+            return LeaderboardEntry(board.ranked.bisect_left((-score, "")) + 1, user_id, score)
+
+    def size(self, window: str = "all_time") -> int:
+        with self._lock:
+            return len(self._board(window).ranked)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            self._expire(self._clock())
+            return {
+                name: {"users": len(board.scores), "pending_expiries": len(board.expiring)}
+                for name, board in self._boards.items()
+            }
+
+    def _board(self, window: str) -> _Board:
+        board = self._boards.get(window)
+        if board is None:
+            raise ValueError(f"Unknown leaderboard window '{window}'; expected one of {', '.join(self._boards)}")
+        self._expire(self._clock(), (board,))
+        return board
+
+    def _expire(self, now: datetime, boards: Optional[Tuple[_Board, ...]] = None) -> None:
+        for board in boards or self._boards.values():
+            expiring = board.expiring
+            while expiring and expiring[0][0] <= now:
+                _, _, user_id, points = heapq.heappop(expiring)
+                board.adjust(user_id, -points)
+
+
+leaderboard = Leaderboard()
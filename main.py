@@ -1,15 +1,27 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 
+from .api.image_routes import router as image_router
 from .api.routes import limiter, router as api_router
+from .services.priority_store import priority_store
 from .ws import router as ws_router
 
-app = FastAPI(title="CityLens API", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Write out priority breakdowns still buffered in memory.
+    priority_store.close()
+
+
+app = FastAPI(title="CityLens API", version="0.1.0", lifespan=lifespan)
 app.state.limiter = limiter
 app.add_middleware(SlowAPIMiddleware)
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
@@ -23,6 +35,7 @@ app.add_middleware(
 )
 
 app.include_router(api_router, prefix="/api")
+app.include_router(image_router)
 app.include_router(ws_router)
 
 
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from .priority_scorer import MAX_DISTANCE_METERS, PriorityBreakdown, calculate_priority_score, recurrence_index
+
+QUEUE_RESCORE_INTERVAL = timedelta(seconds=float(os.getenv("PRIORITY_QUEUE_RESCORE_SECONDS", 3600)))
+QUEUE_COMPACT_MIN = 64
+
+# (-score, version, report_id): heapq is a min-heap, so the highest score
+# sits at the root and ties go to the earliest push. Versions come from one
+# global counter, so an entry is live only while its report still holds it.
+HeapEntry = Tuple[float, int, str]
+HeapKey = Optional[Tuple[str, str]]
+
+
+@dataclass
+class QueueItem:
+    report_id: str
+    score: float
+    breakdown: Optional[PriorityBreakdown] = None
+    department: Optional[str] = None
+    district: Optional[str] = None
+    inputs: Dict[str, Any] = field(default_factory=dict)
+    enqueued_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    rescored_at: Optional[datetime] = None
+    version: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "report_id": self.report_id,
+            "priority_score": self.score,
+            "department": self.department,
+            "district": self.district,
+            "breakdown": self.breakdown.to_dict() if self.breakdown else None,
+            "enqueued_at": self.enqueued_at.isoformat(),
+            "rescored_at": self.rescored_at.isoformat() if self.rescored_at else None,
+        }
+
+
+def _default_rescore(item: QueueItem) -> Optional[PriorityBreakdown]:
+    if not item.inputs:
+        return None
+    return calculate_priority_score(report_id=item.report_id, **item.inputs)
+
+
+def _normalize(value: Optional[str]) -> Optional[str]:
+    return value.strip().lower() if value else None
+
+
+class LivePriorityQueue:
+    """
+    Open reports ordered by priority score. Every report sits in a global heap
+    plus one heap per department and per district; updates and removals bump
+    the report's version and leave the old heap entries to be skipped
+    (lazy deletion), so insert/update/remove are O(log n). top() walks a heap
+    best-first without popping, costing O(k log k) plus skipped entries.
+
+    Rescoring is deferred: mark_stale() / mark_stale_near() and the periodic
+    `rescore_interval` only flag reports, and flagged reports are rescored
+    at the start of the next read.
+    """
+
+    def __init__(
+        self,
+        rescore: Callable[[QueueItem], Optional[PriorityBreakdown]] = _default_rescore,
+        rescore_interval: Optional[timedelta] = QUEUE_RESCORE_INTERVAL,
+        clock: Callable[[], datetime] = lambda: datetime.now(timezone.utc),
+    ) -> None:
+        self._rescore = rescore
+        self.rescore_interval = rescore_interval
+        self._clock = clock
+        self._items: Dict[str, QueueItem] = {}
+        self._heaps: Dict[HeapKey, List[HeapEntry]] = {None: []}
+        self._stale: Set[str] = set()
+        self._live: Dict[HeapKey, int] = {None: 0}
+        self._due: List[Tuple[datetime, int, str]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.RLock()
+        self.rescored = 0
+        self.skipped_entries = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, report_id: object) -> bool:
+        return report_id in self._items
+
+    def get(self, report_id: str) -> Optional[QueueItem]:
+        return self._items.get(report_id)
+
+    def push(
+        self,
+        report_id: str,
+        breakdown: PriorityBreakdown,
+        *,
+        department: Optional[str] = None,
+        district: Optional[str] = None,
+        inputs: Optional[Dict[str, Any]] = None,
+    ) -> QueueItem:
+        """
+        Insert a report or update its score/placement. `inputs` are the
+        calculate_priority_score keyword arguments (without report_id) used to
+        rescore it later; without them the report keeps its pushed score.
+        """
+        with self._lock:
+            previous = self._items.get(report_id)
+            item = QueueItem(
+                report_id=report_id,
+                score=float(breakdown.score),
+                breakdown=breakdown,
+                department=department,
+                district=district,
+                inputs=dict(inputs) if inputs is not None else (previous.inputs if previous else {}),
+                enqueued_at=previous.enqueued_at if previous else self._clock(),
+                rescored_at=self._clock(),
+            )
+            self._place(item)
+            return item
+
+    def remove(self, report_id: str) -> bool:
+        """Drop a report (e.g. once it is resolved); its heap entries become stale."""
+        with self._lock:
+            item = self._items.pop(report_id, None)
+            self._stale.discard(report_id)
+            if item is None:
+                return False
+            for key in self._heap_keys(item):
+                self._live[key] -= 1
+                self._maybe_compact(key)
+            return True
+
+    def mark_stale(self, report_ids: Iterable[str]) -> int:
+        with self._lock:
+            before = len(self._stale)
+            self._stale.update(report_id for report_id in report_ids if report_id in self._items)
+            return len(self._stale) - before
+
+    def mark_stale_near(self, issue_type: str, lat: float, lng: float) -> int:
+        """Flag queued reports whose recurrence factor a new report at (lat, lng) may have changed."""
+        return self.mark_stale(recurrence_index.neighbors(issue_type, lat, lng, MAX_DISTANCE_METERS))
+
+    def top(self, k: int = 20, *, department: Optional[str] = None, district: Optional[str] = None) -> List[QueueItem]:
+        """Highest-priority reports, optionally restricted to a department and/or district."""
+        if k <= 0:
+            return []
+        department_key = _normalize(department)
+        district_key = _normalize(district)
+        with self._lock:
+            self._refresh()
+            if department_key is not None:
+                heap = self._heaps.get(("department", department_key), [])
+            elif district_key is not None:
+                heap = self._heaps.get(("district", district_key), [])
+            else:
+                heap = self._heaps[None]
+
+            results: List[QueueItem] = []
+            frontier: List[Tuple[HeapEntry, int]] = [(heap[0], 0)] if heap else []
+            while frontier and len(results) < k:
+                (_, version, report_id), index = heapq.heappop(frontier)
+                for child in (2 * index + 1, 2 * index + 2):
+                    if child < len(heap):
+                        heapq.heappush(frontier, (heap[child], child))
+                item = self._items.get(report_id)
+                if item is None or item.version != version:
+                    self.skipped_entries += 1
+                    continue
+                if district_key is not None and _normalize(item.district) != district_key:
+                    continue
+                results.append(item)
+            return results
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "open_reports": len(self._items),
+                "heap_entries": sum(len(heap) for heap in self._heaps.values()),
+                "stale": len(self._stale),
+                "rescored": self.rescored,
+                "skipped_entries": self.skipped_entries,
+            }
+
+    def _heap_keys(self, item: QueueItem) -> List[HeapKey]:
+        keys: List[HeapKey] = [None]
+        if item.department:
+            keys.append(("department", _normalize(item.department)))
+        if item.district:
+            keys.append(("district", _normalize(item.district)))
+        return keys
+
+    def _place(self, item: QueueItem) -> None:
+        previous = self._items.get(item.report_id)
+        if previous is not None:
+            for key in self._heap_keys(previous):
+                self._live[key] -= 1
+        item.version = next(self._sequence)
+        self._items[item.report_id] = item
+        self._stale.discard(item.report_id)
+        entry = (-item.score, item.version, item.report_id)
+        for key in self._heap_keys(item):
+            heap = self._heaps.setdefault(key, [])
+            self._live[key] = self._live.get(key, 0) + 1
+            heapq.heappush(heap, entry)
+            self._maybe_compact(key)
+        if self.rescore_interval is not None and item.inputs:
+            heapq.heappush(self._due, (item.rescored_at + self.rescore_interval, item.version, item.report_id))
+
+    def _maybe_compact(self, key: HeapKey) -> None:
+        # Rebuild a heap from its live entries once stale ones outnumber them.
+        heap = self._heaps[key]
+        if len(heap) > QUEUE_COMPACT_MIN and len(heap) > 2 * self._live[key]:
+            self._compact(key)
+
+    def _compact(self, key: HeapKey) -> None:
+        live = [
+            entry
+            for entry in self._heaps[key]
+            if (item := self._items.get(entry[2])) is not None and item.version == entry[1]
+        ]
+        heapq.heapify(live)
+        self._heaps[key] = live
+
+    def _refresh(self) -> None:
+        now = self._clock()
+        while self._due and self._due[0][0] <= now:
+            _, version, report_id = heapq.heappop(self._due)
+            item = self._items.get(report_id)
+            if item is not None and item.version == version:
+                self._stale.add(report_id)
+        if not self._stale:
+            return
+
+        for report_id in list(self._stale):
+            item = self._items.get(report_id)
+            self._stale.discard(report_id)
+            if item is None:
+                continue
+            try:
+                breakdown = self._rescore(item)
+            except Exception as exc:
+                logger.warning("Rescoring report {} failed; keeping score {}: {}", report_id, item.score, exc)
+                continue
+            if breakdown is None:
+                continue
+            self.rescored += 1
+            self._place(
+                QueueItem(
+                    report_id=report_id,
+                    score=float(breakdown.score),
+                    breakdown=breakdown,
+                    department=item.department,
+                    district=item.district,
+                    inputs=item.inputs,
+                    enqueued_at=item.enqueued_at,
+                    rescored_at=now,
+                )
+            )
+
+
+priority_queue = LivePriorityQueue()
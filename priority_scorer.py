@@ -1,13 +1,19 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import os
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from math import asin, cos, radians, sin, sqrt
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Sequence
 
+import numpy as np
 from loguru import logger
 
+from .priority_store import StoredPriority, explain_record, priority_store
+from .spatial_index import SpatialTemporalIndex
+
 ISSUE_ENVIRONMENTAL_IMPACT = {
     "illegal_waste": 8,
     "flooding": 7,
@@ -17,6 +23,20 @@ ISSUE_ENVIRONMENTAL_IMPACT = {
 MAX_DISTANCE_METERS = 50
 DAYS_LOOKBACK = 30
 
+PRIORITY_WEIGHTS: Dict[str, float] = {
+    "severity": 0.35,
+    "safety_risk_factor": 0.30,
+    "affected_population_factor": 0.20,
+    "environmental_impact_factor": 0.10,
+    "recurrence_factor": 0.05,
+}
+
+
+def weight_version() -> str:
+    """Fingerprint of PRIORITY_WEIGHTS; stored with every persisted breakdown."""
+    digest = hashlib.sha256(json.dumps(PRIORITY_WEIGHTS, sort_keys=True).encode())
+    return digest.hexdigest()[:12]
+
 def _haversine_meters(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     R = 6371000  # meters
     d_lat = radians(lat2 - lat1)
@@ -26,16 +46,83 @@ def _haversine_meters(lat1: float, lon1: float, lat2: float, lon2: float) -> flo
     return R * c
 
 
+def _haversine_meters_array(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    # Same operation order as _haversine_meters.
+    R = 6371000  # meters
+    d_lat = np.radians(lat2 - lat1)
+    d_lon = np.radians(lon2 - lon1)
+    a = np.sin(d_lat / 2) ** 2 + np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.sin(d_lon / 2) ** 2
+    c = 2 * np.arcsin(np.sqrt(a))
+    return R * c
+
+
+# Same-type reports from the last DAYS_LOOKBACK days, bucketed into
+# MAX_DISTANCE_METERS grid cells so a neighbour count touches 25 cells.
+recurrence_index = SpatialTemporalIndex(
+    cell_meters=MAX_DISTANCE_METERS,
+    lookback=timedelta(days=DAYS_LOOKBACK),
+    distance_fn=_haversine_meters,
+    distance_array_fn=_haversine_meters_array,
+)
+
+
+def record_report(
+    report_id: str,
+    issue_type: str,
+    lat: float,
+    lng: float,
+    reported_at: Optional[datetime] = None,
+) -> None:
+    """
+    Make a report visible to recurrence lookups (idempotent per report id).
+    Call it when the report is created; scoring never records anything.
+    """
+    recurrence_index.add(report_id, issue_type, lat, lng, reported_at)
+
+
+def forget_report(report_id: str) -> None:
+    recurrence_index.remove(report_id)
+
+
+def _recurrence_score(neighbours: int) -> int:
+    if neighbours >= 10:
+        return 10
+    if neighbours >= 5:
+        return 7
+    if neighbours >= 2:
+        return 5
+    if neighbours >= 1:
+        return 3
+    return 0
+
+
+def _recurrence_neighbours(
+    issue_type: str,
+    lat: float,
+    lng: float,
+    report_id: Optional[str],
+    now: Optional[datetime] = None,
+) -> int:
+    neighbours = recurrence_index.count_neighbors(
+        issue_type,
+        lat,
+        lng,
+        MAX_DISTANCE_METERS,
+        now=now,
+        exclude_report_id=report_id,
+    )
+    logger.debug("Recurrence for issue_type={}: {} nearby reports", issue_type, neighbours)
+    return neighbours
+
+
 def _recurrence_factor(
     issue_type: str,
     lat: float,
     lng: float,
     report_id: Optional[str],
+    now: Optional[datetime] = None,
 ) -> int:
-    # Supabase analytics disabled in local dev. Placeholder recurrence value.
-    lat, lng, report_id  # type: ignore[misc]
-    logger.debug("Recurrence factor defaulted to 0 for issue_type=%s", issue_type)
-    return 0
+    return _recurrence_score(_recurrence_neighbours(issue_type, lat, lng, report_id, now))
 
 
 def _affected_population_factor(people: int) -> int:
@@ -87,19 +174,28 @@ def calculate_priority_score(
     location_lat: float,
     location_lng: float,
     report_id: Optional[str] = None,
+    reported_at: Optional[datetime] = None,
+    persist: bool = True,
 ) -> PriorityBreakdown:
+    """
+    Score a report without changing recurrence state; `report_id` keeps the
+    report from counting as its own neighbour, and its breakdown is kept in
+    priority_store for explain_priority() (buffered) unless `persist` is
+    False, e.g. for previews.
+    """
     base_severity = _clamp(severity, 1, 10)
     safety_factor = 10 if safety_risk else 0
     population_factor = _affected_population_factor(int(estimated_affected_people))
     environmental_factor = _environmental_factor(issue_type)
-    recurrence = _recurrence_factor(issue_type, location_lat, location_lng, report_id)
+    neighbours = _recurrence_neighbours(issue_type, location_lat, location_lng, report_id, reported_at)
+    recurrence = _recurrence_score(neighbours)
 
     weighted_total = (
-        base_severity * 0.35
-        + safety_factor * 0.30
-        + population_factor * 0.20
-        + environmental_factor * 0.10
-        + recurrence * 0.05
+        base_severity * PRIORITY_WEIGHTS["severity"]
+        + safety_factor * PRIORITY_WEIGHTS["safety_risk_factor"]
+        + population_factor * PRIORITY_WEIGHTS["affected_population_factor"]
+        + environmental_factor * PRIORITY_WEIGHTS["environmental_impact_factor"]
+        + recurrence * PRIORITY_WEIGHTS["recurrence_factor"]
     )
 
     score = _clamp(weighted_total * 10, 0, 100)
@@ -112,15 +208,157 @@ def calculate_priority_score(
         score=round(score, 2),
     )
     logger.info("Priority score calculated: {}", breakdown.to_dict())
+    if persist and report_id is not None:
+        _persist_breakdown(
+            report_id,
+            breakdown,
+            {
+                "severity": severity,
+                "safety_risk": safety_risk,
+                "estimated_affected_people": estimated_affected_people,
+                "issue_type": issue_type,
+                "location_lat": location_lat,
+                "location_lng": location_lng,
+            },
+            neighbours,
+        )
     return breakdown
 
 
+def _persist_breakdown(report_id: str, breakdown: PriorityBreakdown, inputs: Dict[str, Any], neighbours: int) -> None:
+    factors = breakdown.to_dict()
+    score = factors.pop("score")
+    record = StoredPriority(
+        report_id=report_id,
+        score=score,
+        factors=factors,
+        inputs=inputs,
+        weight_version=weight_version(),
+        scored_at=datetime.now(timezone.utc).isoformat(),
+        extra={"recurrence_neighbors": neighbours},
+    )
+    try:
+        priority_store.put(record, PRIORITY_WEIGHTS)
+    except OSError as exc:
+        logger.warning("Failed to persist priority breakdown for {}: {}", report_id, exc)
+
+
+PRIORITY_BATCH_DTYPE = np.dtype(
+    [
+        ("severity", np.float64),
+        ("safety_risk_factor", np.int64),
+        ("affected_population_factor", np.int64),
+        ("environmental_impact_factor", np.int64),
+        ("recurrence_factor", np.int64),
+        ("score", np.float64),
+    ]
+)
+
+
+def _round_array(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """np.round, corrected to Python's round() where the two can disagree (near-halfway values)."""
+    rounded = np.round(values, ndigits)
+    scaled = values * 10.0**ndigits
+    ambiguous = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i in ambiguous:
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
+
+
+def _recurrence_score_array(neighbours: np.ndarray) -> np.ndarray:
+    return np.select(
+        [neighbours >= 10, neighbours >= 5, neighbours >= 2, neighbours >= 1],
+        [10, 7, 5, 3],
+        default=0,
+    ).astype(np.int64)
+
+
+def calculate_priority_scores_batch(
+    *,
+    severity: Sequence[float],
+    safety_risk: Sequence[bool],
+    estimated_affected_people: Sequence[int],
+    issue_type: Sequence[Any],
+    location_lat: Sequence[float],
+    location_lng: Sequence[float],
+    issue_type_names: Optional[Sequence[str]] = None,
+    report_ids: Optional[Sequence[Optional[str]]] = None,
+    recurrence: Optional[Sequence[int]] = None,
+    now: Optional[datetime] = None,
+) -> np.ndarray:
+    """
+    Columnar calculate_priority_score: one row per report, returned as a
+    structured array with PRIORITY_BATCH_DTYPE fields. Every value equals
+    what the scalar function returns for that row.
+
+    `issue_type` holds names, or integer codes into `issue_type_names`.
+    Recurrence is read from `recurrence_index` as of `now` (each row's own
+    `report_ids` entry excluded) unless precomputed counts are passed as
+    `recurrence`. Like the scalar path, nothing is recorded in the index.
+    """
+    severity_arr = np.asarray(severity, dtype=np.float64)
+    n = len(severity_arr)
+    if issue_type_names is None:
+        names, codes = np.unique(np.asarray(issue_type, dtype=str), return_inverse=True)
+        issue_type_names = names.tolist()
+    else:
+        codes = np.asarray(issue_type, dtype=np.int64)
+    codes = codes.reshape(-1).astype(np.int64)
+    lat = np.asarray(location_lat, dtype=np.float64)
+    lng = np.asarray(location_lng, dtype=np.float64)
+
+    base_severity = np.clip(severity_arr, 1, 10)
+    safety_factor = np.where(np.asarray(safety_risk, dtype=bool), 10, 0).astype(np.int64)
+    people = np.asarray(estimated_affected_people).astype(np.int64)
+    population_factor = np.select(
+        [people >= 1000, people >= 201, people >= 51, people >= 1],
+        [10, 7, 5, 2],
+        default=0,
+    ).astype(np.int64)
+    environmental_lookup = np.array([_environmental_factor(name) for name in issue_type_names], dtype=np.int64)
+    environmental_factor = environmental_lookup[codes] if n else np.zeros(0, dtype=np.int64)
+    if recurrence is None:
+        neighbours = recurrence_index.count_neighbors_many(
+            issue_type_names,
+            codes,
+            lat,
+            lng,
+            MAX_DISTANCE_METERS,
+            now=now,
+            exclude_report_ids=report_ids,
+        )
+        recurrence_factor = _recurrence_score_array(neighbours)
+    else:
+        recurrence_factor = np.asarray(recurrence, dtype=np.int64)
+
+    weighted_total = (
+        base_severity * PRIORITY_WEIGHTS["severity"]
+        + safety_factor * PRIORITY_WEIGHTS["safety_risk_factor"]
+        + population_factor * PRIORITY_WEIGHTS["affected_population_factor"]
+        + environmental_factor * PRIORITY_WEIGHTS["environmental_impact_factor"]
+        + recurrence_factor * PRIORITY_WEIGHTS["recurrence_factor"]
+    )
+    score = np.clip(weighted_total * 10, 0, 100)
+
+    result = np.empty(n, dtype=PRIORITY_BATCH_DTYPE)
+    result["severity"] = _round_array(base_severity, 2)
+    result["safety_risk_factor"] = safety_factor
+    result["affected_population_factor"] = population_factor
+    result["environmental_impact_factor"] = environmental_factor
+    result["recurrence_factor"] = recurrence_factor
+    result["score"] = _round_array(score, 2)
+    logger.info("Priority scores calculated for {} reports", n)
+    return result
+
+
 def explain_priority(report_id: str) -> Dict[str, Any]:
-    logger.warning("explain_priority is not implemented in offline mode")
-    return {
-        "report_id": report_id,
-        "priority_score": None,
-        "factors": {},
-        "reasoning": ["Detailed explanations require Supabase access."],
-    }
+    record = priority_store.get(report_id)
+    if record is None:
+        return {
+            "report_id": report_id,
+            "priority_score": None,
+            "factors": {},
+            "reasoning": ["No priority breakdown has been recorded for this report."],
+        }
+    return explain_record(record, priority_store.weights(record.weight_version), weight_version())
 
@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import argparse
+import atexit
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional
+
+from loguru import logger
+
+# Unset keeps breakdowns in memory only; set it to persist them as JSONL.
+PRIORITY_STORE_PATH = os.getenv("PRIORITY_STORE_PATH") or None
+# Rewrite the log once superseded lines outnumber live records by this factor.
+COMPACT_RATIO = 2.0
+COMPACT_MIN_LINES = 1000
+
+FACTOR_LABELS = {
+    "severity": "Severity",
+    "safety_risk_factor": "Safety risk",
+    "affected_population_factor": "Affected population",
+    "environmental_impact_factor": "Environmental impact",
+    "recurrence_factor": "Recurrence",
+}
+
+
+@dataclass
+class StoredPriority:
+    report_id: str
+    score: float
+    factors: Dict[str, float]
+    inputs: Dict[str, Any]
+    weight_version: str
+    scored_at: str
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+def _line(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, separators=(",", ":")) + "\n"
+
+
+class PriorityStore:
+    """
+    Latest priority breakdown per report, kept in memory for O(1) lookups and,
+    when a path is given, persisted as an append-only JSONL log. put() only
+    updates memory and buffers the line; a background writer appends buffered
+    lines and rewrites the log once superseded lines dominate it, so callers
+    never wait on file I/O. Each weight set is written once and referenced by
+    version from the records scored with it.
+    """
+
+    def __init__(self, path: Optional[str | Path] = PRIORITY_STORE_PATH) -> None:
+        self.path = Path(path) if path else None
+        self._records: Dict[str, StoredPriority] = {}
+        self._weights: Dict[str, Dict[str, float]] = {}
+        self._pending: List[str] = []
+        self._writer: Optional[threading.Thread] = None
+        self._writing = False
+        self._closing = False
+        self._lines = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._records)
+
+    def put(self, record: StoredPriority, weights: Dict[str, float]) -> None:
+        with self._lock:
+            self._ensure_loaded()
+            if record.weight_version not in self._weights:
+                self._weights[record.weight_version] = dict(weights)
+                self._buffer({"kind": "weights", "version": record.weight_version, "weights": weights})
+            self._records[record.report_id] = record
+            self._buffer({"kind": "priority", **asdict(record)})
+
+    def get(self, report_id: str) -> Optional[StoredPriority]:
+        with self._lock:
+            self._ensure_loaded()
+            return self._records.get(report_id)
+
+    def weights(self, version: str) -> Optional[Dict[str, float]]:
+        with self._lock:
+            self._ensure_loaded()
+            return self._weights.get(version)
+
+    def report_ids(self) -> List[str]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._records)
+
+    def flush(self) -> None:
+        """Block until every buffered line has been written."""
+        with self._cond:
+            while self._pending or self._writing:
+                self._cond.wait()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            writer = self._writer
+        if writer is not None:
+            writer.join()
+        with self._cond:
+            self._writer = None
+            self._closing = False
+
+    def _buffer(self, payload: Dict[str, Any]) -> None:
+        if self.path is None:
+            return
+        self._pending.append(_line(payload))
+        self._wake_writer()
+
+    def _wake_writer(self) -> None:
+        # The writer checks for compaction after each batch.
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._run_writer, name="priority-store-writer", daemon=True)
+            self._writer.start()
+        self._cond.notify_all()
+
+    def _run_writer(self) -> None:
+        handle: Optional[IO[str]] = None
+        try:
+            while True:
+                with self._cond:
+                    while not self._pending and not self._closing:
+                        self._cond.wait()
+                    if not self._pending:
+                        return
+                    batch, self._pending = self._pending, []
+                    self._lines += len(batch)
+                    # Records as of this batch; later puts are buffered and
+                    # appended after the rewrite.
+                    compacted = self._compacted_lines() if self._compaction_due() else None
+                    self._writing = True
+                try:
+                    if handle is None:
+                        self.path.parent.mkdir(parents=True, exist_ok=True)
+                        handle = self.path.open("a", encoding="utf-8")
+                    handle.write("".join(batch))
+                    handle.flush()
+                    if compacted is not None:
+                        handle.close()
+                        handle = None
+                        self._rewrite(compacted)
+                        with self._cond:
+                            self._lines = len(compacted)
+                except OSError as exc:
+                    logger.warning("Failed to write priority store {}: {}", self.path, exc)
+                    if handle is not None:
+                        with contextlib.suppress(OSError):
+                            handle.close()
+                        handle = None
+                finally:
+                    with self._cond:
+                        self._writing = False
+                        self._cond.notify_all()
+        finally:
+            if handle is not None:
+                handle.close()
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path is None or not self.path.exists():
+            return
+
+        with self.path.open(encoding="utf-8") as handle:
+            for line in handle:
+                self._lines += 1
+                try:
+                    payload = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("Skipping corrupt line {} in {}", self._lines, self.path)
+                    continue
+                kind = payload.pop("kind", None)
+                if kind == "weights":
+                    self._weights[payload["version"]] = payload["weights"]
+                elif kind == "priority":
+                    self._records[payload["report_id"]] = StoredPriority(**payload)
+
+    def _compaction_due(self) -> bool:
+        live = len(self._records) + len(self._weights)
+        return self.path is not None and self._lines > COMPACT_MIN_LINES and self._lines > COMPACT_RATIO * live
+
+    def _compacted_lines(self) -> List[str]:
+        lines = [
+            _line({"kind": "weights", "version": version, "weights": weights})
+            for version, weights in self._weights.items()
+        ]
+        lines.extend(_line({"kind": "priority", **asdict(record)}) for record in self._records.values())
+        return lines
+
+    def _rewrite(self, lines: List[str]) -> None:
+        fd, tmp_name = tempfile.mkstemp(dir=self.path.parent, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.writelines(lines)
+        os.replace(tmp_name, self.path)
+        logger.info("Compacted priority store {} to {} lines", self.path, len(lines))
+
+
+def _points(value: float, weight: float) -> float:
+    return round(value * weight * 10, 2)
+
+
+def _reasoning(record: StoredPriority, weights: Dict[str, float]) -> List[str]:
+    factors, inputs = record.factors, record.inputs
+    lines = [
+        f"Severity {factors['severity']}/10 contributes {_points(factors['severity'], weights['severity'])} points."
+    ]
+    if factors["safety_risk_factor"]:
+        lines.append(
+            f"A safety risk was flagged (+{_points(factors['safety_risk_factor'], weights['safety_risk_factor'])} points)."
+        )
+    else:
+        lines.append("No safety risk was flagged.")
+
+    people = inputs.get("estimated_affected_people")
+    population = factors["affected_population_factor"]
+    if population:
+        lines.append(
+            f"About {people} people are affected (factor {population}/10, "
+            f"+{_points(population, weights['affected_population_factor'])} points)."
+        )
+    else:
+        lines.append("No affected population was estimated.")
+
+    environmental = factors["environmental_impact_factor"]
+    lines.append(
+        f"'{inputs.get('issue_type', 'unknown')}' has environmental impact {environmental}/10 "
+        f"(+{_points(environmental, weights['environmental_impact_factor'])} points)."
+    )
+
+    recurrence = factors["recurrence_factor"]
+    neighbours = record.extra.get("recurrence_neighbors")
+    if recurrence:
+        nearby = f"{neighbours} similar reports" if neighbours is not None else "Similar reports"
+        lines.append(
+            f"{nearby} nearby in the lookback window raise recurrence to {recurrence}/10 "
+            f"(+{_points(recurrence, weights['recurrence_factor'])} points)."
+        )
+    else:
+        lines.append("No similar reports nearby in the lookback window.")
+    return lines
+
+
+def explain_record(record: StoredPriority, weights: Optional[Dict[str, float]], current_weight_version: Optional[str] = None) -> Dict[str, Any]:
+    weights = weights or {}
+    factors = {
+        name: {
+            "label": FACTOR_LABELS.get(name, name),
+            "value": value,
+            "weight": weights.get(name),
+            "points": _points(value, weights[name]) if name in weights else None,
+        }
+        for name, value in record.factors.items()
+    }
+    reasoning = _reasoning(record, weights) if set(FACTOR_LABELS) <= set(weights) else []
+    reasoning.append(f"Total priority score: {record.score}/100.")
+    if current_weight_version and current_weight_version != record.weight_version:
+        reasoning.append(
+            f"Scored with weight version {record.weight_version}; current weights are {current_weight_version}."
+        )
+    return {
+        "report_id": record.report_id,
+        "priority_score": record.score,
+        "factors": factors,
+        "inputs": record.inputs,
+        "weight_version": record.weight_version,
+        "scored_at": record.scored_at,
+        "reasoning": reasoning,
+    }
+
+
+def iter_explanations(
+    store: PriorityStore,
+    report_ids: Optional[Iterable[str]] = None,
+    current_weight_version: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    for report_id in report_ids if report_ids is not None else store.report_ids():
+        record = store.get(report_id)
+        if record is not None:
+            yield explain_record(record, store.weights(record.weight_version), current_weight_version)
+
+
+def export_explanations(
+    store: PriorityStore,
+    destination: IO[str],
+    report_ids: Optional[Iterable[str]] = None,
+    current_weight_version: Optional[str] = None,
+) -> int:
+    """Write one JSON explanation per line; returns the number exported."""
+    count = 0
+    for explanation in iter_explanations(store, report_ids, current_weight_version):
+        destination.write(json.dumps(explanation) + "\n")
+        count += 1
+    return count
+
+
+priority_store = PriorityStore()
+# Backstop for scripts; the app closes it in its lifespan.
+atexit.register(priority_store.close)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export stored priority explanations for audit.")
+    parser.add_argument("output", help="JSONL output file, or - for stdout")
+    parser.add_argument(
+        "--store",
+        default=PRIORITY_STORE_PATH,
+        required=PRIORITY_STORE_PATH is None,
+        help="Priority store log to read (default: PRIORITY_STORE_PATH)",
+    )
+    parser.add_argument("--report-ids", help="File with one report id per line (default: all)")
+    args = parser.parse_args(argv)
+
+    store = PriorityStore(args.store)
+    report_ids = None
+    if args.report_ids:
+        with open(args.report_ids, encoding="utf-8") as handle:
+            report_ids = [line.strip() for line in handle if line.strip()]
+
+    if args.output == "-":
+        count = export_explanations(store, sys.stdout, report_ids)
+    else:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            count = export_explanations(store, handle, report_ids)
+    logger.info("Exported {} priority explanations", count)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
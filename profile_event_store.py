@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .profile_service import (
+    EAGLE_EYE_VERIFIED_REPORTS,
+    ECO_WARRIOR_REPUTATION,
+    FAST_RESOLUTION_WINDOW,
+    GAMIFICATION_RULES,
+    STREAK_REQUIRED_REPORTS,
+    STREAK_WINDOW_DAYS,
+    ProfileSnapshot,
+    ReportEvent,
+    ReportSummary,
+)
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_DAY = date(1970, 1, 1).toordinal()
+_MICROS_PER_DAY = 86_400_000_000
+_INITIAL_CAPACITY = 1024
+
+
+def _micros(value: datetime) -> int:
+    # Aware datetimes are stored as UTC; naive ones (datetime.utcnow()) as-is.
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def _day(value: datetime) -> int:
+    # Calendar day in the datetime's own timezone, as summarize_profile's .date() sees it.
+    return value.toordinal() - _EPOCH_DAY
+
+
+class _Column:
+    """Append-only numpy column with amortized O(1) growth."""
+
+    def __init__(self, dtype: np.dtype) -> None:
+        self._data = np.empty(_INITIAL_CAPACITY, dtype=dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._data[: self._size]
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    def append(self, value) -> int:
+        if self._size == len(self._data):
+            self._grow(self._size + 1)
+        self._data[self._size] = value
+        self._size += 1
+        return self._size - 1
+
+    def extend(self, values: np.ndarray) -> None:
+        end = self._size + len(values)
+        if end > len(self._data):
+            self._grow(end)
+        self._data[self._size : end] = values
+        self._size = end
+
+    def _grow(self, needed: int) -> None:
+        capacity = max(needed, 2 * len(self._data))
+        grown = np.empty(capacity, dtype=self._data.dtype)
+        grown[: self._size] = self._data[: self._size]
+        self._data = grown
+
+
+class ProfileEventStore:
+    """
+    Columnar store of every citizen's report events and report summaries, for
+    recomputing all profiles at once (e.g. after GAMIFICATION_RULES change).
+    Events are four parallel arrays: user code (int32), event type code
+    (int16), occurrence time (int64 UTC microseconds) and calendar day in the
+    event's own timezone (int32), 18 bytes per event. Times drive the 7-day
+    window and days the daily streak, so aware timestamps in any timezone
+    give the same results as summarize_profile.
+    Reports keep user code, submission time and verified/resolved flags;
+    only their ids are held in a dict so summaries can be updated in place.
+    User ids and event types are interned once.
+    """
+
+    def __init__(self) -> None:
+        self._user_codes: Dict[str, int] = {}
+        self._user_ids: List[str] = []
+        self._type_codes: Dict[str, int] = {}
+        self._event_types: List[str] = []
+        self._event_users = _Column(np.int32)
+        self._event_kinds = _Column(np.int16)
+        self._event_times = _Column(np.int64)
+        self._event_days = _Column(np.int32)
+        self._report_rows: Dict[str, int] = {}
+        self._report_users = _Column(np.int32)
+        self._report_times = _Column(np.int64)
+        self._report_verified = _Column(np.bool_)
+        self._report_resolved = _Column(np.bool_)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._event_users)
+
+    @property
+    def user_ids(self) -> List[str]:
+        return list(self._user_ids)
+
+    def add_event(self, user_id: str, event: ReportEvent) -> None:
+        with self._lock:
+            self._event_users.append(self._user_code(user_id))
+            self._event_kinds.append(self._type_code(event.event_type))
+            self._event_times.append(_micros(event.occurred_at))
+            self._event_days.append(_day(event.occurred_at))
+
+    def add_events(self, user_ids: Sequence[str], event_types: Sequence[str], occurred_at: Sequence[datetime]) -> None:
+        """Bulk append of parallel columns, e.g. when loading history from the database."""
+        if not len(user_ids) == len(event_types) == len(occurred_at):
+            raise ValueError("user_ids, event_types and occurred_at must have the same length")
+        with self._lock:
+            self._event_users.extend(np.fromiter((self._user_code(user) for user in user_ids), np.int32, len(user_ids)))
+            self._event_kinds.extend(np.fromiter((self._type_code(kind) for kind in event_types), np.int16, len(event_types)))
+            self._event_times.extend(np.fromiter((_micros(stamp) for stamp in occurred_at), np.int64, len(occurred_at)))
+            self._event_days.extend(np.fromiter((_day(stamp) for stamp in occurred_at), np.int32, len(occurred_at)))
+
+    def add_report(self, user_id: str, report: ReportSummary) -> None:
+        """Insert a report summary, or replace the stored one with the same report_id."""
+        with self._lock:
+            user = self._user_code(user_id)
+            submitted = _micros(report.submitted_at)
+            row = self._report_rows.get(report.report_id)
+            if row is None:
+                self._report_rows[report.report_id] = self._report_users.append(user)
+                self._report_times.append(submitted)
+                self._report_verified.append(report.verified)
+                self._report_resolved.append(report.resolved)
+                return
+            self._report_users.values[row] = user
+            self._report_times.values[row] = submitted
+            self._report_verified.values[row] = report.verified
+            self._report_resolved.values[row] = report.resolved
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            columns = (
+                self._event_users,
+                self._event_kinds,
+                self._event_times,
+                self._event_days,
+                self._report_users,
+                self._report_times,
+                self._report_verified,
+                self._report_resolved,
+            )
+            return {
+                "users": len(self._user_ids),
+                "events": len(self._event_users),
+                "reports": len(self._report_users),
+                "event_types": len(self._event_types),
+                "column_bytes": sum(column.nbytes for column in columns),
+            }
+
+    def recompute(
+        self,
+        rules: Optional[Mapping[str, int]] = None,
+        now: Optional[datetime] = None,
+    ) -> Dict[str, ProfileSnapshot]:
+        """
+        Profile snapshot for every user in one vectorized pass, identical to
+        summarize_profile over each user's reports and events. `rules`
+        defaults to the current GAMIFICATION_RULES.
+        """
+        rules = GAMIFICATION_RULES if rules is None else rules
+        now_micros = _micros(now or datetime.utcnow())
+        with self._lock:
+            users = len(self._user_ids)
+            event_users = self._event_users.values.copy()
+            event_kinds = self._event_kinds.values.copy()
+            event_times = self._event_times.values.copy()
+            event_days = self._event_days.values.copy()
+            report_users = self._report_users.values.copy()
+            report_times = self._report_times.values.copy()
+            report_verified = self._report_verified.values.copy()
+            report_resolved = self._report_resolved.values.copy()
+            event_types = list(self._event_types)
+
+        points_by_type = np.array([rules.get(kind, 0) for kind in event_types], dtype=np.int64)
+        points = np.bincount(event_users, weights=points_by_type[event_kinds], minlength=users).astype(np.int64)
+
+        submitted_code = self._type_codes.get("report_submitted", -1)
+        is_submission = event_kinds == submitted_code
+        has_streak, streak = _submission_streaks(
+            event_users[is_submission], event_times[is_submission], event_days[is_submission], users
+        )
+        reputation = points + np.where(has_streak, rules.get("streak_bonus", 0), 0)
+
+        total = np.bincount(report_users, minlength=users)
+        resolved = np.bincount(report_users, weights=report_resolved, minlength=users).astype(np.int64)
+        verified = np.bincount(report_users, weights=report_verified, minlength=users).astype(np.int64)
+        latest_resolved = np.full(users, np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(latest_resolved, report_users[report_resolved], report_times[report_resolved])
+        fast_window = FAST_RESOLUTION_WINDOW // timedelta(microseconds=1)
+
+        badge_columns: Tuple[Tuple[str, np.ndarray], ...] = (
+            ("First Reporter", total >= 1),
+            ("Eagle Eye", verified >= EAGLE_EYE_VERIFIED_REPORTS),
+            ("Eco Warrior", reputation >= ECO_WARRIOR_REPUTATION),
+            ("Lightning Strike", latest_resolved >= now_micros - fast_window),
+            ("Streak Master", has_streak),
+        )
+        # Each user's badges as a bitmask, so the names are built once per combination.
+        masks = np.zeros(users, dtype=np.int64)
+        for bit, (_, earned) in enumerate(badge_columns):
+            masks |= earned.astype(np.int64) << bit
+        combinations = [
+            tuple(name for bit, (name, _) in enumerate(badge_columns) if mask >> bit & 1)
+            for mask in range(1 << len(badge_columns))
+        ]
+
+        reputation_list, total_list = reputation.tolist(), total.tolist()
+        resolved_list, streak_list = resolved.tolist(), streak.tolist()
+        mask_list = masks.tolist()
+        return {
+            user_id: ProfileSnapshot(
+                reputation=reputation_list[code],
+                total_reports=total_list[code],
+                resolved_reports=resolved_list[code],
+                streak=streak_list[code],
+                badges=list(combinations[mask_list[code]]),
+            )
+            for code, user_id in enumerate(self._user_ids[:users])
+        }
+
+    def _user_code(self, user_id: str) -> int:
+        code = self._user_codes.get(user_id)
+        if code is None:
+            code = self._user_codes[user_id] = len(self._user_ids)
+            self._user_ids.append(user_id)
+        return code
+
+    def _type_code(self, event_type: str) -> int:
+        code = self._type_codes.get(event_type)
+        if code is None:
+            code = self._type_codes[event_type] = len(self._event_types)
+            self._event_types.append(event_type)
+        return code
+
+
+def _submission_streaks(
+    users: np.ndarray, times: np.ndarray, days: np.ndarray, user_count: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(earned the 7-day streak bonus, current daily streak) per user code."""
+    has_streak = np.zeros(user_count, dtype=bool)
+    streak = np.zeros(user_count, dtype=np.int64)
+    if not len(users):
+        return has_streak, streak
+
+    sorted_users, sorted_times = _sort_pairs(users, times.astype(np.int64), user_count)
+    # Five submissions fit in a window iff some run of five consecutive
+    # (sorted) submissions by the same user spans at most the window.
+    span = STREAK_REQUIRED_REPORTS - 1
+    if len(sorted_users) > span:
+        within = (sorted_users[span:] == sorted_users[:-span]) & (
+            sorted_times[span:] - sorted_times[:-span] <= STREAK_WINDOW_DAYS * _MICROS_PER_DAY
+        )
+        has_streak[sorted_users[span:][within]] = True
+
+    # Daily streak: consecutive distinct local days ending at each user's
+    # latest one. Local days need not follow UTC order, so sort them separately.
+    users, days = _sort_pairs(users, days.astype(np.int64), user_count)
+    distinct = np.ones(len(users), dtype=bool)
+    distinct[1:] = (users[1:] != users[:-1]) | (days[1:] != days[:-1])
+    users, days = users[distinct], days[distinct]
+    starts = np.ones(len(users), dtype=bool)
+    starts[1:] = (users[1:] != users[:-1]) | (days[1:] - days[:-1] != 1)
+    run_start = np.maximum.accumulate(np.where(starts, np.arange(len(users)), 0))
+    last = np.ones(len(users), dtype=bool)
+    last[:-1] = users[1:] != users[:-1]
+    positions = np.flatnonzero(last)
+    streak[users[positions]] = positions - run_start[positions] + 1
+    return has_streak, streak
+
+
+def _sort_pairs(users: np.ndarray, values: np.ndarray, user_count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (users, values) sorted by user, then value, as one packed int64 key when
+    it fits, which is an order of magnitude faster than lexsort.
+    """
+    origin = int(values.min())
+    shift = int(values.max() - origin).bit_length()
+    if shift + user_count.bit_length() <= 62:
+        keys = np.sort((users.astype(np.int64) << shift) | (values - origin))
+        return (keys >> shift).astype(np.int32), (keys & ((1 << shift) - 1)) + origin
+    order = np.lexsort((values, users))
+    return users[order], values[order]
+
+
+profile_event_store = ProfileEventStore()
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
+from collections import deque
 from dataclasses import dataclass
-from datetime import datetime, timedelta
-from typing import Iterable, List, Sequence
+from datetime import date, datetime, timedelta
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence
 
 GAMIFICATION_RULES = {
     'report_submitted': 10,
@@ -12,6 +13,15 @@ GAMIFICATION_RULES = {
     'streak_bonus': 150,
 }
 
+STREAK_REQUIRED_REPORTS = 5
+STREAK_WINDOW_DAYS = 7
+EAGLE_EYE_VERIFIED_REPORTS = 10
+ECO_WARRIOR_REPUTATION = 1000
+FAST_RESOLUTION_WINDOW = timedelta(hours=2)
+# UTC offsets span 26 hours, so a later submission can fall at most two local
+# days before the latest one; one more day is kept to join the run below it.
+DAILY_STREAK_HORIZON_DAYS = 3
+
 
 @dataclass
 class ReportEvent:
@@ -49,27 +59,14 @@ def calculate_reputation(events: Sequence[ReportEvent]) -> int:
         if event.event_type == 'report_submitted':
             streak_tracker.append(event.occurred_at)
 
-    if _has_streak(streak_tracker, required_reports=5, window_days=7):
+    if _has_streak(streak_tracker, required_reports=STREAK_REQUIRED_REPORTS, window_days=STREAK_WINDOW_DAYS):
         points += GAMIFICATION_RULES['streak_bonus']
 
     return points
 
 
 def summarize_profile(reports: Iterable[ReportSummary], events: Iterable[ReportEvent]) -> ProfileSnapshot:
-    reports_list = list(reports)
-    events_list = list(events)
-    reputation = calculate_reputation(events_list)
-    total_reports = len(reports_list)
-    resolved_reports = sum(1 for report in reports_list if report.resolved)
-    badges = assign_badges(reports_list, events_list, reputation)
-    streak = _current_streak(events_list)
-    return ProfileSnapshot(
-        reputation=reputation,
-        total_reports=total_reports,
-        resolved_reports=resolved_reports,
-        streak=streak,
-        badges=badges,
-    )
+    return ProfileAccumulator.from_history(reports, events).snapshot()
 
 
 def assign_badges(reports: Sequence[ReportSummary], events: Sequence[ReportEvent], reputation: int) -> List[str]:
@@ -78,35 +75,205 @@ def assign_badges(reports: Sequence[ReportSummary], events: Sequence[ReportEvent
     reports_with_fast_resolution = sum(
         1
         for report in reports
-        if report.resolved and (datetime.utcnow() - report.submitted_at) <= timedelta(hours=2)
+        if report.resolved and (datetime.utcnow() - report.submitted_at) <= FAST_RESOLUTION_WINDOW
     )
 
     if len(reports) >= 1:
         badges.append('First Reporter')
-    if reports_with_verification >= 10:
+    if reports_with_verification >= EAGLE_EYE_VERIFIED_REPORTS:
         badges.append('Eagle Eye')
-    if reputation >= 1000:
+    if reputation >= ECO_WARRIOR_REPUTATION:
         badges.append('Eco Warrior')
     if reports_with_fast_resolution >= 1:
         badges.append('Lightning Strike')
-    if _has_streak([event.occurred_at for event in events if event.event_type == 'report_submitted'], 5, 7):
+    submissions = [event.occurred_at for event in events if event.event_type == 'report_submitted']
+    if _has_streak(submissions, STREAK_REQUIRED_REPORTS, STREAK_WINDOW_DAYS):
         badges.append('Streak Master')
 
     return badges
 
 
+class ProfileAccumulator:
+    """
+    Running profile state, updated one event or report at a time in O(1) so
+    a profile never has to be rebuilt from its full history. Submissions
+    must be applied in the order they occurred (from_history sorts a
+    backlog); the 7-day streak window only keeps the last few submission
+    times, and the daily streak the run lengths of the last few local days
+    (a later instant can land on an earlier local day when offsets differ).
+    to_dict() / from_dict() snapshot the state.
+    """
+
+    def __init__(self) -> None:
+        self.points = 0
+        self.total_reports = 0
+        self.resolved_reports = 0
+        self.verified_reports = 0
+        # Submission time of the most recent resolved report, for Lightning Strike.
+        self.latest_resolved_submission: Optional[datetime] = None
+        self.has_streak = False
+        self.streak = 0
+        self.last_submission_day: Optional[date] = None
+        # Local day -> consecutive days ending there, for days near the latest.
+        self._day_runs: Dict[date, int] = {}
+        self.last_submission_at: Optional[datetime] = None
+        self._window: Deque[datetime] = deque(maxlen=STREAK_REQUIRED_REPORTS)
+
+    @classmethod
+    def from_history(cls, reports: Iterable[ReportSummary], events: Iterable[ReportEvent]) -> 'ProfileAccumulator':
+        accumulator = cls()
+        for report in reports:
+            accumulator.apply_report(report)
+        for event in sorted(events, key=lambda event: event.occurred_at):
+            accumulator.apply_event(event)
+        return accumulator
+
+    @property
+    def reputation(self) -> int:
+        return self.points + (GAMIFICATION_RULES['streak_bonus'] if self.has_streak else 0)
+
+    def apply_event(self, event: ReportEvent) -> int:
+        """Apply one event; returns the reputation it earned, streak bonus included."""
+        before = self.reputation
+        if event.event_type == 'report_submitted':
+            self._apply_submission(event.occurred_at)
+        self.points += GAMIFICATION_RULES.get(event.event_type, 0)
+        return self.reputation - before
+
+    def apply_report(self, report: ReportSummary, previous: Optional[ReportSummary] = None) -> None:
+        """
+        Count a report towards the badge counters. Pass the report's
+        `previous` summary when its status changes so it is not counted twice.
+        """
+        if previous is None:
+            self.total_reports += 1
+        else:
+            self.resolved_reports -= previous.resolved
+            self.verified_reports -= previous.verified
+        self.resolved_reports += report.resolved
+        self.verified_reports += report.verified
+        if report.resolved and (
+            self.latest_resolved_submission is None or report.submitted_at > self.latest_resolved_submission
+        ):
+            # A reopened report keeps counting here until the profile is rebuilt.
+            self.latest_resolved_submission = report.submitted_at
+
+    def badges(self, now: Optional[datetime] = None) -> List[str]:
+        now = now or datetime.utcnow()
+        badges: list[str] = []
+        if self.total_reports >= 1:
+            badges.append('First Reporter')
+        if self.verified_reports >= EAGLE_EYE_VERIFIED_REPORTS:
+            badges.append('Eagle Eye')
+        if self.reputation >= ECO_WARRIOR_REPUTATION:
+            badges.append('Eco Warrior')
+        if self.latest_resolved_submission is not None and now - self.latest_resolved_submission <= FAST_RESOLUTION_WINDOW:
+            badges.append('Lightning Strike')
+        if self.has_streak:
+            badges.append('Streak Master')
+        return badges
+
+    def snapshot(self, now: Optional[datetime] = None) -> ProfileSnapshot:
+        return ProfileSnapshot(
+            reputation=self.reputation,
+            total_reports=self.total_reports,
+            resolved_reports=self.resolved_reports,
+            streak=self.streak,
+            badges=self.badges(now),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'points': self.points,
+            'total_reports': self.total_reports,
+            'resolved_reports': self.resolved_reports,
+            'verified_reports': self.verified_reports,
+            'latest_resolved_submission': _isoformat(self.latest_resolved_submission),
+            'has_streak': self.has_streak,
+            'streak': self.streak,
+            'last_submission_day': self.last_submission_day.isoformat() if self.last_submission_day else None,
+            'day_runs': {day.isoformat(): run for day, run in sorted(self._day_runs.items())},
+            'last_submission_at': _isoformat(self.last_submission_at),
+            'window': [stamp.isoformat() for stamp in self._window],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ProfileAccumulator':
+        accumulator = cls()
+        accumulator.points = data['points']
+        accumulator.total_reports = data['total_reports']
+        accumulator.resolved_reports = data['resolved_reports']
+        accumulator.verified_reports = data['verified_reports']
+        accumulator.latest_resolved_submission = _parse_datetime(data.get('latest_resolved_submission'))
+        accumulator.has_streak = data['has_streak']
+        accumulator.streak = data['streak']
+        last_day = data.get('last_submission_day')
+        accumulator.last_submission_day = date.fromisoformat(last_day) if last_day else None
+        if 'day_runs' in data:
+            accumulator._day_runs = {date.fromisoformat(day): run for day, run in data['day_runs'].items()}
+        elif accumulator.last_submission_day is not None:
+            accumulator._day_runs = {accumulator.last_submission_day: accumulator.streak}
+        accumulator.last_submission_at = _parse_datetime(data.get('last_submission_at'))
+        accumulator._window.extend(datetime.fromisoformat(stamp) for stamp in data.get('window', []))
+        return accumulator
+
+    def _apply_submission(self, occurred_at: datetime) -> None:
+        if self.last_submission_at is not None and occurred_at < self.last_submission_at:
+            raise ValueError(
+                f'Submission at {occurred_at.isoformat()} is older than the last applied '
+                f'submission ({self.last_submission_at.isoformat()}); rebuild with from_history()'
+            )
+        self.last_submission_at = occurred_at
+
+        if not self.has_streak:
+            window = self._window
+            while window and occurred_at - window[0] > timedelta(days=STREAK_WINDOW_DAYS):
+                window.popleft()
+            window.append(occurred_at)
+            if len(window) >= STREAK_REQUIRED_REPORTS:
+                self.has_streak = True
+                window.clear()
+
+        self._apply_day(occurred_at.date())
+
+    def _apply_day(self, submitted_day: date) -> None:
+        runs = self._day_runs
+        if submitted_day in runs:
+            return
+        one_day = timedelta(days=1)
+        runs[submitted_day] = runs.get(submitted_day - one_day, 0) + 1
+        # A day filling a gap joins the run above it.
+        day = submitted_day + one_day
+        while day in runs:
+            runs[day] = runs[day - one_day] + 1
+            day += one_day
+        if self.last_submission_day is None or submitted_day > self.last_submission_day:
+            self.last_submission_day = submitted_day
+        horizon = self.last_submission_day - timedelta(days=DAILY_STREAK_HORIZON_DAYS)
+        for stale in [day for day in runs if day < horizon]:
+            del runs[stale]
+        self.streak = runs[self.last_submission_day]
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
 def _has_streak(timestamps: Sequence[datetime], required_reports: int, window_days: int) -> bool:
+    # Sliding window over the sorted timestamps: O(n log n) instead of
+    # restarting the count from every start index.
     ordered = sorted(timestamps)
-    for start_index in range(len(ordered)):
-        window_start = ordered[start_index]
-        count = 1
-        for next_stamp in ordered[start_index + 1 :]:
-            if next_stamp - window_start <= timedelta(days=window_days):
-                count += 1
-                if count >= required_reports:
-                    return True
-            else:
-                break
+    window = timedelta(days=window_days)
+    start_index = 0
+    for end_index, stamp in enumerate(ordered):
+        while stamp - ordered[start_index] > window:
+            start_index += 1
+        if end_index > start_index and end_index - start_index + 1 >= required_reports:
+            return True
     return False
 
 
@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Protocol, Tuple
+
+from .sorted_index import SortedKeyList
+
+REPORT_STORE_BACKEND = os.getenv("REPORT_STORE_BACKEND", "memory")
+REPORT_STORE_PATH = os.getenv("REPORT_STORE_PATH") or str(
+    Path(__file__).resolve().parents[2] / "data" / "reports.sqlite3"
+)
+REPORT_PAGE_SIZE = 20
+REPORT_PAGE_MAX = 200
+
+# Fields with a secondary index; list() and count() filter on these.
+INDEXED_FIELDS: Tuple[str, ...] = ("user_id", "department", "issue_type", "status")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# (-created_at in microseconds, report id): ascending order is newest first,
+# ties broken by id. Cursors encode the last key of a page.
+OrderKey = Tuple[int, str]
+
+
+@dataclass
+class ReportPage:
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+    filters: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"items": self.items, "next_cursor": self.next_cursor, "filters": self.filters}
+
+
+class ReportRepository(Protocol):
+    def get(self, report_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    def put(self, report: Mapping[str, Any]) -> Dict[str, Any]:
+        """Insert or replace a report (keyed by its "id")."""
+
+    def delete(self, report_id: str) -> bool:
+        ...
+
+    def list(
+        self,
+        *,
+        limit: int = REPORT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        **filters: Optional[str],
+    ) -> ReportPage:
+        """Newest first; `filters` are equality filters on INDEXED_FIELDS."""
+
+    def count(self, **filters: Optional[str]) -> int:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+
+def _micros(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def _order_key(report: Mapping[str, Any]) -> OrderKey:
+    return -_micros(report.get("created_at")), str(report["id"])
+
+
+def _index_value(report: Mapping[str, Any], name: str) -> Optional[str]:
+    value = report.get(name)
+    if name == "department" and isinstance(value, Mapping):
+        # An assign_department result: index by the primary department id.
+        primary = value.get("primary_department")
+        value = primary.get("id") if primary else None
+    return str(value) if value is not None else None
+
+
+def encode_cursor(key: OrderKey) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> OrderKey:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created, report_id = json.loads(raw)
+        return int(created), str(report_id)
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"Invalid report cursor: {cursor!r}") from exc
+
+
+def _check_filters(filters: Mapping[str, Optional[str]]) -> Dict[str, str]:
+    unknown = set(filters) - set(INDEXED_FIELDS)
+    if unknown:
+        raise ValueError(f"Cannot filter reports by {', '.join(sorted(unknown))}; indexed fields are {', '.join(INDEXED_FIELDS)}")
+    return {name: str(value) for name, value in filters.items() if value is not None}
+
+
+def _window(created_after: Optional[datetime], created_before: Optional[datetime]) -> Tuple[Optional[int], Optional[int]]:
+    # created_after is inclusive and created_before exclusive, as bounds on -created_at.
+    upper = -_micros(created_after) if created_after is not None else None
+    lower = -_micros(created_before) + 1 if created_before is not None else None
+    return lower, upper
+
+
+class InMemoryReportRepository:
+    """
+    Reports in a dict plus one SortedKeyList of (-created_at, id) keys for
+    all reports and one per value of each INDEXED_FIELDS field. A listing
+    seeks into the most selective matching index in O(log n) and walks it in
+    created_at order, checking any other filters on the way, so keyset pages
+    cost the same at any depth.
+    """
+
+    def __init__(self) -> None:
+        self._reports: Dict[str, Dict[str, Any]] = {}
+        self._keys: Dict[str, OrderKey] = {}
+        self._all = SortedKeyList()
+        self._indexes: Dict[str, Dict[str, SortedKeyList]] = {name: {} for name in INDEXED_FIELDS}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._reports)
+
+    def __contains__(self, report_id: object) -> bool:
+        return report_id in self._reports
+
+    def get(self, report_id: str) -> Optional[Dict[str, Any]]:
+        report = self._reports.get(report_id)
+        return dict(report) if report is not None else None
+
+    def put(self, report: Mapping[str, Any]) -> Dict[str, Any]:
+        stored = dict(report)
+        report_id = str(stored["id"])
+        key = _order_key(stored)
+        with self._lock:
+            previous = self._reports.get(report_id)
+            previous_key = self._keys.get(report_id)
+            if previous is not None and previous_key != key:
+                self._all.remove(previous_key)
+                self._all.add(key)
+            elif previous is None:
+                self._all.add(key)
+            for name, index in self._indexes.items():
+                old_value = _index_value(previous, name) if previous is not None else None
+                new_value = _index_value(stored, name)
+                if previous is not None and old_value == new_value and previous_key == key:
+                    continue
+                if old_value is not None:
+                    self._unindex(index, old_value, previous_key)
+                if new_value is not None:
+                    index.setdefault(new_value, SortedKeyList()).add(key)
+            self._reports[report_id] = stored
+            self._keys[report_id] = key
+        return dict(stored)
+
+    def delete(self, report_id: str) -> bool:
+        with self._lock:
+            report = self._reports.pop(report_id, None)
+            if report is None:
+                return False
+            key = self._keys.pop(report_id)
+            self._all.remove(key)
+            for name, index in self._indexes.items():
+                value = _index_value(report, name)
+                if value is not None:
+                    self._unindex(index, value, key)
+            return True
+
+    def list(
+        self,
+        *,
+        limit: int = REPORT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        **filters: Optional[str],
+    ) -> ReportPage:
+        wanted = _check_filters(filters)
+        limit = max(1, min(limit, REPORT_PAGE_MAX))
+        lower, upper = _window(created_after, created_before)
+        with self._lock:
+            keys, rest = self._candidates(wanted)
+            if keys is None:
+                return ReportPage([], None, wanted)
+            start = keys.bisect_left((lower, "")) if lower is not None else 0
+            if cursor is not None:
+                start = max(start, keys.bisect_right(decode_cursor(cursor)))
+
+            items: List[Dict[str, Any]] = []
+            last: Optional[OrderKey] = None
+            more = False
+            for key in keys.iter_from(start):
+                if upper is not None and key[0] > upper:
+                    break
+                report = self._reports[key[1]]
+                if any(_index_value(report, name) != value for name, value in rest):
+                    continue
+                if len(items) == limit:
+                    more = True
+                    break
+                items.append(dict(report))
+                last = key
+            return ReportPage(items, encode_cursor(last) if more and last else None, wanted)
+
+    def count(self, **filters: Optional[str]) -> int:
+        wanted = _check_filters(filters)
+        with self._lock:
+            keys, rest = self._candidates(wanted)
+            if keys is None:
+                return 0
+            if not rest:
+                return len(keys)
+            return sum(
+                1
+                for _, report_id in keys.iter_from(0)
+                if all(_index_value(self._reports[report_id], name) == value for name, value in rest)
+            )
+
+    def iter_reports(self) -> Iterator[Dict[str, Any]]:
+        """Every report, newest first."""
+        with self._lock:
+            keys = list(self._all.iter_from(0))
+        for _, report_id in keys:
+            report = self._reports.get(report_id)
+            if report is not None:
+                yield dict(report)
+
+    def _candidates(self, wanted: Dict[str, str]) -> Tuple[Optional[SortedKeyList], List[Tuple[str, str]]]:
+        # The smallest matching index drives the scan; the other filters are checked per report.
+        if not wanted:
+            return self._all, []
+        sized = []
+        for name, value in wanted.items():
+            keys = self._indexes[name].get(value)
+            if keys is None:
+                return None, []
+            sized.append((len(keys), name, keys))
+        sized.sort(key=lambda item: item[0])
+        keys = sized[0][2]
+        return keys, [(name, wanted[name]) for _, name, _ in sized[1:]]
+
+    @staticmethod
+    def _unindex(index: Dict[str, SortedKeyList], value: str, key: OrderKey) -> None:
+        keys = index[value]
+        keys.remove(key)
+        if not keys:
+            del index[value]
+
+
+class SQLiteReportRepository:
+    """
+    Same interface on SQLite: reports as JSON rows with the indexed fields
+    and the order key as columns, and a composite (field, sort_key, id)
+    index per INDEXED_FIELDS field so keyset pages are index range scans.
+    """
+
+    def __init__(self, path: str | Path = REPORT_STORE_PATH) -> None:
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(f"{name} TEXT" for name in INDEXED_FIELDS)
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS reports (id TEXT PRIMARY KEY, sort_key INTEGER NOT NULL, {columns}, body TEXT NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS reports_by_created ON reports (sort_key, id)")
+        for name in INDEXED_FIELDS:
+            self._connection.execute(f"CREATE INDEX IF NOT EXISTS reports_by_{name} ON reports ({name}, sort_key, id)")
+        self._connection.commit()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def get(self, report_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute("SELECT body FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, report: Mapping[str, Any]) -> Dict[str, Any]:
+        stored = dict(report)
+        sort_key, report_id = _order_key(stored)
+        values = [_index_value(stored, name) for name in INDEXED_FIELDS]
+        placeholders = ", ".join("?" for _ in INDEXED_FIELDS)
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO reports (id, sort_key, {', '.join(INDEXED_FIELDS)}, body) VALUES (?, ?, {placeholders}, ?)",
+                (report_id, sort_key, *values, json.dumps(stored, default=str)),
+            )
+        return stored
+
+    def delete(self, report_id: str) -> bool:
+        with self._lock, self._connection:
+            return self._connection.execute("DELETE FROM reports WHERE id = ?", (report_id,)).rowcount > 0
+
+    def list(
+        self,
+        *,
+        limit: int = REPORT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        **filters: Optional[str],
+    ) -> ReportPage:
+        wanted = _check_filters(filters)
+        limit = max(1, min(limit, REPORT_PAGE_MAX))
+        lower, upper = _window(created_after, created_before)
+        clauses, params = self._where(wanted)
+        if lower is not None:
+            clauses.append("sort_key >= ?")
+            params.append(lower)
+        if upper is not None:
+            clauses.append("sort_key <= ?")
+            params.append(upper)
+        if cursor is not None:
+            clauses.append("(sort_key, id) > (?, ?)")
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT sort_key, id, body FROM reports {where} ORDER BY sort_key, id LIMIT ?",
+                (*params, limit + 1),
+            ).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor((rows[-1][0], rows[-1][1])) if more else None
+        return ReportPage([json.loads(body) for _, _, body in rows], next_cursor, wanted)
+
+    def count(self, **filters: Optional[str]) -> int:
+        clauses, params = self._where(_check_filters(filters))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            return self._connection.execute(f"SELECT COUNT(*) FROM reports {where}", params).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    @staticmethod
+    def _where(wanted: Mapping[str, str]) -> Tuple[List[str], List[Any]]:
+        # Field names come from INDEXED_FIELDS (checked), never from the caller.
+        return [f"{name} = ?" for name in wanted], list(wanted.values())
+
+
+def create_report_repository(backend: str = REPORT_STORE_BACKEND, path: str = REPORT_STORE_PATH) -> ReportRepository:
+    if backend == "memory":
+        return InMemoryReportRepository()
+    if backend == "sqlite":
+        return SQLiteReportRepository(path)
+    raise ValueError(f"Unknown report store backend '{backend}'; expected 'memory' or 'sqlite'")
+
+
+report_repository = create_report_repository()
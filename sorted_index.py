@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Iterator, List, Tuple
+
+# Entries per bucket before it is split in two.
+BUCKET_LOAD = 512
+
+
+class SortedKeyList:
+    """
+    Sorted list of comparable keys, kept in buckets of at most 2 * BUCKET_LOAD
+    with a Fenwick tree over bucket sizes. Inserts and removals touch a single
+    bucket; finding a key's position or seeking to a position is O(log n), so
+    reading a page costs the same however large the list is.
+    """
+
+    def __init__(self) -> None:
+        self._buckets: List[List[Any]] = []
+        self._maxes: List[Any] = []
+        self._tree: List[int] = []
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: Any) -> bool:
+        index = bisect_left(self._maxes, key)
+        if index == len(self._buckets):
+            return False
+        bucket = self._buckets[index]
+        position = bisect_left(bucket, key)
+        return position < len(bucket) and bucket[position] == key
+
+    def add(self, key: Any) -> None:
+        self._size += 1
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            self._reindex()
+            return
+        index = min(bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[index]
+        insort(bucket, key)
+        self._maxes[index] = bucket[-1]
+        if len(bucket) > 2 * BUCKET_LOAD:
+            self._buckets[index : index + 1] = [bucket[:BUCKET_LOAD], bucket[BUCKET_LOAD:]]
+            self._maxes[index : index + 1] = [bucket[BUCKET_LOAD - 1], bucket[-1]]
+            self._reindex()
+        else:
+            self._update(index, 1)
+
+    def remove(self, key: Any) -> None:
+        """Remove `key`, which must be present."""
+        index = bisect_left(self._maxes, key)
+        bucket = self._buckets[index]
+        del bucket[bisect_left(bucket, key)]
+        self._size -= 1
+        if bucket:
+            self._maxes[index] = bucket[-1]
+            self._update(index, -1)
+        else:
+            del self._buckets[index], self._maxes[index]
+            self._reindex()
+
+    def bisect_left(self, key: Any) -> int:
+        """Number of keys sorting before `key`."""
+        index = bisect_left(self._maxes, key)
+        if index == len(self._buckets):
+            return self._size
+        return self._prefix(index) + bisect_left(self._buckets[index], key)
+
+    def bisect_right(self, key: Any) -> int:
+        """Number of keys sorting before or equal to `key`."""
+        index = bisect_right(self._maxes, key)
+        if index == len(self._buckets):
+            return self._size
+        return self._prefix(index) + bisect_right(self._buckets[index], key)
+
+    def slice(self, start: int, count: int) -> List[Any]:
+        found: List[Any] = []
+        if count <= 0:
+            return found
+        for key in self.iter_from(start):
+            found.append(key)
+            if len(found) >= count:
+                break
+        return found
+
+    def iter_from(self, start: int) -> Iterator[Any]:
+        """Keys from position `start` onwards, in order."""
+        if start >= self._size:
+            return
+        index, offset = self._seek(max(start, 0))
+        buckets = self._buckets
+        while index < len(buckets):
+            yield from buckets[index][offset:] if offset else buckets[index]
+            index, offset = index + 1, 0
+
+    def _reindex(self) -> None:
+        # Linear-time Fenwick build; only runs when buckets are split or dropped.
+        tree = [len(bucket) for bucket in self._buckets]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _update(self, index: int, delta: int) -> None:
+        tree = self._tree
+        while index < len(tree):
+            tree[index] += delta
+            index |= index + 1
+
+    def _prefix(self, index: int) -> int:
+        # Total size of buckets [0, index).
+        total = 0
+        while index > 0:
+            total += self._tree[index - 1]
+            index &= index - 1
+        return total
+
+    def _seek(self, position: int) -> Tuple[int, int]:
+        # (bucket, offset) holding the key at `position`, by Fenwick descent.
+        tree, index = self._tree, 0
+        step = 1 << len(tree).bit_length()
+        while step:
+            probe = index + step
+            if probe <= len(tree) and tree[probe - 1] <= position:
+                position -= tree[probe - 1]
+                index = probe
+            step >>= 1
+        return index, position
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import bisect
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from math import cos, floor, radians
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+METERS_PER_DEGREE = 111_320.0
+
+Cell = Tuple[int, int]
+DistanceFn = Callable[[float, float, float, float], float]
+DistanceArrayFn = Callable[[np.ndarray, np.ndarray, np.ndarray, np.ndarray], np.ndarray]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+_CELL_BITS = 20
+_CELL_OFFSET = 1 << (_CELL_BITS - 1)
+
+
+@dataclass(frozen=True)
+class IndexedReport:
+    report_id: str
+    issue_type: str
+    lat: float
+    lng: float
+    reported_at: datetime
+
+
+def _utc(moment: Optional[datetime]) -> datetime:
+    if moment is None:
+        return datetime.now(timezone.utc)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def _micros(moment: datetime) -> int:
+    return (moment - _EPOCH) // _ONE_MICROSECOND
+
+
+def _cell_keys(codes: np.ndarray, cy: np.ndarray, cx: np.ndarray) -> np.ndarray:
+    # Pack (issue type code, cell row, cell column) into one sortable int64.
+    return (((codes << _CELL_BITS) + (cy + _CELL_OFFSET)) << _CELL_BITS) + (cx + _CELL_OFFSET)
+
+
+class SpatialTemporalIndex:
+    """
+    In-process grid index of recent reports, bucketed per issue type into cells
+    of `cell_meters` so a radius query only inspects the cells within
+    radius // cell_meters + 1 of the point: a 5x5 block when the radius equals
+    the cell size. The extra ring covers points whose columns shift because
+    longitude is scaled by each point's own latitude. Queries only read the
+    lookback window ending at their `now`; entries older than `lookback` by
+    the wall clock are dropped by prune(), which add() runs at most once per
+    `prune_interval`.
+    """
+
+    def __init__(
+        self,
+        cell_meters: float,
+        lookback: timedelta,
+        distance_fn: DistanceFn,
+        distance_array_fn: Optional[DistanceArrayFn] = None,
+        prune_interval: timedelta = timedelta(hours=1),
+    ) -> None:
+        self.cell_meters = cell_meters
+        self.lookback = lookback
+        self.prune_interval = prune_interval
+        self._last_pruned = datetime.now(timezone.utc)
+        self._distance = distance_fn
+        self._distance_array = distance_array_fn or np.vectorize(distance_fn, otypes=[float])
+        # issue_type -> cell -> entries sorted by reported_at
+        self._cells: Dict[str, Dict[Cell, List[Tuple[datetime, str]]]] = defaultdict(dict)
+        self._reports: Dict[str, IndexedReport] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._reports)
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        y = lat * METERS_PER_DEGREE
+        x = lng * METERS_PER_DEGREE * cos(radians(lat))
+        return floor(y / self.cell_meters), floor(x / self.cell_meters)
+
+    def add(
+        self,
+        report_id: str,
+        issue_type: str,
+        lat: float,
+        lng: float,
+        reported_at: Optional[datetime] = None,
+    ) -> None:
+        """
+        Insert or move a report; re-adding the same id replaces the old entry.
+        Without `reported_at` a re-added report keeps its original timestamp.
+        """
+        with self._lock:
+            existing = self._reports.get(report_id)
+            if reported_at is None and existing is not None:
+                reported_at = existing.reported_at
+            report = IndexedReport(report_id, issue_type, lat, lng, _utc(reported_at))
+            self._remove_locked(report_id)
+            self._reports[report_id] = report
+            bucket = self._cells[issue_type].setdefault(self._cell(lat, lng), [])
+            bisect.insort(bucket, (report.reported_at, report_id))
+            # Cells that are never queried again would otherwise keep their reports.
+            now = datetime.now(timezone.utc)
+            if now - self._last_pruned >= self.prune_interval:
+                self._prune_locked(now - self.lookback)
+
+    def remove(self, report_id: str) -> None:
+        with self._lock:
+            self._remove_locked(report_id)
+
+    def count_neighbors(
+        self,
+        issue_type: str,
+        lat: float,
+        lng: float,
+        radius_meters: float,
+        *,
+        now: Optional[datetime] = None,
+        exclude_report_id: Optional[str] = None,
+    ) -> int:
+        """Reports of `issue_type` within `radius_meters` reported in the lookback window ending at `now`."""
+        return len(self.neighbors(issue_type, lat, lng, radius_meters, now=now, exclude_report_id=exclude_report_id))
+
+    def neighbors(
+        self,
+        issue_type: str,
+        lat: float,
+        lng: float,
+        radius_meters: float,
+        *,
+        now: Optional[datetime] = None,
+        exclude_report_id: Optional[str] = None,
+    ) -> List[str]:
+        """Ids of the reports count_neighbors() would count."""
+        now = _utc(now)
+        cutoff = now - self.lookback
+        reach = max(1, int(radius_meters // self.cell_meters) + 1)
+        cy, cx = self._cell(lat, lng)
+        found: List[str] = []
+        with self._lock:
+            cells = self._cells.get(issue_type)
+            if not cells:
+                return found
+            for dy in range(-reach, reach + 1):
+                for dx in range(-reach, reach + 1):
+                    bucket = cells.get((cy + dy, cx + dx))
+                    if not bucket:
+                        continue
+                    # Only the caller's window is read; expiry is left to prune(),
+                    # so a skewed `now` never drops live entries.
+                    first = bisect.bisect_left(bucket, (cutoff,))
+                    last = bisect.bisect_left(bucket, (now + _ONE_MICROSECOND,))
+                    for _, report_id in bucket[first:last]:
+                        if report_id == exclude_report_id:
+                            continue
+                        report = self._reports[report_id]
+                        if self._distance(lat, lng, report.lat, report.lng) <= radius_meters:
+                            found.append(report_id)
+        return found
+
+    def count_neighbors_many(
+        self,
+        issue_types: Sequence[str],
+        codes: np.ndarray,
+        lat: np.ndarray,
+        lng: np.ndarray,
+        radius_meters: float,
+        *,
+        now: Optional[datetime] = None,
+        exclude_report_ids: Optional[Sequence[Optional[str]]] = None,
+    ) -> np.ndarray:
+        """
+        Vectorized count_neighbors for a batch of points. Row i asks about
+        `issue_types[codes[i]]` at (lat[i], lng[i]). Candidate pairs come from a
+        sorted cell-key join and distances from `distance_array_fn` in one pass.
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        codes = np.asarray(codes, dtype=np.int64)
+        counts = np.zeros(len(lat), dtype=np.int64)
+        if not len(lat):
+            return counts
+
+        type_codes = {name: code for code, name in enumerate(issue_types)}
+        now = _utc(now)
+        cutoff, upper = _micros(now - self.lookback), _micros(now)
+        with self._lock:
+            entries = [
+                (type_codes[issue_type], cell, report_id)
+                for issue_type, cells in self._cells.items()
+                if issue_type in type_codes
+                for cell, bucket in cells.items()
+                for _, report_id in bucket
+            ]
+            reports = [self._reports[report_id] for _, _, report_id in entries]
+        if not entries:
+            return counts
+
+        p_keys = _cell_keys(
+            np.fromiter((code for code, _, _ in entries), dtype=np.int64, count=len(entries)),
+            np.fromiter((cell[0] for _, cell, _ in entries), dtype=np.int64, count=len(entries)),
+            np.fromiter((cell[1] for _, cell, _ in entries), dtype=np.int64, count=len(entries)),
+        )
+        order = np.argsort(p_keys, kind="stable")
+        p_keys = p_keys[order]
+        reports = [reports[i] for i in order]
+        p_lat = np.fromiter((r.lat for r in reports), dtype=np.float64, count=len(reports))
+        p_lng = np.fromiter((r.lng for r in reports), dtype=np.float64, count=len(reports))
+        p_time = np.fromiter((_micros(r.reported_at) for r in reports), dtype=np.int64, count=len(reports))
+        p_live = (p_time >= cutoff) & (p_time <= upper)
+
+        excluded = np.full(len(lat), -1, dtype=np.int64)
+        if exclude_report_ids is not None:
+            position = {r.report_id: i for i, r in enumerate(reports)}
+            excluded = np.fromiter(
+                (position.get(report_id, -1) for report_id in exclude_report_ids), dtype=np.int64, count=len(lat)
+            )
+
+        q_cy = np.floor(lat * METERS_PER_DEGREE / self.cell_meters).astype(np.int64)
+        q_cx = np.floor(lng * METERS_PER_DEGREE * np.cos(np.radians(lat)) / self.cell_meters).astype(np.int64)
+        # Sorted queries keep searchsorted cache-friendly; a cell offset is a
+        # constant added to every key, so one sort serves all offsets.
+        q_base = _cell_keys(codes, q_cy, q_cx)
+        q_order = np.argsort(q_base, kind="stable")
+        q_base = q_base[q_order]
+        q_lat, q_lng, q_excluded = lat[q_order], lng[q_order], excluded[q_order]
+        sorted_counts = np.zeros(len(lat), dtype=np.int64)
+        reach = max(1, int(radius_meters // self.cell_meters) + 1)
+        rows = np.arange(len(lat))
+        for dy in range(-reach, reach + 1):
+            for dx in range(-reach, reach + 1):
+                q_keys = q_base + ((dy << _CELL_BITS) + dx)
+                lo = np.searchsorted(p_keys, q_keys, side="left")
+                hi = np.searchsorted(p_keys, q_keys, side="right")
+                sizes = hi - lo
+                total = int(sizes.sum())
+                if not total:
+                    continue
+                q_idx = np.repeat(rows, sizes)
+                starts = np.repeat(lo - (np.cumsum(sizes) - sizes), sizes)
+                p_idx = starts + np.arange(total)
+                distance = self._distance_array(q_lat[q_idx], q_lng[q_idx], p_lat[p_idx], p_lng[p_idx])
+                hit = (distance <= radius_meters) & p_live[p_idx] & (p_idx != q_excluded[q_idx])
+                sorted_counts += np.bincount(q_idx[hit], minlength=len(lat))
+        counts[q_order] = sorted_counts
+        return counts
+
+    def prune(self, now: Optional[datetime] = None) -> int:
+        """Drop every entry older than the lookback window; returns the number removed."""
+        with self._lock:
+            return self._prune_locked(_utc(now) - self.lookback)
+
+    def rebuild(self, reports: Iterable[IndexedReport]) -> None:
+        """Bulk-load reports (e.g. open reports from the database at startup)."""
+        with self._lock:
+            self._cells.clear()
+            self._reports.clear()
+        for report in reports:
+            self.add(report.report_id, report.issue_type, report.lat, report.lng, report.reported_at)
+
+    def _prune_locked(self, cutoff: datetime) -> int:
+        before = len(self._reports)
+        for issue_type, cells in list(self._cells.items()):
+            for cell, bucket in list(cells.items()):
+                self._expire_locked(issue_type, cell, bucket, cutoff)
+        self._last_pruned = datetime.now(timezone.utc)
+        return before - len(self._reports)
+
+    def _expire_locked(self, issue_type: str, cell: Cell, bucket: List[Tuple[datetime, str]], cutoff: datetime) -> None:
+        expired = bisect.bisect_left(bucket, (cutoff, ""))
+        if not expired:
+            return
+        for _, report_id in bucket[:expired]:
+            self._reports.pop(report_id, None)
+        del bucket[:expired]
+        if not bucket:
+            del self._cells[issue_type][cell]
+
+    def _remove_locked(self, report_id: str) -> None:
+        report = self._reports.pop(report_id, None)
+        if report is None:
+            return
+        cell = self._cell(report.lat, report.lng)
+        bucket = self._cells[report.issue_type].get(cell)
+        if bucket is None:
+            return
+        try:
+            bucket.remove((report.reported_at, report_id))
+        except ValueError:
+            return
+        if not bucket:
+            del self._cells[report.issue_type][cell]
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import weakref
+from typing import Dict, Mapping, Optional, Protocol, Tuple
+from urllib.parse import quote
+
+import httpx
+from loguru import logger
+
+from .blob_store import LocalBlobStore, blob_store
+
+STORAGE_MAX_CONCURRENCY = int(os.getenv('STORAGE_MAX_CONCURRENCY', 16))
+STORAGE_MAX_RETRIES = int(os.getenv('STORAGE_MAX_RETRIES', 3))
+STORAGE_RETRY_DELAY_SECONDS = float(os.getenv('STORAGE_RETRY_DELAY_SECONDS', 0.5))
+STORAGE_TIMEOUT_SECONDS = float(os.getenv('STORAGE_TIMEOUT_SECONDS', 30))
+STORAGE_CACHE_CONTROL = os.getenv('STORAGE_CACHE_CONTROL', '3600')
+
+_RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+Variant = Tuple[bytes, str]
+
+
+class StorageError(RuntimeError):
+    pass
+
+
+class StorageBackend(Protocol):
+    async def put(self, path: str, data: bytes, content_type: str) -> str:
+        """Store `data` at `path` and return its public URL."""
+
+    async def delete(self, path: str) -> bool:
+        ...
+
+
+class SupabaseStorageBackend:
+    """
+    Async Supabase Storage client over the REST API: one pooled httpx client per
+    event loop, bounded concurrency and retries with jittered backoff. Public
+    URLs are derived locally, so an upload is a single round trip.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        service_key: str,
+        bucket: str,
+        *,
+        max_concurrency: int = STORAGE_MAX_CONCURRENCY,
+        max_retries: int = STORAGE_MAX_RETRIES,
+        retry_delay: float = STORAGE_RETRY_DELAY_SECONDS,
+        timeout: float = STORAGE_TIMEOUT_SECONDS,
+    ) -> None:
+        self.base_url = base_url.rstrip('/')
+        self.bucket = bucket
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self._headers = {'Authorization': f'Bearer {service_key}', 'apikey': service_key}
+        self._clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]' = weakref.WeakKeyDictionary()
+        self._semaphores: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]' = weakref.WeakKeyDictionary()
+
+    def public_url(self, path: str) -> str:
+        return f'{self.base_url}/storage/v1/object/public/{self.bucket}/{quote(path)}'
+
+    async def put(self, path: str, data: bytes, content_type: str) -> str:
+        await self._request(
+            'POST',
+            f'/storage/v1/object/{self.bucket}/{quote(path)}',
+            content=data,
+            headers={'content-type': content_type, 'cache-control': STORAGE_CACHE_CONTROL, 'x-upsert': 'false'},
+        )
+        return self.public_url(path)
+
+    async def delete(self, path: str) -> bool:
+        try:
+            await self._request('DELETE', f'/storage/v1/object/{self.bucket}', json={'prefixes': [path]})
+            return True
+        except StorageError as exc:
+            logger.warning('Failed to delete {}: {}', path, exc)
+            return False
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        client = self._clients.pop(loop, None)
+        self._semaphores.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+    def _client(self) -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self._headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            )
+            self._clients[loop] = client
+            self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return client, self._semaphores[loop]
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        client, semaphore = self._client()
+        last_error: Optional[str] = None
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                async with semaphore:
+                    response = await client.request(method, url, **kwargs)
+                if response.status_code < 400:
+                    return response
+                last_error = f'{response.status_code}: {response.text[:200]}'
+                if response.status_code not in _RETRYABLE_STATUS:
+                    break
+            except httpx.TransportError as exc:
+                last_error = repr(exc)
+            if attempt < self.max_retries:
+                base = self.retry_delay * 2 ** (attempt - 1)
+                await asyncio.sleep(base / 2 + random.uniform(0, base / 2))
+        raise StorageError(f'{method} {url} failed: {last_error}')
+
+
+class LocalBlobBackend:
+    """Local-mode backend over the content-addressed blob store; `path` is ignored for naming."""
+
+    def __init__(self, store: LocalBlobStore = blob_store, base_url: str = '') -> None:
+        self.store = store
+        self.base_url = base_url.rstrip('/')
+
+    async def put(self, path: str, data: bytes, content_type: str) -> str:
+        blob_id = await asyncio.to_thread(self.store.put, data, content_type)
+        return f'{self.base_url}/images/{blob_id}'
+
+    async def delete(self, path: str) -> bool:
+        # Blobs are shared between identical uploads, so they are never removed per report.
+        return True
+
+
+async def upload_variants(backend: StorageBackend, variants: Mapping[str, Tuple[str, Variant]]) -> Dict[str, str]:
+    """
+    Upload several renditions concurrently. `variants` maps a variant name
+    (e.g. "original", "thumb_200") to (path, (data, content_type)); returns
+    name -> public URL. Any failure fails the whole call.
+    """
+    names = list(variants)
+    urls = await asyncio.gather(
+        *(backend.put(path, data, content_type) for path, (data, content_type) in (variants[name] for name in names))
+    )
+    return dict(zip(names, urls))
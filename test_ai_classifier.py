@@ -1,18 +1,210 @@
-from unittest.mock import patch
+import asyncio
+import base64
+from unittest.mock import AsyncMock, patch
+
+import pytest
 
 from app.services import ai_classifier
 
 
-@patch('app.services.ai_classifier.OpenAI')
+@pytest.fixture(autouse=True)
+def openai_key(monkeypatch):
+  monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+  ai_classifier.classification_cache.clear()
+  ai_classifier.circuit_breaker.reset()
+
+
+def _response(text):
+  return type('Resp', (), {'output': [type('obj', (), {'content': [{'text': text}]})]})()
+
+
+@patch('app.services.ai_classifier.AsyncOpenAI')
 def test_classify_success(mock_client):
   instance = mock_client.return_value
-  instance.responses.create.return_value.output = [type('obj', (), {'content': [{'text': '{"issue_type": "pothole", "severity": 8, "confidence": 0.9, "description": "Test", "safety_risk": true, "estimated_affected_people": 100, "recommended_action": "Fix"}'}]})]
+  instance.close = AsyncMock()
+  instance.responses.create = AsyncMock(return_value=_response('{"issue_type": "pothole", "severity": 8, "confidence": 0.9, "description": "Test", "safety_risk": true, "estimated_affected_people": 100, "recommended_action": "Fix"}'))
   result = ai_classifier.classify_urban_issue('https://example.com/image')
   assert result['issue_type'] == 'pothole'
 
-@patch('app.services.ai_classifier.OpenAI')
+@patch('app.services.ai_classifier.AsyncOpenAI')
 def test_low_confidence(mock_client):
   instance = mock_client.return_value
-  instance.responses.create.return_value.output = [type('obj', (), {'content': [{'text': '{"issue_type": "pothole", "severity": 8, "confidence": 0.1, "description": "Test", "safety_risk": false, "estimated_affected_people": 10, "recommended_action": "Fix"}'}]})]
+  instance.close = AsyncMock()
+  instance.responses.create = AsyncMock(return_value=_response('{"issue_type": "pothole", "severity": 8, "confidence": 0.1, "description": "Test", "safety_risk": false, "estimated_affected_people": 10, "recommended_action": "Fix"}'))
   result = ai_classifier.classify_urban_issue('https://example.com/image')
   assert result['issue_type'] == 'unclear_issue'
+
+
+@patch('app.services.ai_classifier.AsyncOpenAI')
+def test_async_deadline_returns_fallback(mock_client, monkeypatch):
+  async def slow_create(**kwargs):
+    await asyncio.sleep(5)
+
+  instance = mock_client.return_value
+  instance.close = AsyncMock()
+  instance.responses.create = slow_create
+  monkeypatch.setattr(ai_classifier, 'RETRY_DELAY_SECONDS', 0)
+
+  async def run():
+    try:
+      return await ai_classifier.classify_urban_issue_async('https://example.com/image', deadline=0.05)
+    finally:
+      await ai_classifier.aclose_async_client()
+
+  result = asyncio.run(run())
+  assert result['issue_type'] == 'unclear_issue'
+  assert 'error' in result
+
+
+@patch('app.services.ai_classifier.AsyncOpenAI')
+def test_async_concurrency_is_bounded(mock_client, monkeypatch):
+  in_flight = 0
+  peak = 0
+
+  async def create(**kwargs):
+    nonlocal in_flight, peak
+    in_flight += 1
+    peak = max(peak, in_flight)
+    await asyncio.sleep(0.01)
+    in_flight -= 1
+    return _response('{"issue_type": "graffiti", "severity": 3, "confidence": 0.8}')
+
+  instance = mock_client.return_value
+  instance.close = AsyncMock()
+  instance.responses.create = create
+  monkeypatch.setattr(ai_classifier, 'MAX_CONCURRENT_CLASSIFICATIONS', 4)
+
+  async def run():
+    try:
+      return await asyncio.gather(*(ai_classifier.classify_urban_issue_async(f'https://example.com/{i}') for i in range(20)))
+    finally:
+      await ai_classifier.aclose_async_client()
+
+  results = asyncio.run(run())
+  assert all(r['issue_type'] == 'graffiti' for r in results)
+  assert peak <= 4
+
+
+@patch('app.services.ai_classifier.AsyncOpenAI')
+def test_breaker_latency_excludes_waiting_for_a_slot(mock_client, monkeypatch):
+  async def create(**kwargs):
+    await asyncio.sleep(0.02)
+    return _response('{"issue_type": "graffiti", "severity": 3, "confidence": 0.8}')
+
+  instance = mock_client.return_value
+  instance.close = AsyncMock()
+  instance.responses.create = create
+  monkeypatch.setattr(ai_classifier, 'MAX_CONCURRENT_CLASSIFICATIONS', 1)
+  latencies = []
+  monkeypatch.setattr(ai_classifier.circuit_breaker, 'record_success', latencies.append)
+
+  async def run():
+    try:
+      await asyncio.gather(*(ai_classifier.classify_urban_issue_async(f'https://example.com/q{i}') for i in range(8)))
+    finally:
+      await ai_classifier.aclose_async_client()
+
+  asyncio.run(run())
+  assert len(latencies) == 8
+  assert max(latencies) < 0.1
+
+
+@patch('app.services.ai_classifier.AsyncOpenAI')
+def test_repeat_classification_served_from_cache(mock_client):
+  instance = mock_client.return_value
+  instance.close = AsyncMock()
+  instance.responses.create = AsyncMock(return_value=_response('{"issue_type": "flooding", "severity": 6, "confidence": 0.9}'))
+  ai_classifier.classify_urban_issue('https://example.com/image')
+  result = ai_classifier.classify_urban_issue('https://EXAMPLE.com/image')
+  assert result['issue_type'] == 'flooding'
+  assert instance.responses.create.await_count == 1
+
+
+@patch('app.services.ai_classifier.AsyncOpenAI')
+def test_open_circuit_fails_fast(mock_client):
+  instance = mock_client.return_value
+  instance.close = AsyncMock()
+  instance.responses.create = AsyncMock(side_effect=RuntimeError('upstream down'))
+  for _ in range(ai_classifier.circuit_breaker.min_calls):
+    ai_classifier.circuit_breaker.record_failure()
+  result = ai_classifier.classify_urban_issue('https://example.com/image')
+  assert result['issue_type'] == 'unclear_issue'
+  assert 'circuit open' in result['error']
+  assert instance.responses.create.await_count == 0
+
+
+@patch('app.services.ai_classifier.AsyncOpenAI')
+def test_hedged_request_wins_over_slow_primary(mock_client, monkeypatch):
+  calls = 0
+
+  async def create(**kwargs):
+    nonlocal calls
+    calls += 1
+    if calls == 1:
+      await asyncio.sleep(5)
+    return _response('{"issue_type": "pothole", "severity": 7, "confidence": 0.9}')
+
+  instance = mock_client.return_value
+  instance.close = AsyncMock()
+  instance.responses.create = create
+  monkeypatch.setattr(ai_classifier, 'HEDGE_REQUESTS', True)
+  monkeypatch.setattr(ai_classifier.latency_tracker, 'hedge_delay', lambda: 0.01)
+
+  result = ai_classifier.classify_urban_issue('https://example.com/hedge')
+  assert result['issue_type'] == 'pothole'
+  assert calls == 2
+
+
+@patch('app.services.ai_classifier.AsyncOpenAI')
+def test_triage_short_circuits_unusable_image(mock_client, monkeypatch):
+  import cv2
+  import numpy as np
+
+  from app.services import image_triage
+
+  instance = mock_client.return_value
+  instance.close = AsyncMock()
+  instance.responses.create = AsyncMock()
+  monkeypatch.setattr(image_triage, 'TRIAGE_WORKERS', 0)
+  dark = cv2.imencode('.jpg', np.full((480, 640, 3), 5, dtype=np.uint8))[1].tobytes()
+
+  async def run():
+    try:
+      return await ai_classifier.classify_urban_issue_async('https://example.com/dark', image_bytes=dark)
+    finally:
+      await ai_classifier.aclose_async_client()
+
+  result = asyncio.run(run())
+  assert result['issue_type'] == 'unclear_issue'
+  assert 'too dark' in result['triage_reason']
+  assert instance.responses.create.await_count == 0
+
+
+@patch('app.services.ai_classifier.AsyncOpenAI')
+def test_inline_mode_sends_downscaled_rendition(mock_client, monkeypatch):
+  import io
+
+  from PIL import Image
+
+  buffer = io.BytesIO()
+  Image.new('RGB', (3000, 2000), (120, 90, 60)).save(buffer, format='JPEG')
+  response = _response('{"issue_type": "pothole", "severity": 5, "confidence": 0.9}')
+  response.usage = type('Usage', (), {'input_tokens': 300, 'output_tokens': 40})()
+  instance = mock_client.return_value
+  instance.close = AsyncMock()
+  instance.responses.create = AsyncMock(return_value=response)
+  monkeypatch.setattr(ai_classifier, 'TRIAGE_ENABLED', False)
+  monkeypatch.setattr(ai_classifier, '_usage', {})
+
+  async def run():
+    try:
+      return await ai_classifier.classify_urban_issue_async('https://example.com/big.jpg', image_bytes=buffer.getvalue())
+    finally:
+      await ai_classifier.aclose_async_client()
+
+  asyncio.run(run())
+  sent = instance.responses.create.await_args.kwargs['input'][1]['content'][1]['image_url']
+  assert sent.startswith('data:image/jpeg;base64,')
+  rendition = Image.open(io.BytesIO(base64.b64decode(sent.split(',', 1)[1])))
+  assert max(rendition.size) == ai_classifier.IMAGE_MAX_SIDE
+  assert ai_classifier.usage_stats()['inline']['mean_input_tokens'] == 300
@@ -0,0 +1,88 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from app.services import batch_classifier
+
+
+def _collect(**kwargs):
+  async def run():
+    return [item async for item in batch_classifier.classify_many(**kwargs)]
+  return asyncio.run(run())
+
+
+def test_classify_many_runs_concurrently(monkeypatch):
+  in_flight = 0
+  peak = 0
+
+  async def fake_classify(image_url, deadline=None):
+    nonlocal in_flight, peak
+    in_flight += 1
+    peak = max(peak, in_flight)
+    await asyncio.sleep(0.01)
+    in_flight -= 1
+    return {'issue_type': 'pothole', 'image': image_url}
+
+  monkeypatch.setattr(batch_classifier.ai_classifier, 'classify_urban_issue_async', fake_classify)
+  urls = [f'https://cdn/{i}.jpg' for i in range(20)]
+  results = _collect(image_urls=urls, concurrency=5)
+  assert sorted(url for url, _ in results) == sorted(urls)
+  assert peak == 5
+
+
+def test_checkpoint_resume_skips_done_and_retries_failures(monkeypatch, tmp_path):
+  checkpoint = tmp_path / 'progress.jsonl'
+  calls = []
+
+  async def fake_classify(image_url, deadline=None):
+    calls.append(image_url)
+    if image_url.endswith('bad.jpg'):
+      return {'issue_type': 'unclear_issue', 'error': 'timeout'}
+    return {'issue_type': 'graffiti'}
+
+  monkeypatch.setattr(batch_classifier.ai_classifier, 'classify_urban_issue_async', fake_classify)
+  urls = ['https://cdn/a.jpg', 'https://cdn/bad.jpg', 'https://cdn/b.jpg']
+  _collect(image_urls=urls, concurrency=2, checkpoint_path=checkpoint)
+  lines = [json.loads(line) for line in checkpoint.read_text().splitlines()]
+  assert {line['image_url'] for line in lines} == {'https://cdn/a.jpg', 'https://cdn/b.jpg'}
+
+  calls.clear()
+  _collect(image_urls=urls, concurrency=2, checkpoint_path=checkpoint)
+  assert calls == ['https://cdn/bad.jpg']
+
+
+@patch('app.services.ai_classifier.AsyncOpenAI')
+def test_rate_limit_is_charged_per_upstream_request(mock_client, monkeypatch):
+  from app.services import ai_classifier
+
+  monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+  monkeypatch.setattr(ai_classifier, 'RETRY_DELAY_SECONDS', 0)
+  ai_classifier.classification_cache.clear()
+  ai_classifier.circuit_breaker.reset()
+  started = []
+
+  async def create(**kwargs):
+    started.append(asyncio.get_running_loop().time())
+    if len(started) == 1:
+      raise RuntimeError('transient')
+    return type('Resp', (), {'output': [type('obj', (), {'content': [{'text': '{"issue_type": "pothole", "confidence": 0.9}'}]})]})()
+
+  mock_client.return_value.responses.create = create
+  acquired = 0
+  real_acquire = batch_classifier.RateLimiter.acquire
+
+  async def counting_acquire(self):
+    nonlocal acquired
+    acquired += 1
+    await real_acquire(self)
+
+  monkeypatch.setattr(batch_classifier.RateLimiter, 'acquire', counting_acquire)
+  urls = [f'https://cdn/{i}.jpg' for i in range(4)]
+
+  _collect(image_urls=urls, concurrency=4, rate_limit=3000)
+  assert len(started) == acquired == 5  # four images plus one retry
+  gaps = [b - a for a, b in zip(started, started[1:])]
+  assert min(gaps) >= 0.02 * 0.9
+
+  _collect(image_urls=urls, concurrency=4, rate_limit=3000)
+  assert len(started) == acquired == 5  # cache hits are free
@@ -0,0 +1,80 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from fastapi import FastAPI, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+from starlette.datastructures import Headers
+
+from app.api import image_routes
+from app.services.blob_store import LocalBlobStore
+from app.services.image_storage import SupabaseImageStorage
+from app.services.storage_backends import LocalBlobBackend
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+  blob_store = LocalBlobStore(tmp_path)
+  monkeypatch.setattr(image_routes, 'blob_store', blob_store)
+  return blob_store
+
+
+@pytest.fixture
+def client(store):
+  app = FastAPI()
+  app.include_router(image_routes.router)
+  return TestClient(app)
+
+
+def test_put_is_content_addressed_and_deduplicated(store, tmp_path):
+  data = b'webp-bytes'
+  digest = hashlib.sha256(data).hexdigest()
+  blob_id = store.put(data, 'image/webp')
+  assert blob_id == f'{digest}.webp'
+  assert store.put(data, 'image/webp') == blob_id
+  assert store.path_for(blob_id) == tmp_path / digest[:2] / digest[2:4] / blob_id
+  assert len(list(tmp_path.rglob('*.webp'))) == 1
+  assert store.path_for('../../etc/passwd') is None
+
+
+def test_serves_blob_with_cache_headers_and_etag(store, client):
+  blob_id = store.put(b'0123456789', 'image/jpeg')
+  response = client.get(f'/images/{blob_id}')
+  assert response.status_code == 200
+  assert response.content == b'0123456789'
+  assert response.headers['content-type'] == 'image/jpeg'
+  assert 'immutable' in response.headers['cache-control']
+
+  cached = client.get(f'/images/{blob_id}', headers={'If-None-Match': response.headers['etag']})
+  assert cached.status_code == 304
+
+
+def test_range_requests(store, client):
+  blob_id = store.put(b'0123456789', 'image/jpeg')
+  partial = client.get(f'/images/{blob_id}', headers={'Range': 'bytes=2-5'})
+  assert partial.status_code == 206
+  assert partial.content == b'2345'
+  assert partial.headers['content-range'] == 'bytes 2-5/10'
+
+  suffix = client.get(f'/images/{blob_id}', headers={'Range': 'bytes=-3'})
+  assert suffix.content == b'789'
+
+  invalid = client.get(f'/images/{blob_id}', headers={'Range': 'bytes=20-'})
+  assert invalid.status_code == 416
+  assert client.get('/images/' + '0' * 64 + '.jpg').status_code == 404
+
+
+def test_png_upload_is_stored_as_the_jpeg_it_was_converted_to(store, client):
+  storage = SupabaseImageStorage()
+  storage._backend = LocalBlobBackend(store)
+  png = io.BytesIO()
+  Image.new('RGB', (64, 48), (10, 120, 200)).save(png, format='PNG')
+  upload = UploadFile(io.BytesIO(png.getvalue()), filename='photo.png', headers=Headers({'content-type': 'image/png'}))
+
+  result = asyncio.run(storage.upload_image(upload))
+  assert result['content_type'] == 'image/jpeg'
+  response = client.get(result['url'])
+  assert response.headers['content-type'] == 'image/jpeg'
+  assert response.content[:3] == b'\xff\xd8\xff'
@@ -0,0 +1,53 @@
+import time
+
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, LatencyTracker
+
+
+def _breaker(**kwargs):
+  options = dict(window_size=10, min_calls=4, failure_rate=0.5, slow_call_seconds=1.0, slow_call_rate=0.75, open_seconds=0.05)
+  options.update(kwargs)
+  return CircuitBreaker(**options)
+
+
+def test_opens_on_failure_rate_and_rejects():
+  breaker = _breaker()
+  for _ in range(2):
+    breaker.record_success(0.1)
+  for _ in range(2):
+    breaker.record_failure()
+  assert breaker.state == OPEN
+  assert breaker.allow_request() is False
+  assert breaker.stats()['rejected'] == 1
+
+
+def test_opens_on_slow_calls():
+  breaker = _breaker()
+  for _ in range(4):
+    breaker.record_success(2.0)
+  assert breaker.state == OPEN
+
+
+def test_half_open_probe_closes_or_reopens():
+  breaker = _breaker(half_open_probes=1)
+  for _ in range(4):
+    breaker.record_failure()
+  time.sleep(0.06)
+  assert breaker.state == HALF_OPEN
+  assert breaker.allow_request() is True
+  assert breaker.allow_request() is False
+  breaker.record_failure()
+  assert breaker.state == OPEN
+
+  time.sleep(0.06)
+  assert breaker.allow_request() is True
+  breaker.record_success(0.1)
+  assert breaker.state == CLOSED
+
+
+def test_latency_tracker_hedge_delay_needs_samples():
+  tracker = LatencyTracker(sample_size=100, min_samples=20)
+  assert tracker.hedge_delay() is None
+  for i in range(1, 101):
+    tracker.record(i / 10)
+  assert tracker.percentile(95) == 9.5
+  assert tracker.hedge_delay() == 9.5
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+from app.services.classification_cache import ClassificationCache, make_cache_key
+
+
+def test_key_normalizes_url_and_tracks_version():
+  a = make_cache_key('v1', image_url='HTTPS://CDN.example.com/a.jpg?b=2&a=1#frag')
+  b = make_cache_key('v1', image_url='https://cdn.example.com/a.jpg?a=1&b=2')
+  assert a == b
+  assert make_cache_key('v2', image_url='https://cdn.example.com/a.jpg?a=1&b=2') != a
+  assert make_cache_key('v1', image_bytes=b'abc') == make_cache_key('v1', image_bytes=b'abc')
+
+
+def test_lru_eviction_and_stats():
+  cache = ClassificationCache(max_entries=2, disk_dir=None)
+  cache.set('a', {'issue_type': 'pothole'})
+  cache.set('b', {'issue_type': 'graffiti'})
+  assert cache.get('a') is not None
+  cache.set('c', {'issue_type': 'flooding'})
+  assert cache.get('b') is None
+  stats = cache.stats()
+  assert stats['hits'] == 1
+  assert stats['misses'] == 1
+  assert stats['evictions'] == 1
+
+
+def test_disk_tier_survives_restart_and_expires(tmp_path):
+  cache = ClassificationCache(max_entries=8, disk_dir=tmp_path, ttl_seconds=60)
+  cache.set('k' * 64, {'issue_type': 'pothole'})
+  reloaded = ClassificationCache(max_entries=8, disk_dir=tmp_path, ttl_seconds=60)
+  assert reloaded.get('k' * 64) == {'issue_type': 'pothole'}
+  assert reloaded.stats()['disk_hits'] == 1
+
+  expired = ClassificationCache(max_entries=8, disk_dir=tmp_path, ttl_seconds=0)
+  time.sleep(0.01)
+  assert expired.get('k' * 64) is None
+
+
+def test_single_flight_coalesces_concurrent_calls():
+  cache = ClassificationCache(max_entries=8, disk_dir=None)
+  calls = 0
+
+  async def factory():
+    nonlocal calls
+    calls += 1
+    await asyncio.sleep(0.01)
+    return {'issue_type': 'pothole'}
+
+  async def run():
+    return await asyncio.gather(*(cache.get_or_compute('same', factory) for _ in range(10)))
+
+  results = asyncio.run(run())
+  assert calls == 1
+  assert all(r == {'issue_type': 'pothole'} for r in results)
+  assert cache.stats()['coalesced'] == 9
+
+
+def test_uncacheable_results_are_not_stored():
+  cache = ClassificationCache(max_entries=8, disk_dir=None)
+
+  async def factory():
+    return {'issue_type': 'unclear_issue', 'error': 'timeout'}
+
+  asyncio.run(cache.get_or_compute('k', factory, cacheable=lambda v: 'error' not in v))
+  assert cache.get('k') is None
+
+
+def test_cancelled_owner_hands_the_computation_to_a_waiter():
+  cache = ClassificationCache(max_entries=8, disk_dir=None)
+  calls = 0
+
+  async def factory():
+    nonlocal calls
+    calls += 1
+    await asyncio.sleep(0.01)
+    return {'issue_type': 'pothole'}
+
+  async def run():
+    owner = asyncio.create_task(cache.get_or_compute('same', factory))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(cache.get_or_compute('same', factory)) for _ in range(3)]
+    await asyncio.sleep(0)
+    owner.cancel()
+    results = await asyncio.gather(*waiters)
+    return owner, results
+
+  owner, results = asyncio.run(run())
+  assert owner.cancelled()
+  assert results == [{'issue_type': 'pothole'}] * 3
+  assert calls == 2
+
+
+def test_factory_errors_reach_every_waiter():
+  cache = ClassificationCache(max_entries=8, disk_dir=None)
+
+  async def factory():
+    await asyncio.sleep(0.01)
+    raise RuntimeError('upstream down')
+
+  async def run():
+    return await asyncio.gather(*(cache.get_or_compute('k', factory) for _ in range(3)), return_exceptions=True)
+
+  results = asyncio.run(run())
+  assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,65 @@
+import json
+import os
+
+from app.services import department_router
+from app.services.department_rerouting import apply_reroute, reroute_reports
+from app.services.department_router import assign_department
+
+
+def _reports():
+  reports = {}
+  kinds = ['pothole', 'illegal_waste', 'flooding', 'mystery_issue']
+  districts = ['Deira', 'diera', 'Jebel Ali', None, 'Al Barsha']
+  for i in range(60):
+    report = {
+      'id': f'r{i}',
+      'issue_type': kinds[i % 4],
+      'district': districts[i % 5],
+      'priority_score': 95 if i % 7 == 0 else 40 + i % 3,
+    }
+    report['department'] = assign_department(report['issue_type'], report)
+    reports[report['id']] = report
+  return reports
+
+
+def test_reroute_matches_assign_department_and_groups_work(monkeypatch):
+  monkeypatch.setattr(department_router, '_routing_table', None)
+  monkeypatch.setattr(department_router, 'DEPARTMENT_DIRECTORY_PATH', None)
+  reports = _reports()
+
+  result = reroute_reports(reports.values())
+
+  assert result.moves == []
+  assert result.groups < len(reports)
+  for report_id, report in reports.items():
+    assert result.assignment(report_id) == assign_department(report['issue_type'], report)
+  assert apply_reroute(result, reports) == 0
+
+
+def test_reroute_after_department_split_emits_diff_and_applies(monkeypatch, tmp_path):
+  monkeypatch.setattr(department_router, '_routing_table', None)
+  monkeypatch.setattr(department_router, 'DEPARTMENT_DIRECTORY_PATH', None)
+  reports = _reports()
+
+  directory = tmp_path / 'directory.json'
+  departments = list(department_router.DEPARTMENT_DIRECTORY.values()) + [
+    {'id': 'dept-potholes', 'name': 'Pothole Response Unit', 'contact_email': 'potholes@dubai.gov.ae'},
+  ]
+  routes = dict(department_router.DEPARTMENT_ROUTES, pothole=['Pothole Response Unit'])
+  directory.write_text(json.dumps({'departments': departments, 'routes': routes}))
+  os.utime(directory, ns=(1, 1))
+  monkeypatch.setattr(department_router, 'DEPARTMENT_DIRECTORY_PATH', str(directory))
+  department_router.reload_routing_table()
+
+  result = reroute_reports(reports.values())
+
+  moved = {move.report_id for move in result.moves}
+  assert moved == {r['id'] for r in reports.values() if r['issue_type'] == 'pothole'}
+  assert result.summary() == [{'from': 'dept-rta', 'to': 'dept-potholes', 'reports': len(moved)}]
+  assert result.to_dict()['moved'] == len(moved)
+
+  assert apply_reroute(result, reports) == len(moved)
+  assert all(reports[report_id]['department']['primary_department']['id'] == 'dept-potholes' for report_id in moved)
+  escalated = reports['r0']['department']['escalation']
+  assert escalated['reason'] == 'Priority score 95.0 exceeded threshold 80'
+  assert reroute_reports(reports.values()).moves == []
@@ -0,0 +1,114 @@
+from app.services import department_router
+from app.services.department_router import assign_department
+from app.services.district_index import DistrictIndex
+
+SQUARE_HOLE = {
+  'type': 'FeatureCollection',
+  'features': [
+    {
+      'type': 'Feature',
+      'properties': {'name': 'Deira'},
+      'geometry': {
+        'type': 'Polygon',
+        'coordinates': [
+          [[55.30, 25.26], [55.34, 25.26], [55.34, 25.29], [55.30, 25.29], [55.30, 25.26]],
+          [[55.31, 25.27], [55.32, 25.27], [55.32, 25.28], [55.31, 25.28], [55.31, 25.27]],
+        ],
+      },
+    },
+    {
+      'type': 'Feature',
+      'properties': {'district': 'Jebel Ali'},
+      'geometry': {
+        'type': 'MultiPolygon',
+        'coordinates': [
+          [[[55.00, 24.95], [55.10, 24.95], [55.10, 25.05], [55.00, 25.05], [55.00, 24.95]]],
+          [[[55.12, 24.95], [55.14, 24.95], [55.14, 24.97], [55.12, 24.95]]],
+        ],
+      },
+    },
+    {
+      'type': 'Feature',
+      'properties': {'name': 'Jebel Ali Port'},
+      'geometry': {
+        'type': 'Polygon',
+        'coordinates': [[[55.02, 24.98], [55.04, 24.98], [55.04, 25.00], [55.02, 25.00], [55.02, 24.98]]],
+      },
+    },
+    {'type': 'Feature', 'properties': {}, 'geometry': {'type': 'Point', 'coordinates': [55.0, 25.0]}},
+  ],
+}
+
+
+def test_district_index_point_in_polygon():
+  index = DistrictIndex.from_geojson(SQUARE_HOLE)
+
+  assert len(index) == 3
+  assert index.resolve(25.265, 55.335) == 'Deira'
+  assert index.resolve(25.275, 55.315) is None  # inside the hole
+  assert index.resolve(25.0, 55.05) == 'Jebel Ali'
+  assert index.resolve(24.955, 55.135) == 'Jebel Ali'  # second part of the multipolygon
+  assert index.resolve(24.99, 55.03) == 'Jebel Ali Port'  # smallest overlapping district wins
+  assert index.resolve(26.0, 56.0) is None
+  assert DistrictIndex().resolve(25.0, 55.0) is None
+
+
+def test_assign_department_routes_by_coordinates(monkeypatch):
+  index = DistrictIndex.from_geojson(SQUARE_HOLE)
+  monkeypatch.setattr(department_router, 'district_index', index)
+
+  result = assign_department('pothole', {'lat': 25.265, 'lng': 55.335, 'district': 'somewhere else'})
+  assert result['district'] == 'Deira'
+  assert [d['name'] for d in result['backup_departments']] == ['Drainage & Irrigation']
+
+  # Outside every polygon the free-text district (with its common misspelling) still routes.
+  fallback = assign_department('pothole', {'location_lat': 10.0, 'location_lng': 10.0, 'district': 'Diera'})
+  assert fallback['district'] == 'Diera'
+  assert fallback['notes'] == 'District specialist added for Diera.'
+  assert [d['name'] for d in fallback['backup_departments']] == ['Drainage & Irrigation']
+
+
+def test_routing_table_hot_swaps_when_directory_file_changes(monkeypatch, tmp_path):
+  import json
+  import os
+
+  directory = tmp_path / 'directory.json'
+  directory.write_text(json.dumps({
+    'departments': [
+      {'id': 'dept-roads-north', 'name': 'Roads North', 'contact_email': 'north@example.com'},
+      {'id': 'dept-roads-south', 'name': 'Roads South', 'contact_email': 'south@example.com'},
+    ],
+    'routes': {'pothole': ['Roads North']},
+    'district_specialists': {'Deira': ['Roads South']},
+  }))
+  monkeypatch.setattr(department_router, 'DEPARTMENT_DIRECTORY_PATH', str(directory))
+  monkeypatch.setattr(department_router, 'DEPARTMENT_DIRECTORY_POLL_SECONDS', 0)
+  monkeypatch.setattr(department_router, '_next_directory_check', 0.0)
+  monkeypatch.setattr(department_router, '_routing_table', None)
+
+  first = assign_department('pothole', {'district': 'diera'})
+  assert first['primary_department']['id'] == 'dept-roads-north'
+  assert [d['id'] for d in first['backup_departments']] == ['dept-roads-south']
+  first['primary_department']['id'] = 'mutated'
+  assert assign_department('pothole', {})['primary_department']['id'] == 'dept-roads-north'
+  version = department_router.current_routing_table().version
+
+  # The directory is split: potholes move to the southern team.
+  directory.write_text(json.dumps({
+    'departments': [{'id': 'dept-roads-south', 'name': 'Roads South', 'contact_email': 'south@example.com'}],
+    'routes': {'pothole': ['Roads South', 'Roads North']},
+  }))
+  os.utime(directory, ns=(1, 1))
+  moved = assign_department('pothole', {'district': 'deira'})
+  assert department_router.current_routing_table().version != version
+  assert moved['primary_department']['id'] == 'dept-roads-south'
+  assert moved['backup_departments'] == []
+
+  # A broken file keeps the last good table.
+  directory.write_text('{not json')
+  os.utime(directory, ns=(2, 2))
+  assert assign_department('pothole', {})['primary_department']['id'] == 'dept-roads-south'
+
+  monkeypatch.setattr(department_router, '_routing_table', None)
+  monkeypatch.setattr(department_router, 'DEPARTMENT_DIRECTORY_PATH', None)
+  assert assign_department('pothole', {})['primary_department']['id'] == 'dept-rta'
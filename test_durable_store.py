@@ -0,0 +1,221 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from app.services.durable_store import DurableStore, StoreLogError
+
+
+def _open(tmp_path, **kwargs):
+  return DurableStore('reports', tmp_path, fsync=False, **kwargs)
+
+
+def test_writes_survive_a_restart(tmp_path):
+  store = _open(tmp_path)
+  store['r1'] = {'id': 'r1', 'status': 'pending'}
+  store['r2'] = {'id': 'r2', 'status': 'pending'}
+  store['r1'] = {'id': 'r1', 'status': 'resolved'}
+  del store['r2']
+  store.close()
+
+  restored = _open(tmp_path)
+  assert dict(restored) == {'r1': {'id': 'r1', 'status': 'resolved'}}
+  assert restored.replayed_records == 4
+  with pytest.raises(KeyError):
+    del restored['r2']
+
+
+def test_snapshots_bound_replay_and_drop_covered_segments(tmp_path):
+  store = _open(tmp_path, snapshot_records=10**9)
+  for index in range(50):
+    store[f'r{index}'] = {'n': index}
+  assert store.snapshot() == 50
+  for index in range(45, 60):
+    store[f'r{index}'] = {'n': index * 10}
+  store.close()
+
+  restored = _open(tmp_path)
+  assert len(restored) == 60
+  assert restored['r10'] == {'n': 10} and restored['r47'] == {'n': 470}
+  assert restored.replayed_records == 15
+  assert restored.stats()['log_segments'] == 1
+
+
+def test_background_snapshot_after_threshold(tmp_path):
+  store = _open(tmp_path, snapshot_records=20)
+  for index in range(70):
+    store[f'r{index}'] = index
+  store.close()
+
+  restored = _open(tmp_path)
+  assert dict(restored) == {f'r{index}': index for index in range(70)}
+  assert restored.stats()['snapshot_seq'] >= 20
+  assert restored.replayed_records < 70
+
+
+def test_torn_tail_is_ignored_and_later_writes_go_to_a_new_segment(tmp_path):
+  store = _open(tmp_path)
+  store['r1'] = 'a'
+  store['r2'] = 'b'
+  store.close()
+  segment = next(tmp_path.glob('reports.*.log'))
+  with segment.open('a', encoding='utf-8') as handle:
+    handle.write('deadbeef 3 {"op":"put","key":"r3"')
+
+  restored = _open(tmp_path)
+  assert dict(restored) == {'r1': 'a', 'r2': 'b'}
+  restored['r3'] = 'c'
+  restored.close()
+  assert dict(_open(tmp_path)) == {'r1': 'a', 'r2': 'b', 'r3': 'c'}
+
+
+def test_torn_first_record_of_a_segment_does_not_swallow_later_writes(tmp_path):
+  store = _open(tmp_path, snapshot_records=10**9)
+  store['r1'] = 'a'
+  store['r2'] = 'b'
+  store.snapshot()
+  store.close()
+  # A crash while writing the first record of the next segment.
+  (tmp_path / f'reports.{3:020d}.log').write_text('deadbeef 3 {"op":"put"', encoding='utf-8')
+
+  restored = _open(tmp_path)
+  assert dict(restored) == {'r1': 'a', 'r2': 'b'}
+  restored['r3'] = 'c'
+  restored['r4'] = 'd'
+  restored.close()
+
+  assert dict(_open(tmp_path)) == {'r1': 'a', 'r2': 'b', 'r3': 'c', 'r4': 'd'}
+
+
+def test_concurrent_writers_share_flushes(tmp_path):
+  store = DurableStore('reports', tmp_path, fsync=True)
+
+  def write(worker):
+    for index in range(50):
+      store[f'w{worker}-{index}'] = {'worker': worker, 'index': index}
+
+  threads = [threading.Thread(target=write, args=(worker,)) for worker in range(8)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  stats = store.stats()
+  store.close()
+
+  assert stats['records_written'] == 400
+  assert stats['flushes'] <= 400
+  assert len(_open(tmp_path)) == 400
+
+
+def test_failed_log_refuses_writes(tmp_path, monkeypatch):
+  store = _open(tmp_path)
+  store['r1'] = 'a'
+  monkeypatch.setattr(store._log._handle, 'write', lambda _: (_ for _ in ()).throw(OSError('disk full')))
+
+  with pytest.raises(StoreLogError):
+    store['r2'] = 'b'
+  with pytest.raises(StoreLogError):
+    store['r3'] = 'c'
+  assert dict(store) == {'r1': 'a'}
+
+
+def test_values_read_back_the_same_from_snapshot_and_log(tmp_path):
+  store = _open(tmp_path, snapshot_records=10**9)
+  store['snapshotted'] = {'tags': ('a', 'b'), 'score': 1.5}
+  store.snapshot()
+  store['logged'] = {'tags': ('a', 'b'), 'score': 1.5}
+  with pytest.raises(TypeError):
+    store['bad'] = {'created_at': datetime(2024, 1, 1)}
+  store.close()
+
+  restored = _open(tmp_path)
+  assert restored['snapshotted'] == restored['logged'] == {'tags': ['a', 'b'], 'score': 1.5}
+  assert 'bad' not in restored and restored.replayed_records == 1
+
+
+def test_write_during_segment_cleanup_is_kept(tmp_path, monkeypatch):
+  store = _open(tmp_path, snapshot_records=10**9)
+  store['x'] = 1
+  log = store._log
+  listed = log.segments
+  calls = []
+
+  def segments():
+    # A write lands between the snapshot and its segment cleanup.
+    if not calls:
+      calls.append(1)
+      store['y'] = 2
+    return listed()
+
+  monkeypatch.setattr(log, 'segments', segments)
+  store.snapshot()
+  monkeypatch.undo()
+  store.close()
+
+  assert dict(_open(tmp_path)) == {'x': 1, 'y': 2}
+
+
+def test_acknowledged_writes_survive_background_snapshots(tmp_path):
+  store = _open(tmp_path, snapshot_records=25)
+  acknowledged = []
+
+  def write(worker):
+    for index in range(200):
+      store[f'w{worker}-{index}'] = index
+      acknowledged.append(f'w{worker}-{index}')
+
+  threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+  for thread in threads:
+    thread.start()
+  for _ in range(20):
+    store.snapshot()
+  for thread in threads:
+    thread.join()
+  store.close()
+
+  assert set(_open(tmp_path)) == set(acknowledged)
+
+
+def test_async_writes_wait_off_the_event_loop(tmp_path, monkeypatch):
+  store = _open(tmp_path)
+  real_wait = store._log.wait_durable
+
+  def slow_wait(seq):
+    time.sleep(0.05)
+    real_wait(seq)
+
+  monkeypatch.setattr(store._log, 'wait_durable', slow_wait)
+  ticks = 0
+
+  async def heartbeat():
+    nonlocal ticks
+    while True:
+      ticks += 1
+      await asyncio.sleep(0.005)
+
+  async def run():
+    beat = asyncio.create_task(heartbeat())
+    await store.aset('r1', {'n': 1})
+    await store.aset('r2', {'n': 2})
+    await store.adelete('r1')
+    beat.cancel()
+
+  asyncio.run(run())
+  assert dict(store) == {'r2': {'n': 2}}
+  assert ticks > 5
+
+
+def test_leftover_snapshot_temp_files_are_removed_on_load(tmp_path):
+  store = _open(tmp_path)
+  store['r1'] = {'n': 1}
+  store.snapshot()
+  store.close()
+  (tmp_path / '.reports.snapshot.tmp-crashed').write_text('{"seq": 9')
+  (tmp_path / '.comments.snapshot.tmp-in-progress').write_text('{"seq": 3')
+
+  restored = _open(tmp_path)
+  assert dict(restored) == {'r1': {'n': 1}}
+  assert not (tmp_path / '.reports.snapshot.tmp-crashed').exists()
+  assert (tmp_path / '.comments.snapshot.tmp-in-progress').exists()
@@ -0,0 +1,99 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services.image_pipeline import ImagePipeline
+
+
+class CountingUpload:
+  def __init__(self, content):
+    self.stream = io.BytesIO(content)
+    self.headers = {'x-photo-timestamp': '2024-01-01T10:00:00Z'}
+    self.bytes_read = 0
+
+  async def read(self, size=-1):
+    chunk = self.stream.read(size)
+    self.bytes_read += len(chunk)
+    return chunk
+
+
+def _jpeg(size=(2400, 1600), exif=None):
+  buffer = io.BytesIO()
+  image = Image.new('RGB', size, (140, 120, 100))
+  for x in range(0, size[0], 40):
+    image.paste((20, 20, 20), (x, 0, x + 10, size[1]))
+  image.save(buffer, format='JPEG', exif=exif or Image.Exif())
+  return buffer.getvalue()
+
+
+def test_pipeline_decodes_once_and_produces_all_outputs():
+  content = _jpeg()
+  upload = CountingUpload(content)
+  result = asyncio.run(ImagePipeline().process(upload))
+  assert upload.bytes_read == len(content)
+  assert (result.width, result.height) == (1920, 1280)
+  assert Image.open(io.BytesIO(result.optimized)).format == 'WEBP'
+  assert sorted(result.thumbnails) == [200, 500]
+  assert Image.open(io.BytesIO(result.thumbnails[200])).width == 200
+  assert max(Image.open(io.BytesIO(result.model_rendition)).size) == 768
+  assert result.metadata['capture_timestamp'] == '2024-01-01T10:00:00Z'
+  assert 'sharpness_score' in result.metadata
+  assert {'decode', 'resize', 'metadata', 'encode', 'thumbnails'} <= set(result.timings_ms)
+
+
+def test_pipeline_reads_exif():
+  exif = Image.Exif()
+  exif[0x010F] = 'CityCam'
+  gps = exif.get_ifd(0x8825)
+  gps[1], gps[2] = 'N', (25.0, 12.0, 0.0)
+  gps[3], gps[4] = 'E', (55.0, 16.0, 12.0)
+  result = ImagePipeline(model_rendition_side=None).run(_jpeg((800, 600), exif))
+  assert result.exif['make'] == 'CityCam'
+  assert round(result.exif['gps_lat'], 3) == 25.2
+  assert round(result.exif['gps_lng'], 3) == 55.27
+  assert result.model_rendition is None
+
+
+def test_upload_over_limit_is_rejected(monkeypatch):
+  from fastapi import HTTPException
+
+  from app.services import image_processor
+
+  monkeypatch.setattr(image_processor, 'UPLOAD_CHUNK_BYTES', 1024)
+
+  async def run():
+    async with image_processor.spooled_upload(CountingUpload(b'x' * 4096), max_bytes=2048):
+      pass
+
+  with pytest.raises(HTTPException) as excinfo:
+    asyncio.run(run())
+  assert excinfo.value.status_code == 413
+
+
+def test_large_jpeg_is_decoded_at_reduced_scale():
+  from app.services.image_processor import open_downscaled
+
+  image = open_downscaled(_jpeg((7680, 5120)), max_width=1920)
+  image.load()
+  assert image.size == (1920, 1280)
+
+
+def test_face_blur_maps_downscaled_boxes_to_full_resolution(monkeypatch):
+  from app.services import image_processor
+
+  class FakeDetector:
+    def detectMultiScale(self, gray, scale_factor, min_neighbors):
+      # 640px-wide detection frame for a 1920px image: scale factor 3.
+      assert gray.shape[1] == image_processor.FACE_DETECT_WIDTH
+      return [(100, 100, 50, 50)]
+
+  monkeypatch.setattr(image_processor, '_face_detector', lambda: FakeDetector())
+  result = ImagePipeline(blur_faces=True, model_rendition_side=None, thumbnail_widths=()).run(_jpeg())
+  assert result.faces_blurred == 1
+  assert 'face_blur' in result.timings_ms
+
+  boxes = image_processor.detect_faces(np.zeros((1280, 1920), dtype=np.uint8))
+  assert boxes == [(300, 300, 150, 150)]
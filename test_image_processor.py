@@ -0,0 +1,74 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from app.services import image_processor
+
+
+def _noisy_image(size=(320, 240), seed=0):
+  rng = np.random.default_rng(seed)
+  return Image.fromarray(rng.integers(0, 255, size=(size[1], size[0], 3), dtype=np.uint8))
+
+
+def _linear_walk(image):
+  quality = 95
+  while True:
+    buffer = io.BytesIO()
+    image.save(buffer, format='WEBP', quality=quality, method=6)
+    if buffer.tell() <= image_processor.TARGET_SIZE_BYTES or quality <= 40:
+      return buffer.getvalue()
+    quality -= 5
+
+
+@pytest.mark.parametrize('target', [10 * 1024, 40 * 1024, 80 * 1024, 10 ** 7])
+def test_quality_search_matches_linear_walk_with_fewer_encodes(monkeypatch, target):
+  monkeypatch.setattr(image_processor, 'TARGET_SIZE_BYTES', target)
+  image = _noisy_image()
+  encoded, encodes = image_processor.encode_webp_counted(image)
+  assert encoded == _linear_walk(image)
+  assert encodes <= 5
+
+
+def test_job_queue_rejects_when_full(monkeypatch):
+  monkeypatch.setattr(image_processor, 'IMAGE_ENCODE_WORKERS', 0)
+  monkeypatch.setattr(image_processor, 'IMAGE_ENCODE_MAX_QUEUE', 0)
+  monkeypatch.setattr(image_processor, '_encode_depth', 1)
+  with pytest.raises(HTTPException) as excinfo:
+    asyncio.run(image_processor.run_image_job(image_processor.optimize_bytes, b''))
+  assert excinfo.value.status_code == 503
+
+
+def test_invalid_image_maps_to_400(monkeypatch):
+  monkeypatch.setattr(image_processor, 'IMAGE_ENCODE_WORKERS', 0)
+  with pytest.raises(HTTPException) as excinfo:
+    asyncio.run(image_processor.run_image_job(image_processor.optimize_bytes, b'not-an-image'))
+  assert excinfo.value.status_code == 400
+
+
+def test_optimize_bytes_counts_encodes(monkeypatch):
+  monkeypatch.setattr(image_processor, 'IMAGE_ENCODE_WORKERS', 0)
+  buffer = io.BytesIO()
+  _noisy_image((64, 64)).save(buffer, format='PNG')
+  optimized, _ = asyncio.run(image_processor.run_image_job(image_processor.optimize_bytes, buffer.getvalue()))
+  assert Image.open(io.BytesIO(optimized)).format == 'WEBP'
+  assert image_processor.encode_stats()['images'] >= 1
+
+
+def test_model_rendition_applies_exif_orientation():
+  # Stored landscape, red on top; orientation 6 displays it rotated 90 degrees clockwise.
+  pixels = np.zeros((200, 400, 3), dtype=np.uint8)
+  pixels[:100] = (255, 0, 0)
+  pixels[100:] = (0, 0, 255)
+  exif = Image.Exif()
+  exif[0x0112] = 6
+  buffer = io.BytesIO()
+  Image.fromarray(pixels).save(buffer, format='JPEG', exif=exif)
+
+  rendition = Image.open(io.BytesIO(image_processor.make_model_rendition(buffer.getvalue(), max_side=200)))
+  assert rendition.size == (100, 200)
+  red, _, blue = rendition.getpixel((90, 100))
+  assert red > 200 and blue < 50
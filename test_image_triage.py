@@ -0,0 +1,70 @@
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services import image_triage
+
+
+def _encode(image):
+  ok, buffer = cv2.imencode('.jpg', image)
+  assert ok
+  return buffer.tobytes()
+
+
+def _street_scene():
+  rng = np.random.default_rng(0)
+  image = rng.integers(40, 220, size=(480, 640, 3), dtype=np.uint8)
+  cv2.rectangle(image, (100, 100), (400, 300), (30, 30, 30), -1)
+  return image
+
+
+@pytest.fixture(autouse=True)
+def inline_triage(monkeypatch):
+  monkeypatch.setattr(image_triage, 'TRIAGE_WORKERS', 0)
+  monkeypatch.setattr(image_triage, 'stats', image_triage.TriageStats())
+
+
+def test_plausible_image_is_forwarded():
+  result = image_triage.triage_image(_encode(_street_scene()))
+  assert result.forward
+  assert result.features['width'] == 640
+
+
+def test_dark_and_flat_images_are_rejected():
+  dark = np.full((480, 640, 3), 5, dtype=np.uint8)
+  assert 'too dark' in image_triage.triage_image(_encode(dark)).reason
+  grey = np.full((480, 640, 3), 128, dtype=np.uint8)
+  assert 'no discernible scene' in image_triage.triage_image(_encode(grey)).reason
+
+
+def test_undecodable_images_are_forwarded():
+  result = image_triage.triage_image(b'not-an-image')
+  assert result.forward
+  assert result.reason is None
+
+
+def test_async_triage_counts_saved_calls():
+  dark = np.full((480, 640, 3), 5, dtype=np.uint8)
+
+  async def run():
+    await image_triage.triage_image_async(_encode(dark))
+    await image_triage.triage_image_async(_encode(_street_scene()))
+
+  asyncio.run(run())
+  stats = image_triage.stats.to_dict()
+  assert stats['triaged'] == 2
+  assert stats['upstream_calls_saved'] == 1
+  assert stats['forwarded'] == 1
+
+
+def test_pool_failures_forward_the_image(monkeypatch):
+  monkeypatch.setattr(image_triage, 'TRIAGE_WORKERS', 1)
+  monkeypatch.setattr(image_triage, '_checks', image_triage._checks + (lambda features: 'never sent',))
+  dark = np.full((480, 640, 3), 5, dtype=np.uint8)
+
+  result = asyncio.run(image_triage.triage_image_async(_encode(dark)))
+  assert result.forward
+  assert image_triage._pool is None
+  assert image_triage.stats.to_dict()['failures'] == 1
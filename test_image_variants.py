@@ -0,0 +1,131 @@
+import asyncio
+import io
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.api import image_routes
+from app.services import image_processor, image_variants
+from app.services.blob_store import LocalBlobStore
+
+
+@pytest.fixture(autouse=True)
+def inline_image_jobs(monkeypatch):
+  monkeypatch.setattr(image_processor, 'IMAGE_ENCODE_WORKERS', 0)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+  blob_store = LocalBlobStore(tmp_path / 'blobs')
+  monkeypatch.setattr(image_routes, 'blob_store', blob_store)
+  return blob_store
+
+
+@pytest.fixture
+def client(store):
+  app = FastAPI()
+  app.include_router(image_routes.router)
+  return TestClient(app)
+
+
+def _jpeg(size, color):
+  buffer = io.BytesIO()
+  Image.new('RGB', size, color).save(buffer, format='JPEG')
+  return buffer.getvalue()
+
+
+def test_variant_generated_once_and_served_from_cache(store, client, tmp_path, monkeypatch):
+  cache = image_variants.VariantCache(tmp_path / 'variants', store=store)
+  monkeypatch.setattr(image_routes, 'variant_cache', cache)
+  blob_id = store.put(_jpeg((1600, 1200), (10, 120, 200)), 'image/jpeg')
+
+  first = client.get(f'/images/{blob_id}?w=180&fmt=webp')
+  assert first.status_code == 200
+  assert first.headers['content-type'] == 'image/webp'
+  assert Image.open(io.BytesIO(first.content)).size == (200, 150)
+  second = client.get(f'/images/{blob_id}?w=200&fmt=webp')
+  assert second.content == first.content
+  assert cache.stats()['misses'] == 1
+  assert cache.stats()['hits'] == 1
+  assert client.get(f'/images/{blob_id}?w=200&fmt=tiff').status_code == 400
+
+
+def test_variant_cache_coalesces_and_evicts(store, tmp_path, monkeypatch):
+  renders = 0
+  real_render = image_variants.render_variant
+
+  def counting_render(*args):
+    nonlocal renders
+    renders += 1
+    return real_render(*args)
+
+  monkeypatch.setattr(image_variants, 'render_variant', counting_render)
+  blob_id = store.put(_jpeg((800, 600), (200, 20, 20)), 'image/jpeg')
+  cache = image_variants.VariantCache(tmp_path / 'variants', max_bytes=1, store=store)
+
+  async def run():
+    await asyncio.gather(*(cache.get_variant(blob_id, 200, 'webp') for _ in range(5)))
+    await cache.get_variant(blob_id, 500, 'webp')
+
+  asyncio.run(run())
+  assert renders == 2
+  stats = cache.stats()
+  assert stats['coalesced'] == 4
+  assert stats['entries'] == 1
+  assert stats['evictions'] == 1
+
+
+def test_corrupt_source_variant_maps_to_400(store, client, tmp_path, monkeypatch):
+  monkeypatch.setattr(image_routes, 'variant_cache', image_variants.VariantCache(tmp_path / 'variants', store=store))
+  blob_id = store.put(b'\xff\xd8\xff\xe0 truncated jpeg', 'image/jpeg')
+
+  assert client.get(f'/images/{blob_id}?w=200&fmt=webp').status_code == 400
+
+
+def test_variants_being_served_are_not_evicted(store, tmp_path):
+  blob_id = store.put(_jpeg((800, 600), (20, 200, 20)), 'image/jpeg')
+  cache = image_variants.VariantCache(tmp_path / 'variants', max_bytes=1, store=store)
+
+  async def run():
+    async with cache.serve_variant(blob_id, 200, 'webp') as (served, _):
+      await cache.get_variant(blob_id, 500, 'webp')
+      assert served.read_bytes()
+    await cache.get_variant(blob_id, 800, 'webp')
+    return served
+
+  served = asyncio.run(run())
+  assert not served.exists()
+  assert cache.stats()['entries'] == 1
+  assert not list((tmp_path / 'variants').rglob('.evicted-*'))
+
+
+def test_cancelled_render_is_retried_by_a_waiter(store, tmp_path, monkeypatch):
+  renders = 0
+  real_render = image_variants.render_variant
+
+  def slow_render(*args):
+    nonlocal renders
+    renders += 1
+    time.sleep(0.05)
+    return real_render(*args)
+
+  monkeypatch.setattr(image_variants, 'render_variant', slow_render)
+  blob_id = store.put(_jpeg((800, 600), (20, 20, 200)), 'image/jpeg')
+  cache = image_variants.VariantCache(tmp_path / 'variants', store=store)
+
+  async def run():
+    owner = asyncio.create_task(cache.get_variant(blob_id, 200, 'webp'))
+    await asyncio.sleep(0.01)
+    waiters = [asyncio.create_task(cache.get_variant(blob_id, 200, 'webp')) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    owner.cancel()
+    return owner, await asyncio.gather(*waiters)
+
+  owner, results = asyncio.run(run())
+  assert owner.cancelled()
+  assert len({path for path, _ in results}) == 1
+  assert results[0][0].exists()
+  assert renders == 2
@@ -0,0 +1,81 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import leaderboard as leaderboard_module, sorted_index
+from app.services.leaderboard import Leaderboard
+from app.services.profile_service import ProfileAccumulator, ReportEvent
+
+
+START = datetime(2025, 3, 1)
+
+
+class _Clock:
+  def __init__(self):
+    self.now = START
+
+  def __call__(self):
+    return self.now
+
+
+def _expected(awards, now, window):
+  scores = {}
+  for user_id, points, occurred_at in awards:
+    if window is None or occurred_at + window > now:
+      scores[user_id] = scores.get(user_id, 0) + points
+  ordered = sorted(((score, user) for user, score in scores.items() if score), key=lambda item: (-item[0], item[1]))
+  return [(1 + sum(1 for other, _ in ordered if other > score), user, score) for score, user in ordered]
+
+
+def test_windows_match_brute_force_as_awards_expire(monkeypatch):
+  monkeypatch.setattr(sorted_index, "BUCKET_LOAD", 4)
+  rng = random.Random(3)
+  clock = _Clock()
+  board = Leaderboard(clock=clock)
+  awards = []
+
+  for step in range(600):
+    clock.now += timedelta(hours=rng.randint(0, 12))
+    user_id = f"user-{rng.randint(0, 60)}"
+    points = rng.choice([10, 25, 50, 100])
+    occurred_at = clock.now - timedelta(days=rng.choice([0, 0, 0, 3, 10]))
+    board.record_points(user_id, points, occurred_at)
+    awards.append((user_id, points, occurred_at))
+
+    if step % 50 == 0:
+      for name, window in leaderboard_module.LEADERBOARD_WINDOWS.items():
+        expected = _expected(awards, clock.now, window)
+        entries = board.page(name, 0, 1000)
+        assert [(entry.rank, entry.user_id, entry.score) for entry in entries] == expected
+        for rank, user_id, score in expected[:10]:
+          assert board.rank(user_id, name).rank == rank
+        assert board.page(name, 7, 5) == entries[7:12]
+
+  clock.now += timedelta(days=31)
+  assert board.page("week") == [] and board.page("month") == []
+  assert board.size("all_time") == len({user_id for user_id, _, _ in awards})
+
+
+def test_ties_share_a_rank_and_unknown_users_have_none():
+  board = Leaderboard(clock=_Clock())
+  for user_id, points in (("amy", 50), ("bob", 50), ("cy", 10)):
+    board.record_points(user_id, points, START)
+
+  assert [(entry.rank, entry.user_id) for entry in board.top("week")] == [(1, "amy"), (1, "bob"), (3, "cy")]
+  assert board.rank("cy", "month").rank == 3
+  assert board.rank("dee") is None
+  with pytest.raises(ValueError):
+    board.page("decade")
+
+
+def test_all_time_board_tracks_reputation_with_streak_bonus():
+  board = Leaderboard(clock=_Clock())
+  accumulator = ProfileAccumulator()
+  for day in range(6):
+    event = ReportEvent(f"r{day}", "report_submitted", START - timedelta(days=5 - day))
+    board.record_points("amy", accumulator.apply_event(event), event.occurred_at)
+  board.record_event("bob", ReportEvent("x", "report_resolved", START))
+
+  assert board.rank("amy").score == accumulator.reputation == 210
+  assert board.rank("bob").score == 50
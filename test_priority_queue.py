@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+from app.services.priority_queue import LivePriorityQueue
+from app.services.priority_scorer import PriorityBreakdown
+
+
+def _breakdown(score):
+  return PriorityBreakdown(
+    severity=5, safety_risk_factor=0, affected_population_factor=0,
+    environmental_impact_factor=3, recurrence_factor=0, score=score,
+  )
+
+
+def test_top_orders_by_score_and_handles_updates_and_removals():
+  queue = LivePriorityQueue(rescore_interval=None)
+  for i, score in enumerate([10, 90, 50, 70, 30]):
+    queue.push(f'r{i}', _breakdown(score))
+
+  assert [item.report_id for item in queue.top(3)] == ['r1', 'r3', 'r2']
+
+  queue.push('r0', _breakdown(95))
+  assert queue.remove('r1')
+  assert not queue.remove('r1')
+  assert [item.report_id for item in queue.top(3)] == ['r0', 'r3', 'r2']
+  assert len(queue) == 4
+
+  # A re-pushed report must not resurrect its older heap entries.
+  queue.push('r1', _breakdown(5))
+  assert [item.report_id for item in queue.top(10)] == ['r0', 'r3', 'r2', 'r4', 'r1']
+
+
+def test_filters_by_department_and_district():
+  queue = LivePriorityQueue(rescore_interval=None)
+  queue.push('a', _breakdown(80), department='Roads & Transport Authority', district='Dubai Marina')
+  queue.push('b', _breakdown(60), department='Roads & Transport Authority', district='Jebel Ali')
+  queue.push('c', _breakdown(90), department='Parks & Recreation', district='Dubai Marina')
+
+  assert [i.report_id for i in queue.top(5, department='roads & transport authority')] == ['a', 'b']
+  assert [i.report_id for i in queue.top(5, district='dubai marina')] == ['c', 'a']
+  assert [i.report_id for i in queue.top(5, department='Roads & Transport Authority', district='Jebel Ali')] == ['b']
+  assert queue.top(5, department='Unknown') == []
+
+  # Moving a report between departments updates both filtered views.
+  queue.push('b', _breakdown(60), department='Parks & Recreation', district='Jebel Ali')
+  assert [i.report_id for i in queue.top(5, department='Roads & Transport Authority')] == ['a']
+  assert [i.report_id for i in queue.top(5, department='Parks & Recreation')] == ['c', 'b']
+
+
+def test_stale_reports_are_rescored_lazily_on_read():
+  calls = []
+
+  def rescore(item):
+    calls.append(item.report_id)
+    return _breakdown(item.score + 50)
+
+  now = [datetime(2024, 1, 1, tzinfo=timezone.utc)]
+  queue = LivePriorityQueue(rescore=rescore, rescore_interval=timedelta(hours=1), clock=lambda: now[0])
+  queue.push('a', _breakdown(40), inputs={'issue_type': 'pothole'})
+  queue.push('b', _breakdown(30), inputs={'issue_type': 'pothole'})
+  queue.push('c', _breakdown(35))
+
+  assert queue.mark_stale(['b', 'missing']) == 1
+  assert calls == []
+  assert [i.report_id for i in queue.top(3)] == ['b', 'a', 'c']
+  assert calls == ['b']
+
+  now[0] += timedelta(hours=2)
+  assert [i.report_id for i in queue.top(1)] == ['b']
+  assert sorted(calls) == ['a', 'b', 'b']
+  assert queue.get('a').score == 90
+
+
+def test_heaps_are_compacted_after_churn():
+  queue = LivePriorityQueue(rescore_interval=None)
+  for round_ in range(50):
+    for i in range(20):
+      queue.push(f'r{i}', _breakdown(round_ + i), department='Parks & Recreation')
+  for i in range(15):
+    queue.remove(f'r{i}')
+
+  stats = queue.stats()
+  assert stats['open_reports'] == 5
+  assert stats['heap_entries'] <= 2 * (64 + 1) * 2
+  assert [i.report_id for i in queue.top(2, department='Parks & Recreation')] == ['r19', 'r18']
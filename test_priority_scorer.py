@@ -1,6 +1,24 @@
+from datetime import datetime, timedelta, timezone
+
+import io
+import json
+
+import pytest
+
 from app.services.priority_scorer import calculate_priority_score
 
 
+@pytest.fixture(autouse=True)
+def isolated_priority_store(monkeypatch, tmp_path):
+  from app.services import priority_scorer
+  from app.services.priority_store import PriorityStore
+
+  store = PriorityStore(tmp_path / 'priorities.jsonl')
+  monkeypatch.setattr(priority_scorer, 'priority_store', store)
+  yield store
+  store.close()
+
+
 def test_priority_weights():
   breakdown = calculate_priority_score(
     severity=9,
@@ -17,22 +35,15 @@ def test_priority_weights():
 
 def test_recurrence_factor(monkeypatch):
   from app.services import priority_scorer
+  from app.services.spatial_index import SpatialTemporalIndex
 
-  def fake_get_supabase_client():
-    class Dummy:
-      def table(self, name):
-        return self
-      def select(self, *args, **kwargs):
-        return self
-      def eq(self, *args, **kwargs):
-        return self
-      def gte(self, *args, **kwargs):
-        return self
-      def execute(self):
-        return type('Result', (), {'data': [{'location_lat': 25.2, 'location_lng': 55.27}]})
-    return Dummy()
-
-  monkeypatch.setattr(priority_scorer, '_get_supabase_client', fake_get_supabase_client)
+  index = SpatialTemporalIndex(
+    cell_meters=priority_scorer.MAX_DISTANCE_METERS,
+    lookback=timedelta(days=priority_scorer.DAYS_LOOKBACK),
+    distance_fn=priority_scorer._haversine_meters,
+  )
+  monkeypatch.setattr(priority_scorer, 'recurrence_index', index)
+  priority_scorer.record_report('earlier', 'pothole', 25.2, 55.27)
 
   breakdown = calculate_priority_score(
     severity=5,
@@ -43,3 +54,238 @@ def test_recurrence_factor(monkeypatch):
     location_lng=55.27,
   )
   assert breakdown.recurrence_factor in {3, 5}
+
+
+def test_recurrence_index_radius_type_and_expiry():
+  from app.services.priority_scorer import _haversine_meters
+  from app.services.spatial_index import SpatialTemporalIndex
+
+  now = datetime(2024, 6, 1, tzinfo=timezone.utc)
+  index = SpatialTemporalIndex(cell_meters=50, lookback=timedelta(days=30), distance_fn=_haversine_meters)
+  index.add('near', 'pothole', 25.2002, 55.27, now - timedelta(days=1))  # ~22m north
+  index.add('far', 'pothole', 25.2010, 55.27, now - timedelta(days=1))  # ~111m north
+  index.add('other-type', 'flooding', 25.2, 55.27, now - timedelta(days=1))
+  index.add('stale', 'pothole', 25.2, 55.27, now - timedelta(days=31))
+
+  assert index.count_neighbors('pothole', 25.2, 55.27, 50, now=now) == 1
+  # A query as of a later time filters its window but never expires entries.
+  assert index.count_neighbors('pothole', 25.2, 55.27, 50, now=now + timedelta(days=60)) == 0
+  assert len(index) == 4
+  assert index.count_neighbors('pothole', 25.2, 55.27, 50, now=now, exclude_report_id='near') == 0
+
+  index.add('near', 'pothole', 25.3, 55.27, now)  # moved away
+  assert index.count_neighbors('pothole', 25.2, 55.27, 50, now=now) == 0
+  assert index.prune(now + timedelta(days=40)) == 4
+  assert len(index) == 0
+
+
+def test_scoring_does_not_record_the_report(monkeypatch):
+  from app.services import priority_scorer
+  from app.services.spatial_index import SpatialTemporalIndex
+
+  index = SpatialTemporalIndex(cell_meters=50, lookback=timedelta(days=30), distance_fn=priority_scorer._haversine_meters)
+  monkeypatch.setattr(priority_scorer, 'recurrence_index', index)
+  kwargs = dict(
+    severity=5,
+    safety_risk=False,
+    estimated_affected_people=10,
+    issue_type='pothole',
+    location_lat=25.2,
+    location_lng=55.27,
+  )
+
+  assert calculate_priority_score(report_id='a', **kwargs).recurrence_factor == 0
+  assert calculate_priority_score(report_id='b', **kwargs).recurrence_factor == 0
+  assert len(index) == 0
+
+  priority_scorer.record_report('a', 'pothole', 25.2, 55.27)
+  assert calculate_priority_score(report_id='a', **kwargs).recurrence_factor == 0
+  assert calculate_priority_score(report_id='b', **kwargs).recurrence_factor == 3
+  assert len(index) == 1
+
+
+def test_recurrence_ignores_reports_after_now_and_prunes_on_add():
+  import numpy as np
+
+  from app.services.priority_scorer import _haversine_meters
+  from app.services.spatial_index import SpatialTemporalIndex
+
+  now = datetime.now(timezone.utc)
+  index = SpatialTemporalIndex(cell_meters=50, lookback=timedelta(days=30), distance_fn=_haversine_meters)
+  index.add('past', 'pothole', 25.2, 55.27, now - timedelta(days=2))
+  index.add('later', 'pothole', 25.2, 55.27, now)
+  as_of = now - timedelta(days=1)
+  assert index.neighbors('pothole', 25.2, 55.27, 50, now=as_of) == ['past']
+  assert index.count_neighbors_many(['pothole'], np.array([0]), np.array([25.2]), np.array([55.27]), 50, now=as_of).tolist() == [1]
+
+  pruning = SpatialTemporalIndex(
+    cell_meters=50, lookback=timedelta(days=30), distance_fn=_haversine_meters, prune_interval=timedelta(0)
+  )
+  pruning.add('stale', 'flooding', 24.0, 54.0, now - timedelta(days=31))
+  pruning.add('fresh', 'pothole', 25.2, 55.27, now)
+  assert len(pruning) == 1
+
+
+def test_batch_scores_match_scalar(monkeypatch):
+  import numpy as np
+  from app.services import priority_scorer
+  from app.services.priority_scorer import calculate_priority_scores_batch
+  from app.services.spatial_index import SpatialTemporalIndex
+
+  now = datetime(2024, 6, 1, tzinfo=timezone.utc)
+  index = SpatialTemporalIndex(
+    cell_meters=50,
+    lookback=timedelta(days=30),
+    distance_fn=priority_scorer._haversine_meters,
+    distance_array_fn=priority_scorer._haversine_meters_array,
+  )
+  monkeypatch.setattr(priority_scorer, 'recurrence_index', index)
+  rng = np.random.default_rng(7)
+  types = ['pothole', 'illegal_waste', 'flooding', 'graffiti']
+  for i in range(300):
+    index.add(
+      f'r{i}', types[i % 4], 25.2 + rng.random() * 0.003, 55.27 + rng.random() * 0.003,
+      now - timedelta(days=float(rng.random() * 40)),
+    )
+
+  n = 400
+  columns = dict(
+    severity=np.round(rng.uniform(-1, 12, n), 3),
+    safety_risk=rng.random(n) < 0.4,
+    estimated_affected_people=rng.choice([0, 1, 50, 51, 200, 201, 999, 1000], n),
+    issue_type=rng.choice(types, n),
+    location_lat=25.2 + rng.random(n) * 0.003,
+    location_lng=55.27 + rng.random(n) * 0.003,
+  )
+  batch = calculate_priority_scores_batch(**columns, now=now)
+
+  assert batch.dtype == priority_scorer.PRIORITY_BATCH_DTYPE
+  assert batch['recurrence_factor'].max() > 0
+  for i in range(n):
+    scalar = calculate_priority_score(
+      severity=float(columns['severity'][i]),
+      safety_risk=bool(columns['safety_risk'][i]),
+      estimated_affected_people=int(columns['estimated_affected_people'][i]),
+      issue_type=str(columns['issue_type'][i]),
+      location_lat=float(columns['location_lat'][i]),
+      location_lng=float(columns['location_lng'][i]),
+      reported_at=now,
+    )
+    assert tuple(batch[i].tolist()) == tuple(scalar.to_dict().values())
+
+
+def test_batch_accepts_codes_and_excludes_own_report(monkeypatch):
+  from app.services import priority_scorer
+  from app.services.priority_scorer import calculate_priority_scores_batch
+  from app.services.spatial_index import SpatialTemporalIndex
+
+  index = SpatialTemporalIndex(cell_meters=50, lookback=timedelta(days=30), distance_fn=priority_scorer._haversine_meters)
+  monkeypatch.setattr(priority_scorer, 'recurrence_index', index)
+  index.add('a', 'flooding', 25.2, 55.27)
+  index.add('b', 'flooding', 25.2, 55.27)
+
+  batch = calculate_priority_scores_batch(
+    severity=[5, 5],
+    safety_risk=[False, True],
+    estimated_affected_people=[10, 10],
+    issue_type=[1, 0],
+    issue_type_names=['pothole', 'flooding'],
+    location_lat=[25.2, 25.2],
+    location_lng=[55.27, 55.27],
+    report_ids=['a', None],
+  )
+  assert batch['environmental_impact_factor'].tolist() == [7, 3]
+  assert batch['recurrence_factor'].tolist() == [3, 0]
+  assert batch['safety_risk_factor'].tolist() == [0, 10]
+  assert len(calculate_priority_scores_batch(
+    severity=[], safety_risk=[], estimated_affected_people=[], issue_type=[], location_lat=[], location_lng=[],
+  )) == 0
+
+
+def test_explain_priority_reads_the_stored_breakdown(isolated_priority_store, monkeypatch):
+  from app.services import priority_scorer
+  from app.services.priority_store import PriorityStore, export_explanations
+  from app.services.spatial_index import SpatialTemporalIndex
+
+  index = SpatialTemporalIndex(cell_meters=50, lookback=timedelta(days=30), distance_fn=priority_scorer._haversine_meters)
+  monkeypatch.setattr(priority_scorer, 'recurrence_index', index)
+  index.add('older', 'illegal_waste', 25.2, 55.27)
+
+  breakdown = calculate_priority_score(
+    severity=9,
+    safety_risk=True,
+    estimated_affected_people=500,
+    issue_type='illegal_waste',
+    location_lat=25.2,
+    location_lng=55.27,
+    report_id='report-1',
+  )
+  explanation = priority_scorer.explain_priority('report-1')
+
+  assert explanation['priority_score'] == breakdown.score
+  assert explanation['weight_version'] == priority_scorer.weight_version()
+  assert explanation['factors']['severity']['points'] == 31.5
+  assert explanation['factors']['safety_risk_factor']['weight'] == 0.30
+  assert any('1 similar reports' in line for line in explanation['reasoning'])
+  assert explanation['reasoning'][-1] == f'Total priority score: {breakdown.score}/100.'
+  assert priority_scorer.explain_priority('unknown')['priority_score'] is None
+
+  # A fresh process reloads the log; explanations keep the weights they were scored with.
+  isolated_priority_store.flush()
+  reopened = PriorityStore(isolated_priority_store.path)
+  monkeypatch.setattr(priority_scorer, 'priority_store', reopened)
+  monkeypatch.setitem(priority_scorer.PRIORITY_WEIGHTS, 'severity', 0.5)
+  reloaded = priority_scorer.explain_priority('report-1')
+  assert reloaded['factors']['severity']['points'] == 31.5
+  assert 'current weights are' in reloaded['reasoning'][-1]
+
+  output = io.StringIO()
+  assert export_explanations(reopened, output) == 1
+  assert json.loads(output.getvalue())['report_id'] == 'report-1'
+
+
+def test_priority_store_compacts_superseded_records(tmp_path, monkeypatch):
+  from app.services import priority_store as store_module
+  from app.services.priority_store import PriorityStore, StoredPriority
+
+  monkeypatch.setattr(store_module, 'COMPACT_MIN_LINES', 10)
+  store = PriorityStore(tmp_path / 'log.jsonl')
+  for i in range(30):
+    store.put(
+      StoredPriority(f'r{i % 3}', float(i), {}, {}, 'v1', '2024-01-01T00:00:00+00:00'),
+      {'severity': 0.35},
+    )
+  store.close()
+
+  lines = (tmp_path / 'log.jsonl').read_text().splitlines()
+  assert len(lines) <= 10
+  reopened = PriorityStore(tmp_path / 'log.jsonl')
+  assert len(reopened) == 3
+  assert reopened.get('r2').score == 29.0
+
+
+def test_previews_are_not_persisted(isolated_priority_store):
+  calculate_priority_score(
+    severity=5,
+    safety_risk=False,
+    estimated_affected_people=10,
+    issue_type='pothole',
+    location_lat=25.2,
+    location_lng=55.27,
+    report_id='preview',
+    persist=False,
+  )
+  assert isolated_priority_store.get('preview') is None
+
+
+def test_priority_store_without_a_path_stays_in_memory(tmp_path, monkeypatch):
+  from app.services.priority_store import PriorityStore, StoredPriority
+
+  monkeypatch.chdir(tmp_path)
+  store = PriorityStore(None)
+  store.put(StoredPriority('r1', 50.0, {}, {}, 'v1', '2024-01-01T00:00:00+00:00'), {'severity': 0.35})
+  store.flush()
+  store.close()
+
+  assert store.get('r1').score == 50.0
+  assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,130 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.services import profile_event_store, profile_service
+from app.services.profile_event_store import ProfileEventStore
+from app.services.profile_service import ProfileAccumulator, ReportEvent, ReportSummary
+
+
+NOW = datetime(2025, 3, 1, 12, 0)
+
+
+def _population(seed, users=40):
+  rng = random.Random(seed)
+  history = {}
+  for user in range(users):
+    reports, events = [], []
+    for index in range(rng.randint(0, 30)):
+      report_id = f"u{user}-r{index}"
+      submitted_at = NOW - timedelta(days=rng.choice([rng.uniform(0, 40), rng.uniform(0, 3)]), minutes=rng.randint(0, 600))
+      verified, resolved = rng.random() < 0.5, rng.random() < 0.3
+      reports.append(ReportSummary(report_id, "open", verified, resolved, submitted_at))
+      events.append(ReportEvent(report_id, "report_submitted", submitted_at))
+      if verified:
+        events.append(ReportEvent(report_id, "report_verified", submitted_at + timedelta(hours=2)))
+      if resolved:
+        events.append(ReportEvent(report_id, "report_resolved", submitted_at + timedelta(hours=5)))
+      if rng.random() < 0.05:
+        events.append(ReportEvent(report_id, "first_in_area", submitted_at))
+    history[f"user-{user}"] = (reports, events)
+  return history
+
+
+def _store(history):
+  store = ProfileEventStore()
+  for user_id, (reports, events) in history.items():
+    for report in reports:
+      store.add_report(user_id, report)
+    store.add_events([user_id] * len(events), [event.event_type for event in events], [event.occurred_at for event in events])
+  return store
+
+
+def test_recompute_matches_per_user_profiles():
+  for seed in range(5):
+    history = _population(seed)
+    snapshots = _store(history).recompute(now=NOW)
+
+    assert set(snapshots) == {user_id for user_id, (reports, _) in history.items() if reports}
+    for user_id in snapshots:
+      expected = ProfileAccumulator.from_history(*history[user_id]).snapshot(NOW)
+      assert snapshots[user_id] == expected, user_id
+
+
+def test_recompute_applies_changed_rules(monkeypatch):
+  history = _population(11)
+  store = _store(history)
+  rules = {**profile_service.GAMIFICATION_RULES, "report_verified": 40, "streak_bonus": 500}
+
+  snapshots = store.recompute(rules=rules, now=NOW)
+
+  monkeypatch.setattr(profile_service, "GAMIFICATION_RULES", rules)
+  for user_id in snapshots:
+    assert snapshots[user_id] == ProfileAccumulator.from_history(*history[user_id]).snapshot(NOW)
+
+
+def test_reports_are_updated_in_place_and_single_events_append():
+  store = ProfileEventStore()
+  report = ReportSummary("r1", "open", False, False, NOW - timedelta(hours=1))
+  store.add_report("alice", report)
+  store.add_event("alice", ReportEvent("r1", "report_submitted", report.submitted_at))
+  store.add_report("alice", ReportSummary("r1", "resolved", True, True, report.submitted_at))
+
+  profile = store.recompute(now=NOW)["alice"]
+
+  assert store.stats()["reports"] == 1
+  assert profile.total_reports == 1
+  assert profile.resolved_reports == 1
+  assert profile.badges == ["First Reporter", "Lightning Strike"]
+  assert profile.reputation == 10
+  assert profile.streak == 1
+
+
+def test_empty_store_recomputes_to_nothing():
+  assert ProfileEventStore().recompute(now=NOW) == {}
+
+
+def test_streaks_match_when_timestamps_do_not_fit_a_packed_sort_key():
+  users = np.array([0, 1, 0, 1, 0, 0, 0, 2], dtype=np.int32)
+  day = 86_400_000_000
+  times = np.array([0, 1 << 60, day, (1 << 60) + day, 2 * day, 3 * day, 4 * day, 5], dtype=np.int64)
+
+  has_streak, streak = profile_event_store._submission_streaks(users, times, times // day, 3)
+
+  assert has_streak.tolist() == [True, False, False]
+  assert streak.tolist() == [5, 2, 1]
+
+
+def test_daily_streaks_use_each_timestamps_own_calendar_day():
+  dubai, pacific = timezone(timedelta(hours=4)), timezone(timedelta(hours=-8))
+  history = {
+    # 23:30 local on consecutive days: a different UTC day from the local one.
+    'pacific': [datetime(2025, 2, 25, 23, 30, tzinfo=pacific) + timedelta(days=n) for n in range(3)],
+    'dubai': [datetime(2025, 2, 26, 0, 30, tzinfo=dubai) + timedelta(days=n) for n in range(3)],
+    # Same instants as seen from two offsets.
+    'mixed': [
+      datetime(2025, 2, 26, 23, 0, tzinfo=pacific),
+      datetime(2025, 2, 28, 1, 0, tzinfo=dubai),
+      datetime(2025, 2, 28, 22, 0, tzinfo=timezone.utc),
+    ],
+    # In instant order the local days are Feb 27, Feb 26, Feb 28.
+    'backwards': [
+      datetime(2025, 2, 27, 0, 30, tzinfo=timezone(timedelta(hours=5))),
+      datetime(2025, 2, 26, 23, 0, tzinfo=timezone(timedelta(hours=-5))),
+      datetime(2025, 2, 28, 12, 0, tzinfo=timezone.utc),
+    ],
+  }
+  store = ProfileEventStore()
+  for user_id, stamps in history.items():
+    for index, stamp in enumerate(stamps):
+      store.add_report(user_id, ReportSummary(f'{user_id}-{index}', 'open', False, False, stamp))
+      store.add_event(user_id, ReportEvent(f'{user_id}-{index}', 'report_submitted', stamp))
+
+  snapshots = store.recompute(now=datetime(2025, 3, 1, tzinfo=timezone.utc))
+  for user_id, stamps in history.items():
+    reports = [ReportSummary(f'{user_id}-{index}', 'open', False, False, stamp) for index, stamp in enumerate(stamps)]
+    events = [ReportEvent(f'{user_id}-{index}', 'report_submitted', stamp) for index, stamp in enumerate(stamps)]
+    assert snapshots[user_id].streak == profile_service._current_streak(events), user_id
+    assert snapshots[user_id] == profile_service.summarize_profile(reports, events), user_id
+  assert snapshots['pacific'].streak == snapshots['dubai'].streak == snapshots['backwards'].streak == 3
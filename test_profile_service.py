@@ -0,0 +1,123 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import profile_service
+from app.services.profile_service import (
+  ProfileAccumulator,
+  ReportEvent,
+  ReportSummary,
+  assign_badges,
+  calculate_reputation,
+  summarize_profile,
+)
+
+
+NOW = datetime(2025, 3, 1, 12, 0)
+
+
+def _history(seed, reports=60):
+  rng = random.Random(seed)
+  summaries, events = [], []
+  for index in range(reports):
+    submitted_at = NOW - timedelta(days=rng.uniform(0, 60))
+    verified = rng.random() < 0.4
+    resolved = rng.random() < 0.3
+    summaries.append(ReportSummary(f"r{index}", "resolved" if resolved else "open", verified, resolved, submitted_at))
+    events.append(ReportEvent(f"r{index}", "report_submitted", submitted_at))
+    if verified:
+      events.append(ReportEvent(f"r{index}", "report_verified", submitted_at + timedelta(hours=3)))
+    if resolved:
+      events.append(ReportEvent(f"r{index}", "report_resolved", submitted_at + timedelta(days=1)))
+  rng.shuffle(events)
+  return summaries, events
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_accumulator_matches_full_recomputation(seed):
+  reports, events = _history(seed, reports=random.Random(seed).randint(0, 40))
+  reputation = calculate_reputation(events)
+
+  profile = summarize_profile(reports, events)
+
+  assert profile.reputation == reputation
+  assert profile.total_reports == len(reports)
+  assert profile.resolved_reports == sum(report.resolved for report in reports)
+  assert profile.streak == profile_service._current_streak(events)
+  assert profile.badges == assign_badges(reports, events, reputation)
+
+
+def test_streak_bonus_needs_five_submissions_within_seven_days():
+  accumulator = ProfileAccumulator()
+  start = NOW - timedelta(days=30)
+  for offset in (0, 2, 4, 6, 8):
+    accumulator.apply_event(ReportEvent(f"r{offset}", "report_submitted", start + timedelta(days=offset)))
+  assert not accumulator.has_streak
+
+  accumulator.apply_event(ReportEvent("r9", "report_submitted", start + timedelta(days=9)))
+  accumulator.apply_event(ReportEvent("r10", "report_submitted", start + timedelta(days=10)))
+
+  assert accumulator.has_streak
+  assert accumulator.reputation == 7 * 10 + profile_service.GAMIFICATION_RULES["streak_bonus"]
+  assert "Streak Master" in accumulator.badges(NOW)
+
+
+def test_daily_streak_counts_consecutive_days_ending_at_latest_submission():
+  accumulator = ProfileAccumulator()
+  for day, hour in ((1, 9), (3, 9), (4, 8), (4, 20), (5, 7)):
+    accumulator.apply_event(ReportEvent("r", "report_submitted", datetime(2025, 3, day, hour)))
+  assert accumulator.streak == 3
+
+
+def test_daily_streak_with_mixed_offsets_matches_full_recomputation():
+  east, west = timezone(timedelta(hours=5)), timezone(timedelta(hours=-5))
+  # In instant order the local days are Jan 2, Jan 1, Jan 3.
+  stamps = [
+    datetime(2025, 1, 2, 0, 30, tzinfo=east),
+    datetime(2025, 1, 1, 23, 0, tzinfo=west),
+    datetime(2025, 1, 3, 12, 0, tzinfo=timezone.utc),
+  ]
+  events = [ReportEvent(f"r{index}", "report_submitted", stamp) for index, stamp in enumerate(stamps)]
+  accumulator = ProfileAccumulator()
+  for event in events:
+    accumulator.apply_event(event)
+
+  assert accumulator.streak == profile_service._current_streak(events) == 3
+  assert ProfileAccumulator.from_dict(accumulator.to_dict()).streak == 3
+
+
+def test_out_of_order_submission_is_rejected():
+  accumulator = ProfileAccumulator()
+  accumulator.apply_event(ReportEvent("r1", "report_submitted", NOW))
+  with pytest.raises(ValueError):
+    accumulator.apply_event(ReportEvent("r0", "report_submitted", NOW - timedelta(hours=1)))
+  accumulator.apply_event(ReportEvent("r0", "report_verified", NOW - timedelta(hours=1)))
+  assert accumulator.reputation == 35
+
+
+def test_report_status_change_is_not_double_counted():
+  accumulator = ProfileAccumulator()
+  submitted = ReportSummary("r1", "open", False, False, NOW - timedelta(hours=1))
+  accumulator.apply_report(submitted)
+  accumulator.apply_report(ReportSummary("r1", "resolved", True, True, submitted.submitted_at), previous=submitted)
+
+  snapshot = accumulator.snapshot(now=NOW)
+  assert snapshot.total_reports == 1
+  assert snapshot.resolved_reports == 1
+  assert accumulator.verified_reports == 1
+  assert snapshot.badges == ["First Reporter", "Lightning Strike"]
+
+
+def test_accumulator_round_trips_through_dict():
+  reports, events = _history(7)
+  events.sort(key=lambda event: event.occurred_at)
+  accumulator = ProfileAccumulator.from_history(reports, events[:50])
+
+  restored = ProfileAccumulator.from_dict(accumulator.to_dict())
+  for event in events[50:]:
+    accumulator.apply_event(event)
+    restored.apply_event(event)
+
+  assert restored.to_dict() == accumulator.to_dict()
+  assert restored.snapshot(NOW) == accumulator.snapshot(NOW)
@@ -0,0 +1,124 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import sorted_index
+from app.services.report_repository import InMemoryReportRepository, SQLiteReportRepository, create_report_repository
+
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _reports(count, seed=0):
+  rng = random.Random(seed)
+  return [
+    {
+      'id': f'r{index}',
+      'user_id': f'user-{rng.randint(0, 9)}',
+      'status': rng.choice(['pending', 'in_progress', 'resolved']),
+      'issue_type': rng.choice(['pothole', 'graffiti', 'flooding']),
+      'department': {'primary_department': {'id': rng.choice(['dept-rta', 'dept-parks'])}},
+      'created_at': (START + timedelta(minutes=rng.randint(0, 5000))).isoformat(),
+    }
+    for index in range(count)
+  ]
+
+
+def _expected(reports, **filters):
+  def value(report, name):
+    if name == 'department':
+      return report['department']['primary_department']['id']
+    return report[name]
+
+  matching = [report for report in reports if all(value(report, name) == wanted for name, wanted in filters.items())]
+  return [report['id'] for report in sorted(matching, key=lambda report: (-datetime.fromisoformat(report['created_at']).timestamp(), report['id']))]
+
+
+def _walk(repository, limit, **filters):
+  ids, cursor = [], None
+  while True:
+    page = repository.list(limit=limit, cursor=cursor, **filters)
+    ids.extend(report['id'] for report in page.items)
+    if page.next_cursor is None:
+      return ids
+    cursor = page.next_cursor
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def repository(request, monkeypatch):
+  monkeypatch.setattr(sorted_index, 'BUCKET_LOAD', 8)
+  if request.param == 'memory':
+    return InMemoryReportRepository()
+  return SQLiteReportRepository(':memory:')
+
+
+@pytest.mark.parametrize('filters', [
+  {},
+  {'status': 'pending'},
+  {'user_id': 'user-3', 'status': 'resolved'},
+  {'department': 'dept-parks', 'issue_type': 'graffiti'},
+  {'user_id': 'nobody'},
+])
+def test_cursor_pages_match_a_sorted_scan(repository, filters):
+  reports = _reports(300)
+  for report in reports:
+    repository.put(report)
+
+  assert _walk(repository, 7, **filters) == _expected(reports, **filters)
+  assert repository.count(**filters) == len(_expected(reports, **filters))
+
+
+def test_updates_and_deletes_move_reports_between_indexes(repository):
+  reports = _reports(120, seed=1)
+  for report in reports:
+    repository.put(report)
+  for report in reports[::3]:
+    report['status'] = 'resolved'
+    report['created_at'] = (START + timedelta(days=10)).isoformat()
+    repository.put(report)
+  for report in reports[1::7]:
+    assert repository.delete(report['id'])
+  remaining = [report for index, report in enumerate(reports) if index % 7 != 1]
+
+  assert len(repository) == len(remaining)
+  for status in ('pending', 'resolved'):
+    assert _walk(repository, 10, status=status) == _expected(remaining, status=status)
+  assert repository.get(reports[0]['id'])['status'] == 'resolved'
+  assert repository.get(reports[1]['id']) is None
+  assert not repository.delete(reports[1]['id'])
+
+
+def test_created_at_window(repository):
+  reports = _reports(200, seed=2)
+  for report in reports:
+    repository.put(report)
+  after, before = START + timedelta(minutes=1000), START + timedelta(minutes=2000)
+
+  listed = _walk_window(repository, after, before)
+
+  expected = [
+    report_id
+    for report_id in _expected(reports, status='pending')
+    if after <= datetime.fromisoformat(next(r for r in reports if r['id'] == report_id)['created_at']) < before
+  ]
+  assert listed == expected
+
+
+def _walk_window(repository, after, before):
+  ids, cursor = [], None
+  while True:
+    page = repository.list(limit=5, cursor=cursor, status='pending', created_after=after, created_before=before)
+    ids.extend(report['id'] for report in page.items)
+    if page.next_cursor is None:
+      return ids
+    cursor = page.next_cursor
+
+
+def test_rejects_unknown_filters_cursors_and_backends(repository):
+  with pytest.raises(ValueError):
+    repository.list(description='x')
+  with pytest.raises(ValueError):
+    repository.list(cursor='not-a-cursor')
+  with pytest.raises(ValueError):
+    create_report_repository('postgres')
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services.storage_backends import StorageError, SupabaseStorageBackend, upload_variants
+
+
+class StandInStorage(BaseHTTPRequestHandler):
+  objects = {}
+  failures = {}
+  in_flight = 0
+  peak = 0
+  lock = threading.Lock()
+
+  def log_message(self, *args):
+    pass
+
+  def do_POST(self):
+    cls = type(self)
+    with cls.lock:
+      cls.in_flight += 1
+      cls.peak = max(cls.peak, cls.in_flight)
+    try:
+      body = self.rfile.read(int(self.headers['content-length']))
+      time.sleep(0.05)
+      if cls.failures.get(self.path, 0) > 0:
+        cls.failures[self.path] -= 1
+        self.send_response(503)
+        self.end_headers()
+        return
+      if self.headers.get('authorization') != 'Bearer service-key':
+        self.send_response(401)
+        self.end_headers()
+        return
+      cls.objects[self.path] = (body, self.headers['content-type'])
+      self.send_response(200)
+      self.send_header('content-type', 'application/json')
+      self.end_headers()
+      self.wfile.write(b'{"Key": "ok"}')
+    finally:
+      with cls.lock:
+        cls.in_flight -= 1
+
+  def do_DELETE(self):
+    self.rfile.read(int(self.headers['content-length']))
+    self.send_response(200)
+    self.end_headers()
+
+
+@pytest.fixture
+def server():
+  StandInStorage.objects = {}
+  StandInStorage.failures = {}
+  StandInStorage.peak = 0
+  httpd = ThreadingHTTPServer(('127.0.0.1', 0), StandInStorage)
+  thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+  thread.start()
+  yield f'http://127.0.0.1:{httpd.server_address[1]}'
+  httpd.shutdown()
+
+
+def _run(backend, coro_factory):
+  async def run():
+    try:
+      return await coro_factory()
+    finally:
+      await backend.aclose()
+  return asyncio.run(run())
+
+
+def test_put_uploads_and_derives_public_url(server):
+  backend = SupabaseStorageBackend(server, 'service-key', 'citylens-images')
+  url = _run(backend, lambda: backend.put('reports/2024/1/a.webp', b'data', 'image/webp'))
+  assert url == f'{server}/storage/v1/object/public/citylens-images/reports/2024/1/a.webp'
+  assert StandInStorage.objects['/storage/v1/object/citylens-images/reports/2024/1/a.webp'] == (b'data', 'image/webp')
+
+
+def test_put_retries_transient_errors(server):
+  StandInStorage.failures['/storage/v1/object/citylens-images/flaky.webp'] = 2
+  backend = SupabaseStorageBackend(server, 'service-key', 'citylens-images', retry_delay=0.01)
+  _run(backend, lambda: backend.put('flaky.webp', b'data', 'image/webp'))
+  assert '/storage/v1/object/citylens-images/flaky.webp' in StandInStorage.objects
+
+
+def test_put_does_not_retry_client_errors(server):
+  backend = SupabaseStorageBackend(server, 'wrong-key', 'citylens-images', retry_delay=0.01)
+  with pytest.raises(StorageError, match='401'):
+    _run(backend, lambda: backend.put('a.webp', b'data', 'image/webp'))
+
+
+def test_variants_upload_in_parallel(server):
+  backend = SupabaseStorageBackend(server, 'service-key', 'citylens-images', max_concurrency=4)
+  variants = {
+    'original': ('r/a.webp', (b'original', 'image/webp')),
+    'thumb_200': ('r/a_w200.webp', (b'small', 'image/webp')),
+    'thumb_500': ('r/a_w500.webp', (b'medium', 'image/webp')),
+  }
+  started = time.perf_counter()
+  urls = _run(backend, lambda: upload_variants(backend, variants))
+  assert set(urls) == {'original', 'thumb_200', 'thumb_500'}
+  assert StandInStorage.peak > 1
+  assert time.perf_counter() - started < 0.05 * 3